@@ -1,5 +1,6 @@
 ﻿from flask import Flask, request, jsonify, Response, stream_with_context, send_from_directory
 from pathlib import Path
+from typing import Dict, List, Optional
 import traceback
 import json
 import os
@@ -16,12 +17,16 @@ project_root = Path(__file__).parent.parent
 if str(project_root) not in sys.path:
     sys.path.insert(0, str(project_root))
 
-from backend.modules.parser import slice_repo
+from backend.modules.parser import iter_repo_chunks, iter_text_files
+from backend.modules.index_jobs import IndexJob, get_index_job_manager
 from backend.modules.vector_store import FaissStore
+from backend.modules.index_cache import get_store, has_index, get_index_cache
 from backend.modules.search import ripgrep_candidates, fuse_results
+from backend.modules.search_filters import SearchFilter
+from backend.modules.index_factory import positive_int
 from backend.modules.llm_api import answer_with_citations, analyze_code, stream_answer, suggest_refactoring
 from backend.modules.context_retriever import expand_code_context, enrich_with_related_code
-from backend.modules.index_sync import get_sync_manager
+from backend.modules.index_sync import get_sync_manager, reindex_repo
 from backend.modules.multi_repo import (
     search_multiple_repos, index_multiple_repos, get_indexed_repos, repo_id_from_path
 )
@@ -31,6 +36,7 @@ from backend.modules.large_file_handler import (
     chunk_large_file_semantically, get_file_size_category,
     extract_specific_sections, optimize_for_refactoring
 )
+from backend.modules.file_view import FileView
 from backend.modules.code_completion import generate_completion, generate_multiple_completions
 from backend.modules.code_generation import generate_code
 from backend.modules.composer import compose_multi_file_edit, apply_edits
@@ -44,7 +50,8 @@ from backend.modules.error_handler import (
 )
 from backend.modules.privacy import get_privacy_mode, is_privacy_mode_enabled
 from backend.modules.repo_generator import generate_repository
-from backend.config import DATA_DIR, TOP_K_EMB, TOP_K_FINAL
+from backend.modules.model_registry import get_model_registry, warmup_embedding_model
+from backend.config import DATA_DIR, TOP_K_EMB, TOP_K_FINAL, EMBEDDING_WARMUP
 from backend.modules.database import init_database, db
 from backend.modules.user_auth import UserAuth, require_auth
 from backend.modules.user_repo_helper import verify_user_owns_repo
@@ -66,12 +73,22 @@ CORS(app, resources={
     }
 })
 
+# Worker processes of the slicing and encoding pools are spawned, and spawning re-imports the
+# main module under the name __mp_main__ when the server runs as `python -m backend.app`.
+# Workers only need importable functions: no database, model warmup or shutdown hooks
+SPAWNED_WORKER = __name__ == "__mp_main__"
+
 # Initialize database
-init_database(app)
+if not SPAWNED_WORKER:
+    init_database(app)
 
 # Initialize user authentication
 user_auth = UserAuth(db)
 
+# Load the shared embedding model in the background so the first request doesn't pay for it
+if EMBEDDING_WARMUP and not SPAWNED_WORKER:
+    warmup_embedding_model(background=True)
+
 # Make user_auth available in request context
 @app.before_request
 def before_request():
@@ -227,10 +244,13 @@ def decompose():
     - question: The complex question to decompose (required)
     - model: Optional model override
     - temperature: Optional temperature (default: 0.3)
+    - repo_dir: Optional indexed repository; if given, each sub-question is searched (one batched query)
+    - k: Results per sub-question when repo_dir is given (default: 6)
     
     Returns:
     - List of sub-questions
     - Analysis of the decomposition
+    - evidence: Per sub-question vector search results (only with repo_dir)
     """
     try:
         data = request.json or {}
@@ -254,13 +274,32 @@ def decompose():
         # Analyze decomposition
         analysis = analyze_decomposition(question, sub_questions)
         
-        return jsonify({
+        response = {
             "ok": True,
             "original_question": question,
             "sub_questions": sub_questions,
             "is_complex": is_complex,
             "analysis": analysis
-        })
+        }
+        
+        # Optionally search every sub-question in one batched encode + index search
+        repo_dir = data.get("repo_dir")
+        if repo_dir and sub_questions:
+            rid = repo_id_from_path(repo_dir)
+            if not has_index(rid, base_dir=f"{DATA_DIR}/index"):
+                return jsonify({
+                    "ok": False,
+                    "error": f"Repository not indexed. Please index it first using /index_repo",
+                    "repo_id": rid
+                }), 400
+            store = get_store(rid, base_dir=f"{DATA_DIR}/index")
+            batches = store.query_batch(sub_questions, k=int(data.get("k", TOP_K_FINAL)))
+            response["evidence"] = [
+                {"sub_question": q, "results": results}
+                for q, results in zip(sub_questions, batches)
+            ]
+        
+        return jsonify(response)
         
     except Exception as e:
         error_msg = str(e)
@@ -500,6 +539,146 @@ def search_iterative():
         return jsonify({"ok": False, "error": error_msg, "traceback": error_trace}), 500
 
 
+def _count_repo_files(repo_dir: str) -> int:
+    """Number of files indexing will read (for progress percentages / ETA)."""
+    return sum(1 for _ in iter_text_files(Path(repo_dir)))
+
+
+def _log_index_progress(tag: str):
+    """Progress callback that logs streaming build batches."""
+    def log(event):
+        if event["stage"] == "embedding":
+            print(f"[{tag}] {event['chunks']} chunks from {event['files']} files ({event['chunks_per_second']}/s)")
+    return log
+
+
+def _index_single_repo(repo_dir: str, rid: str, use_in_memory: bool, job: Optional[IndexJob] = None,
+                       full: bool = False) -> Dict:
+    """
+    Walk -> chunk -> embed in batches -> index one repository, then start auto-sync.
+    An already indexed repo only has its added/modified/deleted files re-indexed (unless `full`).
+    Progress goes to `job` (background jobs, which can cancel the build) or to the log.
+    """
+    print(f"[index_repo] Creating vector store...")
+    store = FaissStore(rid, base_dir=f"{DATA_DIR}/index", in_memory=use_in_memory)
+    
+    print(f"[index_repo] Building index...")
+    progress = job.report if job is not None else _log_index_progress("index_repo")
+    stats = reindex_repo(store, repo_dir, full=full, progress=progress)
+    get_index_cache().put(store)
+    print(f"[index_repo] Index built successfully ({stats['mode']})")
+    
+    # 缓存切片（可选）
+    Path(f"{DATA_DIR}/repos/{rid}").mkdir(parents=True, exist_ok=True)
+    
+    # Start watching repository for changes (auto-sync)
+    try:
+        sync_manager = get_sync_manager()
+        sync_manager.watch_repo(repo_dir, rid, base_dir=f"{DATA_DIR}/index")
+        print(f"[index_repo] Started auto-sync for repository")
+    except Exception as e:
+        print(f"[index_repo] Warning: Could not start auto-sync: {e}")
+    
+    return {"ok": True, "repo_id": rid, "chunks": stats["chunks"], "indexing": stats}
+
+
+def _index_repos_for_user(repo_dirs: List[str], user_id, job: Optional[IndexJob] = None,
+                          full: bool = False) -> Dict:
+    """Index several repositories, associate them with the user and start auto-sync."""
+    progress = None
+    if job is not None:
+        repo_files = [_count_repo_files(d) if Path(d).exists() else 0 for d in repo_dirs]
+        job.report({"stage": "scanning", "total_files": sum(repo_files)})
+        
+        def progress(event):
+            # Count files across all repos, so percent/ETA cover the whole run
+            offset = sum(repo_files[:event["repo_index"]])
+            job.report(dict(event, files=offset + event.get("files", 0), repo_files=event.get("files", 0),
+                            total_files=sum(repo_files)))
+    
+    print(f"[index_repo] Indexing {len(repo_dirs)} repositories...")
+    result = index_multiple_repos(repo_dirs, base_dir=f"{DATA_DIR}/index", progress=progress, full=full)
+    
+    # Associate repos with user and start watching
+    try:
+        sync_manager = get_sync_manager()
+        for repo_info in result["repos"]:
+            if repo_info.get("ok"):
+                repo_id = repo_info.get("repo_id")
+                repo_dir = repo_info.get("repo_dir", "")
+                chunks = repo_info.get("chunks", 0)
+                
+                # Associate with user
+                user_auth.add_user_repository(
+                    user_id=user_id,
+                    repo_id=repo_id,
+                    repo_path=repo_dir,
+                    repo_name=repo_id
+                )
+                
+                # Update index status
+                user_auth.update_repository_index_status(
+                    user_id=user_id,
+                    repo_id=repo_id,
+                    is_indexed=True,
+                    chunks_count=chunks
+                )
+                
+                # Start watching
+                sync_manager.watch_repo(
+                    repo_dir,
+                    repo_id,
+                    base_dir=f"{DATA_DIR}/index"
+                )
+        print(f"[index_repo] Started auto-sync for indexed repositories (user: {user_id})")
+    except Exception as e:
+        print(f"[index_repo] Warning: Could not start auto-sync: {e}")
+    
+    return result
+
+
+def _submit_index_job(kind: str, work, params: Dict, key: Optional[str] = None):
+    """Run indexing work as a background job; responds 202 with the job id."""
+    job = get_index_job_manager().submit(
+        kind, work, owner=request.current_user_id, params=params, key=key, context=app.app_context
+    )
+    return jsonify({
+        "ok": True,
+        "job_id": job.id,
+        "status": job.status,
+        "status_url": f"/index_jobs/{job.id}",
+        "events_url": f"/index_jobs/{job.id}/events"
+    }), 202
+
+
+def _stream_job_events(job: IndexJob, after: int = 0):
+    """
+    Server-sent events for a job: {type: "progress", ...} while it runs, then
+    {type: "done", ...result}, {type: "error"} or {type: "cancelled"}.
+    Closing the stream doesn't stop the job.
+    """
+    def generate():
+        seq = after
+        while True:
+            events, finished = job.events_since(seq)
+            for event in events:
+                seq = event["seq"]
+                if event["type"] == "status" and event["status"] == "succeeded":
+                    event = dict(event.get("result") or {}, type="done", job_id=job.id, seq=seq)
+                elif event["type"] == "status" and event["status"] == "failed":
+                    event = {"type": "error", "error": event.get("error"), "job_id": job.id, "seq": seq}
+                elif event["type"] == "status" and event["status"] == "cancelled":
+                    event = {"type": "cancelled", "job_id": job.id, "seq": seq}
+                yield "data: " + json.dumps(event) + "\n\n"
+            if finished:
+                return
+            if not events:
+                # Keep proxies from closing an idle stream
+                yield ": keep-alive\n\n"
+    
+    return Response(stream_with_context(generate()), mimetype='text/event-stream')
+
+
 @app.post("/index_repo")
 @require_auth
 def index_repo():
@@ -509,9 +688,15 @@ def index_repo():
     Accepts:
     - repo_dir: Single repository directory (backward compatible)
     - repo_dirs: List of repository directories (multi-repo mode)
+    - async: Run as a background job and return {ok, job_id} (202) right away;
+      poll /index_jobs/<job_id> or stream /index_jobs/<job_id>/events
+    - stream: Single repo mode only - run as a background job and stream its progress as
+      server-sent events ({type: "progress", stage, files, chunks, ...}, then {type: "done", ...result})
+    - full: Rebuild from scratch. By default an already indexed repo is re-indexed incrementally:
+      only files added/modified since the last index are re-chunked and re-embedded, deleted ones dropped
     
     Returns:
-    - Single repo mode: {ok, repo_id, chunks}
+    - Single repo mode: {ok, repo_id, chunks, indexing}
     - Multi-repo mode: {ok, repos: [{repo_id, repo_dir, ok, chunks/error}]}
     """
     try:
@@ -521,52 +706,22 @@ def index_repo():
         # Support both single repo and multi-repo
         repo_dir = request.json.get("repo_dir")
         repo_dirs = request.json.get("repo_dirs", [])
+        run_async = bool(request.json.get("async", False))
+        full = bool(request.json.get("full", False))
         
         # Multi-repo mode
         if repo_dirs:
             if not isinstance(repo_dirs, list):
                 return jsonify({"ok": False, "error": "repo_dirs must be a list"}), 400
             
-            print(f"[index_repo] Indexing {len(repo_dirs)} repositories...")
-            result = index_multiple_repos(repo_dirs, base_dir=f"{DATA_DIR}/index")
-            
-            # Associate repos with user and start watching
             user_id = request.current_user_id
-            try:
-                sync_manager = get_sync_manager()
-                for repo_info in result["repos"]:
-                    if repo_info.get("ok"):
-                        repo_id = repo_info.get("repo_id")
-                        repo_dir = repo_info.get("repo_dir", "")
-                        chunks = repo_info.get("chunks", 0)
-                        
-                        # Associate with user
-                        user_auth.add_user_repository(
-                            user_id=user_id,
-                            repo_id=repo_id,
-                            repo_path=repo_dir,
-                            repo_name=repo_id
-                        )
-                        
-                        # Update index status
-                        user_auth.update_repository_index_status(
-                            user_id=user_id,
-                            repo_id=repo_id,
-                            is_indexed=True,
-                            chunks_count=chunks
-                        )
-                        
-                        # Start watching
-                        sync_manager.watch_repo(
-                            repo_dir,
-                            repo_id,
-                            base_dir=f"{DATA_DIR}/index"
-                        )
-                print(f"[index_repo] Started auto-sync for indexed repositories (user: {user_id})")
-            except Exception as e:
-                print(f"[index_repo] Warning: Could not start auto-sync: {e}")
-            
-            return jsonify(result)
+            if run_async:
+                key = "index:" + "|".join(sorted(repo_id_from_path(d) for d in repo_dirs))
+                return _submit_index_job(
+                    "index_repos", lambda job: _index_repos_for_user(repo_dirs, user_id, job, full=full),
+                    params={"repo_dirs": repo_dirs, "full": full}, key=key
+                )
+            return jsonify(_index_repos_for_user(repo_dirs, user_id, full=full))
         
         # Single repo mode (backward compatible)
         if not repo_dir:
@@ -597,28 +752,25 @@ def index_repo():
         rid = repo_id_from_path(repo_dir)
         print(f"[index_repo] Repo ID: {rid}")
         
-        print(f"[index_repo] Slicing repository...")
-        chunks = slice_repo(repo_dir)
-        print(f"[index_repo] Found {len(chunks)} chunks")
-        
-        print(f"[index_repo] Creating vector store...")
-        store = FaissStore(rid, base_dir=f"{DATA_DIR}/index", in_memory=use_in_memory)
-        print(f"[index_repo] Building index...")
-        store.build(chunks)
-        print(f"[index_repo] Index built successfully")
-        
-        # 缓存切片（可选）
-        Path(f"{DATA_DIR}/repos/{rid}").mkdir(parents=True, exist_ok=True)
-        
-        # Start watching repository for changes (auto-sync)
-        try:
-            sync_manager = get_sync_manager()
-            sync_manager.watch_repo(repo_dir, rid, base_dir=f"{DATA_DIR}/index")
-            print(f"[index_repo] Started auto-sync for repository")
-        except Exception as e:
-            print(f"[index_repo] Warning: Could not start auto-sync: {e}")
+        if run_async or request.json.get("stream", False):
+            # Background job: keeps running (and stays cancellable) if the client goes away
+            job = get_index_job_manager().submit(
+                "index_repo", lambda job: _index_single_repo(repo_dir, rid, use_in_memory, job, full=full),
+                owner=user_id, params={"repo_dir": repo_dir, "repo_id": rid, "full": full},
+                key=f"index:{rid}", context=app.app_context
+            )
+            if not run_async:
+                return _stream_job_events(job)
+            return jsonify({
+                "ok": True,
+                "job_id": job.id,
+                "repo_id": rid,
+                "status": job.status,
+                "status_url": f"/index_jobs/{job.id}",
+                "events_url": f"/index_jobs/{job.id}/events"
+            }), 202
         
-        result = {"ok": True, "repo_id": rid, "chunks": len(chunks)}
+        result = _index_single_repo(repo_dir, rid, use_in_memory, full=full)
         print(f"[index_repo] Success: {result}")
         return jsonify(result)
     except Exception as e:
@@ -629,6 +781,218 @@ def index_repo():
         return jsonify({"ok": False, "error": error_msg, "traceback": error_trace}), 500
 
 
+class CloneError(Exception):
+    """git clone failed; carries the HTTP status to answer with."""
+
+    def __init__(self, message: str, status: int = 400):
+        super().__init__(message)
+        self.status = status
+
+
+def _clone_repository(git_url: str, branch: str, token: str, target_dir: Path) -> str:
+    """
+    Shallow-clone a repository into target_dir.
+    
+    Returns:
+        Path of the repository root
+    
+    Raises:
+        CloneError: git failed or timed out (target_dir is removed)
+    """
+    # Prepare Git URL with token if provided
+    clone_url = git_url
+    if token and git_url.startswith('https://'):
+        # Insert token into URL for authentication
+        # https://github.com/user/repo -> https://token@github.com/user/repo
+        clone_url = git_url.replace('https://', f'https://{token}@')
+    elif token and git_url.startswith('http://'):
+        clone_url = git_url.replace('http://', f'http://{token}@')
+    
+    print(f"[clone_and_index] Cloning repository: {git_url}")
+    print(f"[clone_and_index] Target directory: {target_dir}")
+    
+    # Clone repository
+    clone_cmd = ['git', 'clone', '--depth', '1', '--quiet']
+    
+    # Add branch if specified
+    if branch:
+        clone_cmd.extend(['--branch', branch])
+    
+    clone_cmd.extend([clone_url, str(target_dir)])
+    
+    print(f"[clone_and_index] Running: {' '.join(clone_cmd[:3])} ... [URL] ... {target_dir}")
+    
+    try:
+        result = subprocess.run(
+            clone_cmd,
+            capture_output=True,
+            text=True,
+            timeout=300  # 5 minutes timeout
+        )
+    except subprocess.TimeoutExpired:
+        # Clean up on timeout
+        if target_dir.exists():
+            shutil.rmtree(target_dir, ignore_errors=True)
+        raise CloneError("Clone operation timed out. The repository may be too large or the network is slow.", 408)
+    
+    if result.returncode != 0:
+        error_msg = result.stderr or result.stdout or "Unknown error"
+        if target_dir.exists():
+            shutil.rmtree(target_dir, ignore_errors=True)
+        
+        # Provide helpful error messages
+        if "fatal: repository" in error_msg.lower() or "not found" in error_msg.lower():
+            raise CloneError("Repository not found. Check the URL or ensure the repository is public. For private repos, provide an authentication token.", 400)
+        elif "authentication" in error_msg.lower() or "permission" in error_msg.lower():
+            raise CloneError("Authentication failed. For private repositories, provide a valid access token.", 401)
+        elif "could not resolve host" in error_msg.lower():
+            raise CloneError("Could not connect to Git server. Check your internet connection and the repository URL.", 400)
+        else:
+            raise CloneError(f"Git clone failed: {error_msg[:200]}", 400)
+    
+    print(f"[clone_and_index] Clone successful: {target_dir}")
+    
+    # Find the actual repository root
+    repo_root = target_dir
+    
+    # If clone created a subdirectory (common with git clone), use that
+    try:
+        entries = list(target_dir.iterdir())
+        if len(entries) == 1 and entries[0].is_dir():
+            repo_root = entries[0]
+        elif len(entries) == 0:
+            # Empty directory - shouldn't happen but handle it
+            print(f"[clone_and_index] Warning: Clone directory is empty")
+            raise Exception("Clone directory is empty - git clone may have failed")
+        # If multiple entries, use target_dir as root (repo files at top level)
+    except Exception as e:
+        print(f"[clone_and_index] Error finding repository root: {e}")
+        # Clean up on error
+        if target_dir.exists():
+            shutil.rmtree(target_dir, ignore_errors=True)
+        raise Exception(f"Failed to locate repository root after clone: {e}")
+    
+    repo_path = str(repo_root.resolve())
+    if not Path(repo_path).exists():
+        # Clean up on error
+        if target_dir.exists():
+            shutil.rmtree(target_dir, ignore_errors=True)
+        raise Exception(f"Repository path does not exist: {repo_path}")
+    
+    print(f"[clone_and_index] Repository root: {repo_path}")
+    return repo_path
+
+
+def _clone_and_index_repo(git_url: str, repo_name: str, branch: str, token: str, user_id,
+                          job: Optional[IndexJob] = None) -> Dict:
+    """Clone a repository, index it, associate it with the user and start auto-sync."""
+    # Create clone directory
+    clone_dir = Path(f"{DATA_DIR}/clones")
+    clone_dir.mkdir(parents=True, exist_ok=True)
+    
+    # Generate unique ID for this clone
+    clone_id = str(uuid.uuid4())[:8]
+    target_dir = clone_dir / clone_id
+    
+    if job is not None:
+        job.report({"stage": "cloning"})
+    repo_path = _clone_repository(git_url, branch, token, target_dir)
+    
+    try:
+        # Check privacy mode
+        privacy_mode = get_privacy_mode()
+        use_in_memory = privacy_mode.use_in_memory_storage()
+        
+        if use_in_memory:
+            print(f"[clone_and_index] Privacy mode enabled - Using in-memory storage")
+        else:
+            print(f"[clone_and_index] Using disk storage")
+        
+        # Index the cloned repository
+        print(f"[clone_and_index] Starting indexing...")
+        
+        # Use provided repo_name if available, otherwise generate from path
+        try:
+            if repo_name and repo_name.strip():
+                rid = secure_filename(repo_name.strip())[:50]
+                if not rid:  # If sanitization removed everything
+                    rid = f"repo_{uuid.uuid4().hex[:8]}"
+            else:
+                # Generate from repository path
+                try:
+                    rid = repo_id_from_path(repo_path)
+                    # Sanitize the repo_id
+                    if rid:
+                        rid = secure_filename(rid)[:50]
+                        if not rid:  # If sanitization removed everything
+                            rid = f"repo_{uuid.uuid4().hex[:8]}"
+                    else:
+                        rid = f"repo_{uuid.uuid4().hex[:8]}"
+                except Exception as e:
+                    print(f"[clone_and_index] Warning: Could not generate repo_id from path: {e}")
+                    rid = f"repo_{uuid.uuid4().hex[:8]}"
+            
+            # Ensure we have a valid repo_id
+            if not rid or len(rid.strip()) == 0:
+                rid = f"repo_{uuid.uuid4().hex[:8]}"
+        except Exception as e:
+            print(f"[clone_and_index] Error generating repo_id: {e}")
+            import traceback
+            traceback.print_exc()
+            rid = f"repo_{uuid.uuid4().hex[:8]}"
+        
+        print(f"[clone_and_index] Repo ID: {rid}")
+        
+        # Slice + embed + index in bounded batches
+        store = FaissStore(rid, base_dir=f"{DATA_DIR}/index", in_memory=use_in_memory)
+        if job is not None:
+            job.report({"stage": "scanning", "repo_id": rid, "total_files": _count_repo_files(repo_path)})
+        progress = job.report if job is not None else _log_index_progress("clone_and_index")
+        stats = store.build_stream(iter_repo_chunks(repo_path), progress=progress)
+        print(f"[clone_and_index] Indexed {stats['chunks']} chunks")
+        get_index_cache().put(store)
+        print(f"[clone_and_index] Index built successfully")
+        
+        # Associate with user
+        user_auth.add_user_repository(
+            user_id=user_id,
+            repo_id=rid,
+            repo_path=repo_path,
+            repo_name=repo_name or rid
+        )
+        
+        # Update index status
+        user_auth.update_repository_index_status(
+            user_id=user_id,
+            repo_id=rid,
+            is_indexed=True,
+            chunks_count=stats["chunks"]
+        )
+        
+        # Start watching for changes
+        try:
+            sync_manager = get_sync_manager()
+            sync_manager.watch_repo(repo_path, rid, base_dir=f"{DATA_DIR}/index")
+            print(f"[clone_and_index] Started auto-sync")
+        except Exception as e:
+            print(f"[clone_and_index] Warning: Could not start auto-sync: {e}")
+        
+        return {
+            "ok": True,
+            "repo_id": rid,
+            "chunks": stats["chunks"],
+            "indexing": stats,
+            "cloned_path": repo_path,
+            "repo_name": repo_name or rid,
+            "git_url": git_url
+        }
+    except Exception:
+        # Clean up on error (including a cancelled job)
+        if target_dir.exists():
+            shutil.rmtree(target_dir, ignore_errors=True)
+        raise
+
+
 @app.post("/clone_and_index")
 @require_auth
 def clone_and_index():
@@ -640,6 +1004,7 @@ def clone_and_index():
     - repo_name: Optional name for the repository
     - branch: Optional branch name (default: main/master)
     - token: Optional authentication token for private repos
+    - async: Clone and index as a background job and return {ok, job_id} (202) right away
     
     Returns:
     - {ok, repo_id, chunks, cloned_path}
@@ -682,203 +1047,21 @@ def clone_and_index():
         # Sanitize repo name
         repo_name = secure_filename(repo_name)[:50]
         
-        # Create clone directory
-        clone_dir = Path(f"{DATA_DIR}/clones")
-        clone_dir.mkdir(parents=True, exist_ok=True)
-        
-        # Generate unique ID for this clone
-        clone_id = str(uuid.uuid4())[:8]
-        target_dir = clone_dir / clone_id
+        if data.get("async", False):
+            # The token is only passed to the job, never stored in its params
+            return _submit_index_job(
+                "clone_and_index",
+                lambda job: _clone_and_index_repo(git_url, repo_name, branch, token, user_id, job),
+                params={"git_url": git_url, "repo_name": repo_name, "branch": branch}
+            )
         
         try:
-            # Prepare Git URL with token if provided
-            clone_url = git_url
-            if token and git_url.startswith('https://'):
-                # Insert token into URL for authentication
-                # https://github.com/user/repo -> https://token@github.com/user/repo
-                clone_url = git_url.replace('https://', f'https://{token}@')
-            elif token and git_url.startswith('http://'):
-                clone_url = git_url.replace('http://', f'http://{token}@')
-            
-            print(f"[clone_and_index] Cloning repository: {git_url}")
-            print(f"[clone_and_index] Target directory: {target_dir}")
-            
-            # Clone repository
-            clone_cmd = ['git', 'clone', '--depth', '1', '--quiet']
-            
-            # Add branch if specified
-            if branch:
-                clone_cmd.extend(['--branch', branch])
-            
-            clone_cmd.extend([clone_url, str(target_dir)])
-            
-            print(f"[clone_and_index] Running: {' '.join(clone_cmd[:3])} ... [URL] ... {target_dir}")
-            
-            result = subprocess.run(
-                clone_cmd,
-                capture_output=True,
-                text=True,
-                timeout=300  # 5 minutes timeout
-            )
-            
-            if result.returncode != 0:
-                error_msg = result.stderr or result.stdout or "Unknown error"
-                
-                # Provide helpful error messages
-                if "fatal: repository" in error_msg.lower() or "not found" in error_msg.lower():
-                    return jsonify({
-                        "ok": False,
-                        "error": "Repository not found. Check the URL or ensure the repository is public. For private repos, provide an authentication token."
-                    }), 400
-                elif "authentication" in error_msg.lower() or "permission" in error_msg.lower():
-                    return jsonify({
-                        "ok": False,
-                        "error": "Authentication failed. For private repositories, provide a valid access token."
-                    }), 401
-                elif "could not resolve host" in error_msg.lower():
-                    return jsonify({
-                        "ok": False,
-                        "error": "Could not connect to Git server. Check your internet connection and the repository URL."
-                    }), 400
-                else:
-                    return jsonify({
-                        "ok": False,
-                        "error": f"Git clone failed: {error_msg[:200]}"
-                    }), 400
-            
-            print(f"[clone_and_index] Clone successful: {target_dir}")
-            
-            # Find the actual repository root
-            repo_root = target_dir
-            
-            # If clone created a subdirectory (common with git clone), use that
-            try:
-                entries = list(target_dir.iterdir())
-                if len(entries) == 1 and entries[0].is_dir():
-                    repo_root = entries[0]
-                elif len(entries) == 0:
-                    # Empty directory - shouldn't happen but handle it
-                    print(f"[clone_and_index] Warning: Clone directory is empty")
-                    raise Exception("Clone directory is empty - git clone may have failed")
-                # If multiple entries, use target_dir as root (repo files at top level)
-            except Exception as e:
-                print(f"[clone_and_index] Error finding repository root: {e}")
-                # Clean up on error
-                if target_dir.exists():
-                    shutil.rmtree(target_dir, ignore_errors=True)
-                raise Exception(f"Failed to locate repository root after clone: {e}")
-            
-            repo_path = str(repo_root.resolve())
-            if not Path(repo_path).exists():
-                # Clean up on error
-                if target_dir.exists():
-                    shutil.rmtree(target_dir, ignore_errors=True)
-                raise Exception(f"Repository path does not exist: {repo_path}")
-            
-            print(f"[clone_and_index] Repository root: {repo_path}")
-            
-            # Check privacy mode
-            privacy_mode = get_privacy_mode()
-            use_in_memory = privacy_mode.use_in_memory_storage()
-            
-            if use_in_memory:
-                print(f"[clone_and_index] Privacy mode enabled - Using in-memory storage")
-            else:
-                print(f"[clone_and_index] Using disk storage")
-            
-            # Index the cloned repository
-            print(f"[clone_and_index] Starting indexing...")
-            
-            # Use provided repo_name if available, otherwise generate from path
-            try:
-                if repo_name and repo_name.strip():
-                    rid = secure_filename(repo_name.strip())[:50]
-                    if not rid:  # If sanitization removed everything
-                        rid = f"repo_{uuid.uuid4().hex[:8]}"
-                else:
-                    # Generate from repository path
-                    try:
-                        rid = repo_id_from_path(repo_path)
-                        # Sanitize the repo_id
-                        if rid:
-                            rid = secure_filename(rid)[:50]
-                            if not rid:  # If sanitization removed everything
-                                rid = f"repo_{uuid.uuid4().hex[:8]}"
-                        else:
-                            rid = f"repo_{uuid.uuid4().hex[:8]}"
-                    except Exception as e:
-                        print(f"[clone_and_index] Warning: Could not generate repo_id from path: {e}")
-                        rid = f"repo_{uuid.uuid4().hex[:8]}"
-                
-                # Ensure we have a valid repo_id
-                if not rid or len(rid.strip()) == 0:
-                    rid = f"repo_{uuid.uuid4().hex[:8]}"
-            except Exception as e:
-                print(f"[clone_and_index] Error generating repo_id: {e}")
-                import traceback
-                traceback.print_exc()
-                rid = f"repo_{uuid.uuid4().hex[:8]}"
-            
-            print(f"[clone_and_index] Repo ID: {rid}")
-            
-            # Slice repository
-            chunks = slice_repo(repo_path)
-            print(f"[clone_and_index] Found {len(chunks)} chunks")
-            
-            # Create vector store
-            store = FaissStore(rid, base_dir=f"{DATA_DIR}/index", in_memory=use_in_memory)
-            store.build(chunks)
-            print(f"[clone_and_index] Index built successfully")
-            
-            # Associate with user
-            user_auth.add_user_repository(
-                user_id=user_id,
-                repo_id=rid,
-                repo_path=repo_path,
-                repo_name=repo_name or rid
-            )
-            
-            # Update index status
-            user_auth.update_repository_index_status(
-                user_id=user_id,
-                repo_id=rid,
-                is_indexed=True,
-                chunks_count=len(chunks)
-            )
-            
-            # Start watching for changes
-            try:
-                sync_manager = get_sync_manager()
-                sync_manager.watch_repo(repo_path, rid, base_dir=f"{DATA_DIR}/index")
-                print(f"[clone_and_index] Started auto-sync")
-            except Exception as e:
-                print(f"[clone_and_index] Warning: Could not start auto-sync: {e}")
-            
-            result = {
-                "ok": True,
-                "repo_id": rid,
-                "chunks": len(chunks),
-                "cloned_path": repo_path,
-                "repo_name": repo_name or rid,
-                "git_url": git_url
-            }
-            
-            print(f"[clone_and_index] Success: {result}")
-            return jsonify(result)
-            
-        except subprocess.TimeoutExpired:
-            # Clean up on timeout
-            if target_dir.exists():
-                shutil.rmtree(target_dir, ignore_errors=True)
-            return jsonify({
-                "ok": False,
-                "error": "Clone operation timed out. The repository may be too large or the network is slow."
-            }), 408
-        except Exception as e:
-            # Clean up on error
-            if target_dir.exists():
-                shutil.rmtree(target_dir, ignore_errors=True)
-            raise e
+            result = _clone_and_index_repo(git_url, repo_name, branch, token, user_id)
+        except CloneError as e:
+            return jsonify({"ok": False, "error": str(e)}), e.status
+        
+        print(f"[clone_and_index] Success: {result}")
+        return jsonify(result)
             
     except Exception as e:
         error_msg = str(e)
@@ -888,6 +1071,54 @@ def clone_and_index():
         return jsonify({"ok": False, "error": error_msg, "traceback": error_trace}), 500
 
 
+@app.get("/index_jobs")
+@require_auth
+def list_index_jobs():
+    """List the current user's indexing jobs (newest first)."""
+    jobs = get_index_job_manager().list_jobs(owner=request.current_user_id)
+    return jsonify({"ok": True, "jobs": [job.to_dict() for job in jobs]})
+
+
+def _get_owned_job(job_id: str) -> Optional[IndexJob]:
+    """A job of the current user (None if it doesn't exist or belongs to someone else)."""
+    job = get_index_job_manager().get(job_id)
+    if job is None or job.owner != request.current_user_id:
+        return None
+    return job
+
+
+@app.get("/index_jobs/<job_id>")
+@require_auth
+def get_index_job(job_id):
+    """Poll a job: {ok, job: {status, progress: {stage, files, total_files, chunks, chunks_per_second, eta_seconds}, result, error}}."""
+    job = _get_owned_job(job_id)
+    if job is None:
+        return jsonify({"ok": False, "error": "Job not found"}), 404
+    return jsonify({"ok": True, "job": job.to_dict()})
+
+
+@app.get("/index_jobs/<job_id>/events")
+@require_auth
+def stream_index_job(job_id):
+    """Stream a job's progress as server-sent events (?after=<seq> resumes after a reconnect)."""
+    job = _get_owned_job(job_id)
+    if job is None:
+        return jsonify({"ok": False, "error": "Job not found"}), 404
+    return _stream_job_events(job, after=request.args.get("after", 0, type=int))
+
+
+@app.post("/index_jobs/<job_id>/cancel")
+@require_auth
+def cancel_index_job(job_id):
+    """Cancel a queued or running job (a build in progress is discarded; the previous index stays)."""
+    job = _get_owned_job(job_id)
+    if job is None:
+        return jsonify({"ok": False, "error": "Job not found"}), 404
+    cancelled = get_index_job_manager().cancel(job_id)
+    return jsonify({"ok": cancelled, "job": job.to_dict(),
+                    **({} if cancelled else {"error": "Job already finished"})})
+
+
 @app.post("/search")
 @require_auth
 @rate_limit("search", max_requests=200, time_window=60)
@@ -905,24 +1136,42 @@ def search():
     - repo_dirs: List of repository directories (optional if repo_dir provided)
     - query: Search query (required)
     - k: Maximum number of results (optional, default: 6)
+    - nprobe: IVF recall/latency knob for large indexes (optional)
+    - ef_search: HNSW recall/latency knob for large indexes (optional)
+    - filters: Restrict vector results (optional), e.g.
+      {"path_prefix": "src/", "path_glob": "*.py", "language": "python",
+       "type": ["function", "class"], "exclude_files": [...]}
     """
     try:
         data = request.json or {}
         repo_dir = data.get("repo_dir")
         repo_dirs = data.get("repo_dirs", [])
         query = data.get("query")
-        k = int(data.get("k", TOP_K_FINAL))
         
         if not query:
             return jsonify({"ok": False, "error": "query is required"}), 400
         
+        try:
+            k = positive_int(data.get("k"), "k") or TOP_K_FINAL
+            nprobe = positive_int(data.get("nprobe"), "nprobe")
+            ef_search = positive_int(data.get("ef_search"), "ef_search")
+        except ValueError as e:
+            return jsonify({"ok": False, "error": str(e)}), 400
+        
+        try:
+            filters = SearchFilter.from_dict(data.get("filters"), repo_dir=repo_dir)
+        except ValueError as e:
+            return jsonify({"ok": False, "error": str(e)}), 400
+        # Filtered and unfiltered results are cached separately
+        cache_type = f"hybrid:{filters.cache_key()}" if filters else "hybrid"
+        
         # Multi-repo mode
         if repo_dirs:
             if not isinstance(repo_dirs, list):
                 return jsonify({"ok": False, "error": "repo_dirs must be a list"}), 400
             
             print(f"[search] Searching across {len(repo_dirs)} repositories...")
-            results = search_multiple_repos(repo_dirs, query, top_k=k, base_dir=f"{DATA_DIR}/index")
+            results = search_multiple_repos(repo_dirs, query, top_k=k, base_dir=f"{DATA_DIR}/index", filters=filters)
             
             return jsonify({
                 "ok": True,
@@ -937,9 +1186,8 @@ def search():
             return jsonify({"ok": False, "error": "repo_dir or repo_dirs must be provided"}), 400
         
         rid = repo_id_from_path(repo_dir)
-        store = FaissStore(rid, base_dir=f"{DATA_DIR}/index")
         
-        if not store.index_path.exists():
+        if not has_index(rid, base_dir=f"{DATA_DIR}/index"):
             return jsonify({
                 "ok": False,
                 "error": f"Repository not indexed. Please index it first using /index_repo",
@@ -956,7 +1204,7 @@ def search():
             try:
                 from backend.modules.cache import get_search_cache
                 search_cache = get_search_cache(cache_dir=f"{DATA_DIR}/cache/search")
-                cached_results = search_cache.get(query, repo_dir, search_type="hybrid")
+                cached_results = search_cache.get(query, repo_dir, search_type=cache_type)
                 if cached_results:
                     print(f"[search] Cache HIT for query: {query[:50]}...")
                     # Add repo_id for consistency
@@ -978,9 +1226,9 @@ def search():
         else:
             print(f"[search] Privacy mode enabled - skipping cache")
         
-        store.load()
+        store = get_store(rid, base_dir=f"{DATA_DIR}/index")
         rg = ripgrep_candidates(query, repo_dir)
-        vec = store.query(query, k=TOP_K_EMB)
+        vec = store.query(query, k=TOP_K_EMB, nprobe=nprobe, ef_search=ef_search, filters=filters)
         fused = fuse_results(rg, vec, top_k=k)
         
         # Cache the results (only if privacy mode allows)
@@ -988,7 +1236,7 @@ def search():
             try:
                 from backend.modules.cache import get_search_cache
                 search_cache = get_search_cache(cache_dir=f"{DATA_DIR}/cache/search")
-                search_cache.set(query, repo_dir, fused, search_type="hybrid")
+                search_cache.set(query, repo_dir, fused, search_type=cache_type)
                 print(f"[search] Cached results for query: {query[:50]}...")
             except Exception as e:
                 print(f"[search] Error caching results: {e}")
@@ -1156,16 +1404,15 @@ Or continue this conversation and I'll help you build it step by step!""",
             
             # Get repo ID and load vector store
             rid = repo_id_from_path(repo_dir)
-            store = FaissStore(rid, base_dir=f"{DATA_DIR}/index")
             
-            if not store.index_path.exists():
+            if not has_index(rid, base_dir=f"{DATA_DIR}/index"):
                 return jsonify({
                     "ok": False, 
                     "error": f"Repository not indexed. Please index it first using /index_repo",
                     "repo_id": rid
                 }), 400
             
-            store.load()
+            store = get_store(rid, base_dir=f"{DATA_DIR}/index")
             
             # Search for relevant code (hybrid search: ripgrep + vector)
             print(f"[chat] Searching codebase...")
@@ -1287,6 +1534,8 @@ def refactor():
         code_snippets = data.get("code_snippets")  # Direct snippets
         focus = data.get("focus", "")  # Optional focus area
         top_k = int(data.get("top_k", 5))
+        # Files read during this request (path -> FileView), so each is decoded once
+        file_views = {}
         
         # Validate input
         if code_snippets:
@@ -1310,9 +1559,11 @@ def refactor():
             if not target_file.exists():
                 return jsonify({"ok": False, "error": f"file_path not found: {file_path}"}), 400
             
-            # Load the file and handle based on size
+            # Load the file once and handle based on size
             try:
-                file_size_category = get_file_size_category(target_file)
+                view = FileView.read(target_file)
+                file_views[str(target_file)] = view
+                file_size_category = get_file_size_category(view)
                 print(f"[refactor] File size category: {file_size_category}")
                 
                 # For large files, use semantic chunking
@@ -1320,17 +1571,15 @@ def refactor():
                     # Use semantic chunking to extract functions/classes
                     print(f"[refactor] Using semantic chunking for large file")
                     evidences = chunk_large_file_semantically(
-                        target_file,
+                        view,
                         max_chunks=5,  # Get top 5 functions/classes
                         max_lines_per_chunk=200
                     )
                     
                     if not evidences:
                         # Fallback: use first portion of file
-                        content = target_file.read_text(encoding="utf-8", errors="ignore")
-                        lines = content.splitlines()
                         max_lines = 200
-                        limited_content = "\n".join(lines[:max_lines])
+                        limited_content = view.snippet(1, max_lines)
                         evidences = [{
                             "file": str(target_file),
                             "start": 1,
@@ -1339,13 +1588,11 @@ def refactor():
                         }]
                 else:
                     # Small/medium files: use full content
-                    content = target_file.read_text(encoding="utf-8", errors="ignore")
-                    lines = content.splitlines()
                     evidences = [{
                         "file": str(target_file),
                         "start": 1,
-                        "end": len(lines),
-                        "snippet": content
+                        "end": view.line_count,
+                        "snippet": view.text
                     }]
             except Exception as e:
                 return jsonify({"ok": False, "error": f"Error reading file: {str(e)}"}), 500
@@ -1360,16 +1607,15 @@ def refactor():
             
             # Get repo ID and load vector store
             rid = repo_id_from_path(repo_dir)
-            store = FaissStore(rid, base_dir=f"{DATA_DIR}/index")
             
-            if not store.index_path.exists():
+            if not has_index(rid, base_dir=f"{DATA_DIR}/index"):
                 return jsonify({
                     "ok": False,
                     "error": f"Repository not indexed. Please index it first using /index_repo",
                     "repo_id": rid
                 }), 400
             
-            store.load()
+            store = get_store(rid, base_dir=f"{DATA_DIR}/index")
             
             # Search for relevant code
             print(f"[refactor] Searching for code to refactor: {query}")
@@ -1411,7 +1657,8 @@ def refactor():
         evidences = optimize_for_refactoring(
             evidences,
             max_total_tokens=8000,  # Conservative token limit for refactoring
-            prefer_semantic=True
+            prefer_semantic=True,
+            views=file_views
         )
         print(f"[refactor] Optimized to {len(evidences)} snippet(s) for LLM processing")
         
@@ -2310,6 +2557,7 @@ def cache_stats():
         return jsonify({
             "ok": True,
             "stats": stats,
+            "indexes": get_index_cache().get_stats(),
             "summary": {
                 "total_hits": stats["llm"]["hits"] + stats["search"]["hits"] + stats["embeddings"]["hits"],
                 "total_misses": stats["llm"]["misses"] + stats["search"]["misses"] + stats["embeddings"]["misses"],
@@ -2332,12 +2580,12 @@ def cache_clear():
     Clear all caches or specific cache type.
     
     Accepts:
-    - cache_type: Optional, one of "llm", "search", "embeddings", or "all" (default: "all")
+    - cache_type: Optional, one of "llm", "search", "embeddings", "indexes", or "all" (default: "all")
     """
     try:
         from backend.modules.cache import (
             get_llm_cache, get_search_cache, get_embedding_cache,
-            clear_all_caches
+            get_chunk_embedding_store, get_query_embedding_cache, clear_all_caches
         )
         
         data = request.json or {}
@@ -2345,6 +2593,7 @@ def cache_clear():
         
         if cache_type == "all":
             cleared = clear_all_caches()
+            cleared["indexes"] = get_index_cache().clear()
             return jsonify({
                 "ok": True,
                 "message": "All caches cleared",
@@ -2366,15 +2615,29 @@ def cache_clear():
             })
         elif cache_type == "embeddings":
             count = get_embedding_cache(cache_dir=f"{DATA_DIR}/cache/embeddings").cache.clear()
+            cleared = {"embeddings": count}
+            chunk_store = get_chunk_embedding_store()
+            if chunk_store is not None:
+                cleared["chunk_embeddings"] = chunk_store.clear()
+            query_cache = get_query_embedding_cache()
+            if query_cache is not None:
+                cleared["query_embeddings"] = query_cache.clear()
             return jsonify({
                 "ok": True,
                 "message": "Embeddings cache cleared",
-                "cleared": {"embeddings": count}
+                "cleared": cleared
+            })
+        elif cache_type == "indexes":
+            count = get_index_cache().clear()
+            return jsonify({
+                "ok": True,
+                "message": "Index cache cleared",
+                "cleared": {"indexes": count}
             })
         else:
             return jsonify({
                 "ok": False,
-                "error": f"Invalid cache_type: {cache_type}. Must be one of: llm, search, embeddings, all"
+                "error": f"Invalid cache_type: {cache_type}. Must be one of: llm, search, embeddings, indexes, all"
             }), 400
     
     except ImportError:
@@ -2408,6 +2671,18 @@ def cache_cleanup():
         return jsonify({"ok": False, "error": str(e)}), 500
 
 
+@app.get("/models/stats")
+def model_stats():
+    """Get embedding model registry statistics (loaded models, load times)."""
+    try:
+        return jsonify({
+            "ok": True,
+            "stats": get_model_registry().get_stats()
+        })
+    except Exception as e:
+        return jsonify({"ok": False, "error": str(e)}), 500
+
+
 @app.get("/privacy/status")
 def privacy_status():
     """Get privacy mode status and statistics."""
@@ -3076,8 +3351,9 @@ def cleanup_privacy_mode():
     except Exception as e:
         print(f"[privacy] Error during cleanup: {e}")
 
-atexit.register(cleanup)
-atexit.register(cleanup_privacy_mode)
+if not SPAWNED_WORKER:
+    atexit.register(cleanup)
+    atexit.register(cleanup_privacy_mode)
 
 # App is run via backend/__main__.py when using: python -m backend.app
 # Or can be run directly with proper PYTHONPATH: PYTHONPATH=. python backend/app.py
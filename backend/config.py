@@ -65,6 +65,24 @@ TOP_K_FINAL = 6
 # === 数据路径 ===
 DATA_DIR = os.getenv("DATA_DIR", "data")
 
+# === 向量模型配置 ===
+# Embedding model used by FaissStore (local path or HuggingFace model name)
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", r"C:\Users\57811\models\all-MiniLM-L6-v2")
+# Device for the embedding model: "cpu", "cuda", "mps"... (empty = auto-detect)
+EMBEDDING_DEVICE = os.getenv("EMBEDDING_DEVICE", "")
+# Load the embedding model at app startup instead of on the first request
+EMBEDDING_WARMUP = os.getenv("EMBEDDING_WARMUP", "true").lower() in ("true", "1", "yes", "on")
+# Inference backend: "torch" (SentenceTransformer) or "onnx" (onnxruntime on an ONNX export of the same
+# model in the EMBEDDING_MODEL directory; no torch import, faster CPU encoding, compatible vectors)
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "torch").lower()
+# ONNX file relative to the model directory (empty = onnx/model.onnx or model.onnx; sentence-transformers
+# models on the HuggingFace Hub ship one under onnx/, or export with `optimum-cli export onnx`)
+EMBEDDING_ONNX_FILE = os.getenv("EMBEDDING_ONNX_FILE", "")
+# Use an int8-quantized export (quantized once from the fp32 export if none ships with the model)
+EMBEDDING_ONNX_QUANTIZE = os.getenv("EMBEDDING_ONNX_QUANTIZE", "false").lower() in ("true", "1", "yes", "on")
+# onnxruntime intra-op threads (0 = onnxruntime default)
+EMBEDDING_ONNX_THREADS = int(os.getenv("EMBEDDING_ONNX_THREADS", "0"))
+
 # === Privacy Mode Configuration ===
 # When enabled, no code will be stored in indexes or caches
 # Set PRIVACY_MODE=true in .env to enable
@@ -128,3 +146,122 @@ DEFAULT_IGNORE_PATTERNS = [
     ".pytest_cache/",
     ".nyc_output/",
 ]
+
+# === 索引缓存配置 ===
+# Total memory budget for loaded indexes kept resident between requests (whole repos are evicted LRU)
+INDEX_CACHE_MAX_MB = int(os.getenv("INDEX_CACHE_MAX_MB", "1024"))
+# How often (seconds) a cached index re-checks its files on disk; 0 = check on every request
+INDEX_CACHE_REVALIDATE_SECONDS = float(os.getenv("INDEX_CACHE_REVALIDATE_SECONDS", "2"))
+
+# === 向量持久化配置 ===
+# dtype of the raw embedding matrix stored next to each index ("float32" or "float16" to halve disk usage)
+EMBEDDING_STORE_DTYPE = os.getenv("EMBEDDING_STORE_DTYPE", "float32")
+
+# Content-addressed cache of chunk embeddings (snippet hash + model), reused across re-indexes/clones/forks
+CHUNK_EMBEDDING_CACHE = os.getenv("CHUNK_EMBEDDING_CACHE", "true").lower() in ("true", "1", "yes", "on")
+CHUNK_EMBEDDING_CACHE_MAX_MB = int(os.getenv("CHUNK_EMBEDDING_CACHE_MAX_MB", "2048"))
+
+# === 向量索引类型配置 ===
+# "auto" picks by chunk count: flat (exact) -> HNSW -> IVF. Or force one of "flat", "hnsw", "ivf".
+INDEX_TYPE = os.getenv("INDEX_TYPE", "auto").lower()
+INDEX_FLAT_MAX_CHUNKS = int(os.getenv("INDEX_FLAT_MAX_CHUNKS", "50000"))
+INDEX_HNSW_MAX_CHUNKS = int(os.getenv("INDEX_HNSW_MAX_CHUNKS", "1000000"))
+# HNSW graph parameters (efSearch = search-time recall/latency knob)
+INDEX_HNSW_M = int(os.getenv("INDEX_HNSW_M", "32"))
+INDEX_HNSW_EF_CONSTRUCTION = int(os.getenv("INDEX_HNSW_EF_CONSTRUCTION", "80"))
+INDEX_HNSW_EF_SEARCH = int(os.getenv("INDEX_HNSW_EF_SEARCH", "64"))
+# IVF parameters (nprobe = search-time recall/latency knob; centroids trained on a sample,
+# also used to train SQ8/PQ codecs)
+INDEX_IVF_NPROBE = int(os.getenv("INDEX_IVF_NPROBE", "16"))
+INDEX_IVF_TRAIN_SAMPLE = int(os.getenv("INDEX_IVF_TRAIN_SAMPLE", "100000"))
+# Compact once this fraction of the base index is tombstoned (deleted-but-not-removed)
+INDEX_TOMBSTONE_REBUILD_RATIO = float(os.getenv("INDEX_TOMBSTONE_REBUILD_RATIO", "0.2"))
+
+# === 向量压缩配置 ===
+# How vectors are stored inside the index: "none" (float32), "fp16" (2x smaller), "sq8" (int8 scalar, 4x)
+# or "pq" (product quantization, ~16x). Compressed indexes re-rank candidates exactly from stored vectors.
+INDEX_COMPRESSION = os.getenv("INDEX_COMPRESSION", "none").lower()
+# Compression for privacy-mode (RAM-only) indexes; these keep no raw vectors once compressed
+INDEX_COMPRESSION_IN_MEMORY = os.getenv("INDEX_COMPRESSION_IN_MEMORY", INDEX_COMPRESSION).lower()
+# PQ sub-quantizers (0 = auto, ~dimension/4 bytes per vector) and bits per sub-quantizer
+INDEX_PQ_M = int(os.getenv("INDEX_PQ_M", "0"))
+INDEX_PQ_NBITS = int(os.getenv("INDEX_PQ_NBITS", "8"))
+# Fetch k * factor candidates from a compressed index and re-rank them exactly (0 = no re-ranking)
+INDEX_RERANK_FACTOR = int(os.getenv("INDEX_RERANK_FACTOR", "4"))
+
+# === 代码片段存储配置 ===
+# Where chunk snippets live: "inline" (in the index metadata), "source" (only file/lines + hash stored,
+# text re-read from the working tree for returned results) or "packed" (compressed blob file per repo,
+# for cloned/uploaded repos whose working tree may go away)
+CHUNK_SNIPPET_STORAGE = os.getenv("CHUNK_SNIPPET_STORAGE", "inline").lower()
+
+# === 增量段/压缩合并配置 ===
+# Watcher updates are written as small delta segments + tombstones; a compactor folds them into the base
+# index once there are more than this many segments, or delta vectors exceed this fraction of the base
+INDEX_SEGMENT_MAX_DELTAS = int(os.getenv("INDEX_SEGMENT_MAX_DELTAS", "8"))
+INDEX_SEGMENT_MAX_DELTA_RATIO = float(os.getenv("INDEX_SEGMENT_MAX_DELTA_RATIO", "0.1"))
+# Run compaction in a background thread (false = inline in the save that triggers it)
+INDEX_BACKGROUND_COMPACTION = os.getenv("INDEX_BACKGROUND_COMPACTION", "true").lower() in ("true", "1", "yes", "on")
+
+# === 索引版本配置 ===
+# Every save publishes a new immutable index generation; keep this many recent ones on disk for
+# readers in other processes (older ones are deleted unless a reader in this process still holds them)
+INDEX_KEEP_GENERATIONS = int(os.getenv("INDEX_KEEP_GENERATIONS", "2"))
+
+# === 索引加载配置 ===
+# Memory-map index files on load (FAISS mmap IO flags) instead of copying them into each worker's RAM;
+# workers share one page-cache copy and cold repos cost almost nothing until queried
+INDEX_MMAP = os.getenv("INDEX_MMAP", "true").lower() in ("true", "1", "yes", "on")
+
+# === 查询向量缓存配置 ===
+# LRU of query text -> embedding (RAM only), so repeated questions/sub-questions skip the encoder; 0 = off
+QUERY_EMBEDDING_CACHE_SIZE = int(os.getenv("QUERY_EMBEDDING_CACHE_SIZE", "4096"))
+
+# === 编码并行配置 ===
+# Chunks per forward pass when embedding during indexing (snippets are length-sorted, so batches pad little)
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "64"))
+# Encoding worker processes for large builds (0 = auto: one per 4 CPU cores on CPU, 1 on GPU)
+EMBED_WORKERS = int(os.getenv("EMBED_WORKERS", "0"))
+# Only start worker processes for at least this many chunks (each worker loads its own model copy)
+EMBED_MULTIPROCESS_MIN_CHUNKS = int(os.getenv("EMBED_MULTIPROCESS_MIN_CHUNKS", "2000"))
+
+# === 语法树切片配置 ===
+# Semantic chunker: "auto" (tree-sitter where a grammar package is installed, regex patterns otherwise)
+# or "regex" (always the regex patterns; Python/JS/TS only, other languages get line windows)
+CHUNKER = os.getenv("CHUNKER", "auto").lower()
+# Longest chunk in lines; longer functions/classes are split at statement boundaries
+CHUNK_MAX_LINES = int(os.getenv("CHUNK_MAX_LINES", "120"))
+
+# === 切片大小配置 ===
+# Resize chunks to the embedding model's input window after chunking: split units the model would
+# truncate (at inner boundaries, with overlap) and merge tiny neighbouring units of the same scope
+CHUNK_TOKEN_SIZING = os.getenv("CHUNK_TOKEN_SIZING", "true").lower() in ("true", "1", "yes", "on")
+# Tokens per chunk (0 = the model's max_seq_length minus [CLS]/[SEP], or 254 if unknown); counted with the
+# model's tokenizer.json when EMBEDDING_MODEL is a local directory, otherwise estimated
+CHUNK_TOKEN_WINDOW = int(os.getenv("CHUNK_TOKEN_WINDOW", "0"))
+# Chunks below this many tokens are merged with adjacent siblings (0 = never merge)
+CHUNK_MIN_TOKENS = int(os.getenv("CHUNK_MIN_TOKENS", "32"))
+# Lines repeated at the start of each piece of a split unit
+CHUNK_SPLIT_OVERLAP_LINES = int(os.getenv("CHUNK_SPLIT_OVERLAP_LINES", "2"))
+
+# === 切片并行配置 ===
+# Processes that read + chunk files in parallel (0 = auto: one per CPU core, 1 = always in-process)
+SLICE_WORKERS = int(os.getenv("SLICE_WORKERS", "0"))
+# Only start worker processes for repos with at least this many files (spawning costs ~1s)
+SLICE_PARALLEL_MIN_FILES = int(os.getenv("SLICE_PARALLEL_MIN_FILES", "2000"))
+# Files per work unit sent to a worker (amortizes inter-process overhead)
+SLICE_UNIT_FILES = int(os.getenv("SLICE_UNIT_FILES", "32"))
+# Seconds a file may spend in semantic chunking before it is chunked by lines instead (0 = no limit)
+SLICE_FILE_TIMEOUT = float(os.getenv("SLICE_FILE_TIMEOUT", "20"))
+
+# === 索引构建配置 ===
+# Chunks read, embedded and written per step of a streaming build (bounds build memory regardless of repo size)
+INDEX_BUILD_BATCH_SIZE = int(os.getenv("INDEX_BUILD_BATCH_SIZE", "2048"))
+# Re-indexing an indexed repo only re-embeds added/modified files; above this share of changed
+# files a full rebuild is cheaper (and leaves no delta segments to compact)
+INDEX_INCREMENTAL_MAX_CHANGED_RATIO = float(os.getenv("INDEX_INCREMENTAL_MAX_CHANGED_RATIO", "0.5"))
+
+# === 后台索引任务配置 ===
+# Indexing jobs that run at the same time (more are queued) and finished jobs kept for status polling
+INDEX_JOB_WORKERS = int(os.getenv("INDEX_JOB_WORKERS", "2"))
+INDEX_JOB_HISTORY = int(os.getenv("INDEX_JOB_HISTORY", "100"))
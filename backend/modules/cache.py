@@ -4,11 +4,15 @@ Provides cost savings and performance improvements.
 """
 import json
 import hashlib
+import struct
+import threading
 import time
+from collections import OrderedDict
 from pathlib import Path
-from typing import Optional, Dict, Any, List
+from typing import Optional, Dict, Any, List, Tuple
 from datetime import datetime, timedelta
 import os
+import numpy as np
 
 # Global registry for in-memory caches (used when privacy mode is enabled)
 _in_memory_caches: Dict[str, Dict[str, Any]] = {}
@@ -494,10 +498,333 @@ class EmbeddingCache:
         return self.cache.get_stats()
 
 
+class _EmbeddingShard:
+    """
+    Append-only binary file of (digest, vector) records for one model fingerprint.
+
+    Layout: 16-byte header (magic, version, dim) followed by fixed-size records of
+    a 16-byte content digest + float32 vector. Records are memory-mapped for reads.
+    """
+    MAGIC = b"CEMB"
+    VERSION = 1
+    HEADER_SIZE = 16
+
+    def __init__(self, path: Path, dim: int):
+        self.path = path
+        self.dim = dim
+        self.record = np.dtype([("digest", "V16"), ("vec", "<f4", (dim,))])
+        self.offsets: Dict[bytes, int] = {}
+        self.count = 0
+        self.records = None
+        self._known_size = 0
+        self._file_id = None
+        self._lock = threading.Lock()
+
+        if self.path.exists() and not self._header_ok():
+            # Incompatible/corrupt file - start over
+            print(f"[cache] Discarding incompatible embedding store: {self.path.name}")
+            self.path.unlink()
+        if not self.path.exists():
+            self._create()
+        self._refresh()
+
+    def _create(self):
+        """Write a header-only file via temp file + rename, so no appender ever sees it without its header."""
+        header = self.MAGIC + struct.pack("<HHI", self.VERSION, 0, self.dim) + b"\0" * 4
+        tmp_path = self.path.with_name(f"{self.path.name}.{os.getpid()}-{threading.get_ident()}.tmp")
+        with open(tmp_path, "wb") as f:
+            f.write(header)
+        os.replace(tmp_path, self.path)
+
+    def _header_ok(self) -> bool:
+        with open(self.path, "rb") as f:
+            header = f.read(self.HEADER_SIZE)
+        if len(header) < self.HEADER_SIZE or header[:4] != self.MAGIC:
+            return False
+        version, _, dim = struct.unpack("<HHI", header[4:12])
+        return version == self.VERSION and dim == self.dim
+
+    def _refresh(self):
+        """Pick up records appended since the last look (including by other processes)."""
+        try:
+            st = self.path.stat()
+        except FileNotFoundError:
+            st = None
+        file_id = (st.st_dev, st.st_ino) if st is not None else None
+        if file_id != self._file_id or (st is not None and st.st_size < self._known_size):
+            # Cleared or recreated (by ChunkEmbeddingStore.clear or another process): forget the old records
+            self.offsets = {}
+            self.count = 0
+            self.records = None
+            self._known_size = 0
+            self._file_id = file_id
+        if st is None:
+            return
+        size = st.st_size
+        if size == self._known_size:
+            return
+        n = (size - self.HEADER_SIZE) // self.record.itemsize
+        if n > self.count:
+            self.records = np.memmap(self.path, dtype=self.record, mode="r", offset=self.HEADER_SIZE, shape=(n,))
+            raw = np.asarray(self.records["digest"][self.count:n]).tobytes()
+            for i in range(n - self.count):
+                self.offsets.setdefault(raw[i * 16:(i + 1) * 16], self.count + i)
+            self.count = n
+        self._known_size = size
+
+    def get_many(self, digests: List[bytes]) -> List[Optional[np.ndarray]]:
+        with self._lock:
+            self._refresh()
+            out = []
+            for digest in digests:
+                row = self.offsets.get(digest)
+                out.append(None if row is None else np.array(self.records["vec"][row], dtype=np.float32))
+            return out
+
+    def put_many(self, digests: List[bytes], vectors: np.ndarray) -> int:
+        with self._lock:
+            self._refresh()
+            new_rows = [i for i, d in enumerate(digests) if d not in self.offsets]
+            if not new_rows:
+                return 0
+            batch = np.zeros(len(new_rows), dtype=self.record)
+            batch["digest"] = [digests[i] for i in new_rows]
+            batch["vec"] = vectors[new_rows]
+            if self._file_id is None or self._known_size < self.HEADER_SIZE:
+                self._create()
+            for attempt in range(2):
+                try:
+                    # Never O_CREAT: a file removed under us is recreated with its header instead
+                    fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | getattr(os, "O_BINARY", 0))
+                except FileNotFoundError:
+                    if attempt:
+                        raise
+                    self._create()
+                    continue
+                with os.fdopen(fd, "wb") as f:
+                    f.write(batch.tobytes())
+                break
+            self._refresh()
+            return len(new_rows)
+
+    def size_bytes(self) -> int:
+        return self._known_size
+
+
+class _MemoryEmbeddingShard:
+    """In-memory equivalent of _EmbeddingShard (privacy mode: nothing touches disk)."""
+
+    def __init__(self, dim: int):
+        self.dim = dim
+        self.vectors: Dict[bytes, np.ndarray] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def count(self) -> int:
+        return len(self.vectors)
+
+    def get_many(self, digests: List[bytes]) -> List[Optional[np.ndarray]]:
+        return [self.vectors.get(d) for d in digests]
+
+    def put_many(self, digests: List[bytes], vectors: np.ndarray) -> int:
+        added = 0
+        with self._lock:
+            for digest, vec in zip(digests, vectors):
+                if digest not in self.vectors:
+                    self.vectors[digest] = np.array(vec, dtype=np.float32)
+                    added += 1
+        return added
+
+    def size_bytes(self) -> int:
+        return len(self.vectors) * (16 + self.dim * 4)
+
+
+class ChunkEmbeddingStore:
+    """
+    Content-addressed embedding cache for code chunks.
+    Key = SHA-256 of the snippet text, scoped by model fingerprint, so re-indexing an
+    unchanged repo, re-cloning it or indexing a fork only encodes chunks whose text changed.
+    """
+    def __init__(self, cache_dir: str = "data/cache/chunk_embeddings", in_memory: bool = False, max_mb: int = 2048):
+        """
+        Initialize chunk embedding store.
+        
+        Args:
+            cache_dir: Directory for the per-model binary files (ignored if in_memory=True)
+            in_memory: If True, use in-memory storage (RAM only)
+            max_mb: Stop adding new vectors once a model's store reaches this size
+        """
+        self.in_memory = in_memory
+        self.max_bytes = max_mb * 1024 * 1024
+        self.cache_dir = None
+        if not in_memory:
+            self.cache_dir = Path(cache_dir)
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self._shards: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+        self.stats = {
+            "hits": 0,
+            "misses": 0,
+            "sets": 0
+        }
+    
+    @staticmethod
+    def content_digest(text: str) -> bytes:
+        """16-byte content address of a snippet."""
+        return hashlib.sha256(text.encode("utf-8", errors="ignore")).digest()[:16]
+    
+    def _shard(self, fingerprint: str, dim: int):
+        shard = self._shards.get(fingerprint)
+        if shard is None:
+            with self._lock:
+                shard = self._shards.get(fingerprint)
+                if shard is None:
+                    if self.in_memory:
+                        shard = _MemoryEmbeddingShard(dim)
+                    else:
+                        shard = _EmbeddingShard(self.cache_dir / f"{fingerprint}.bin", dim)
+                    self._shards[fingerprint] = shard
+        return shard
+    
+    def get_many(self, fingerprint: str, dim: int, texts: List[str]) -> List[Optional[np.ndarray]]:
+        """Look up vectors for texts. Returns a list aligned with texts (None = miss)."""
+        found = self._shard(fingerprint, dim).get_many([self.content_digest(t) for t in texts])
+        hits = sum(1 for v in found if v is not None)
+        self.stats["hits"] += hits
+        self.stats["misses"] += len(found) - hits
+        return found
+    
+    def put_many(self, fingerprint: str, dim: int, texts: List[str], vectors: np.ndarray) -> int:
+        """Store vectors for texts. Returns number of new entries written."""
+        shard = self._shard(fingerprint, dim)
+        if shard.size_bytes() >= self.max_bytes:
+            return 0
+        added = shard.put_many([self.content_digest(t) for t in texts], np.asarray(vectors, dtype=np.float32))
+        self.stats["sets"] += added
+        return added
+    
+    def clear(self) -> int:
+        """Remove all stored vectors. Returns number of entries deleted."""
+        with self._lock:
+            count = sum(shard.count for shard in self._shards.values())
+            self._shards.clear()
+            if not self.in_memory:
+                for path in self.cache_dir.glob("*.bin"):
+                    try:
+                        path.unlink()
+                    except Exception as e:
+                        print(f"[cache] Error deleting {path}: {e}")
+        self.stats = {"hits": 0, "misses": 0, "sets": 0}
+        return count
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Get store statistics."""
+        total_entries = sum(shard.count for shard in self._shards.values())
+        if self.in_memory:
+            total_size = sum(shard.size_bytes() for shard in self._shards.values())
+        else:
+            total_size = sum(f.stat().st_size for f in self.cache_dir.glob("*.bin"))
+        lookups = self.stats["hits"] + self.stats["misses"]
+        return {
+            "total_entries": total_entries,
+            "total_size_bytes": total_size,
+            "total_size_mb": round(total_size / (1024 * 1024), 2),
+            "models": len(self._shards),
+            "hits": self.stats["hits"],
+            "misses": self.stats["misses"],
+            "sets": self.stats["sets"],
+            "evictions": 0,
+            "hit_rate": round(self.stats["hits"] / lookups * 100, 2) if lookups else 0.0,
+            "storage_type": "in-memory" if self.in_memory else "disk"
+        }
+
+
+class QueryEmbeddingCache:
+    """
+    Bounded LRU of query text -> embedding vector, scoped by model fingerprint.
+    RAM only (query text never touches disk), shared by every FaissStore in the process.
+    """
+    def __init__(self, max_entries: int = 4096):
+        """
+        Args:
+            max_entries: Number of vectors kept (least recently used are evicted)
+        """
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Tuple[str, str], np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {
+            "hits": 0,
+            "misses": 0,
+            "evictions": 0
+        }
+    
+    @staticmethod
+    def normalize(text: str) -> str:
+        """Collapse whitespace so reformatted repeats of a query share an entry (case is kept)."""
+        return " ".join(str(text).split())
+    
+    def get_many(self, fingerprint: str, texts: List[str]) -> List[Optional[np.ndarray]]:
+        """Look up vectors for queries. Returns a list aligned with texts (None = miss)."""
+        found = []
+        with self._lock:
+            for text in texts:
+                key = (fingerprint, self.normalize(text))
+                vec = self._entries.get(key)
+                if vec is not None:
+                    self._entries.move_to_end(key)
+                    self.stats["hits"] += 1
+                else:
+                    self.stats["misses"] += 1
+                found.append(vec)
+        return found
+    
+    def put_many(self, fingerprint: str, texts: List[str], vectors: np.ndarray):
+        """Store vectors for queries."""
+        with self._lock:
+            for text, vec in zip(texts, vectors):
+                vec = np.array(vec, dtype=np.float32)
+                vec.setflags(write=False)  # shared between callers
+                key = (fingerprint, self.normalize(text))
+                self._entries[key] = vec
+                self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.stats["evictions"] += 1
+    
+    def clear(self) -> int:
+        """Remove all entries. Returns number of entries deleted."""
+        with self._lock:
+            count = len(self._entries)
+            self._entries.clear()
+            self.stats = {"hits": 0, "misses": 0, "evictions": 0}
+        return count
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Get cache statistics."""
+        with self._lock:
+            total_entries = len(self._entries)
+            total_size = sum(v.nbytes + len(k[1]) for k, v in self._entries.items())
+            stats = dict(self.stats)
+        lookups = stats["hits"] + stats["misses"]
+        return {
+            "total_entries": total_entries,
+            "max_entries": self.max_entries,
+            "total_size_bytes": total_size,
+            "total_size_mb": round(total_size / (1024 * 1024), 2),
+            "hits": stats["hits"],
+            "misses": stats["misses"],
+            "evictions": stats["evictions"],
+            "hit_rate": round(stats["hits"] / lookups * 100, 2) if lookups else 0.0,
+            "storage_type": "in-memory"
+        }
+
+
 # Global cache instances (singletons)
 _llm_cache: Optional[LLMResponseCache] = None
 _search_cache: Optional[SearchResultCache] = None
 _embedding_cache: Optional[EmbeddingCache] = None
+_chunk_embedding_store: Optional[ChunkEmbeddingStore] = None
+_query_embedding_cache: Optional[QueryEmbeddingCache] = None
 
 
 def get_llm_cache(cache_dir: str = "data/cache/llm", ttl: int = 86400, in_memory: bool = None) -> LLMResponseCache:
@@ -560,22 +887,77 @@ def get_embedding_cache(cache_dir: str = "data/cache/embeddings", ttl: int = 604
     return _embedding_cache
 
 
+def get_chunk_embedding_store(cache_dir: str = None, in_memory: bool = None) -> Optional[ChunkEmbeddingStore]:
+    """
+    Get or create the content-addressed chunk embedding store singleton.
+    Returns None if disabled via CHUNK_EMBEDDING_CACHE=false.
+    
+    Args:
+        cache_dir: Store directory (defaults to DATA_DIR/cache/chunk_embeddings, ignored if in_memory=True)
+        in_memory: If True, use in-memory storage. If None, auto-detect from privacy mode.
+    """
+    global _chunk_embedding_store
+    from backend.config import DATA_DIR, CHUNK_EMBEDDING_CACHE, CHUNK_EMBEDDING_CACHE_MAX_MB
+    if not CHUNK_EMBEDDING_CACHE:
+        return None
+    if in_memory is None:
+        # Auto-detect from privacy mode
+        from backend.modules.privacy import get_privacy_mode
+        in_memory = get_privacy_mode().use_in_memory_storage()
+    
+    if _chunk_embedding_store is None:
+        _chunk_embedding_store = ChunkEmbeddingStore(
+            cache_dir or f"{DATA_DIR}/cache/chunk_embeddings",
+            in_memory=in_memory,
+            max_mb=CHUNK_EMBEDDING_CACHE_MAX_MB
+        )
+    return _chunk_embedding_store
+
+
+def get_query_embedding_cache() -> Optional[QueryEmbeddingCache]:
+    """
+    Get or create the query embedding LRU singleton.
+    Returns None if disabled via QUERY_EMBEDDING_CACHE_SIZE=0.
+    """
+    global _query_embedding_cache
+    from backend.config import QUERY_EMBEDDING_CACHE_SIZE
+    if QUERY_EMBEDDING_CACHE_SIZE <= 0:
+        return None
+    if _query_embedding_cache is None:
+        _query_embedding_cache = QueryEmbeddingCache(max_entries=QUERY_EMBEDDING_CACHE_SIZE)
+    return _query_embedding_cache
+
+
 def get_all_cache_stats() -> Dict[str, Any]:
     """Get statistics from all caches."""
-    return {
+    stats = {
         "llm": get_llm_cache().get_stats(),
         "search": get_search_cache().get_stats(),
         "embeddings": get_embedding_cache().get_stats()
     }
+    chunk_store = get_chunk_embedding_store()
+    if chunk_store is not None:
+        stats["chunk_embeddings"] = chunk_store.get_stats()
+    query_cache = get_query_embedding_cache()
+    if query_cache is not None:
+        stats["query_embeddings"] = query_cache.get_stats()
+    return stats
 
 
 def clear_all_caches() -> Dict[str, int]:
     """Clear all caches. Returns count of entries cleared per cache."""
-    return {
+    cleared = {
         "llm": get_llm_cache().cache.clear(),
         "search": get_search_cache().cache.clear(),
         "embeddings": get_embedding_cache().cache.clear()
     }
+    chunk_store = get_chunk_embedding_store()
+    if chunk_store is not None:
+        cleared["chunk_embeddings"] = chunk_store.clear()
+    query_cache = get_query_embedding_cache()
+    if query_cache is not None:
+        cleared["query_embeddings"] = query_cache.clear()
+    return cleared
 
 
 def cleanup_all_caches() -> Dict[str, int]:
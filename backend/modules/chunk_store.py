@@ -0,0 +1,308 @@
+"""
+Per-repo chunk metadata store.
+Chunk metadata (file, lines, snippet...) lives in SQLite next to the FAISS index,
+keyed by vector id with an index on file path, so updates touch single rows and
+loading a repo doesn't deserialize every snippet.
+"""
+import json
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional, Iterable, Any, Tuple
+
+
+class SqliteChunkStore:
+    """Chunk metadata in a per-repo SQLite database (row-level inserts/deletes)."""
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS chunks (
+            id INTEGER PRIMARY KEY,
+            file TEXT NOT NULL,
+            data TEXT NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS ix_chunks_file ON chunks(file);
+        CREATE TABLE IF NOT EXISTS store_meta (
+            key TEXT PRIMARY KEY,
+            value TEXT NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS files (
+            path TEXT PRIMARY KEY,
+            size INTEGER NOT NULL,
+            mtime_ns INTEGER NOT NULL,
+            hash TEXT NOT NULL,
+            chunk_ids TEXT NOT NULL
+        );
+    """
+
+    def __init__(self, db_path: Path):
+        """
+        Args:
+            db_path: SQLite database file (created if missing)
+        """
+        self.db_path = Path(db_path)
+        # Shared by request threads; writes are committed explicitly by commit()
+        self._conn = sqlite3.connect(str(self.db_path), check_same_thread=False, timeout=30)
+        self._lock = threading.RLock()
+        with self._lock:
+            # WAL lets searches read while another store object writes
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.executescript(self.SCHEMA)
+            self._conn.commit()
+        self._count: Optional[int] = None
+
+    def insert_many(self, chunks: Iterable[Dict]):
+        """
+        Insert chunks; each chunk must carry its vector "id" (from allocate_ids).
+        Raises sqlite3.IntegrityError if an id is already taken, instead of overwriting another chunk.
+        """
+        rows = [(int(c["id"]), str(c.get("file")), json.dumps(c, ensure_ascii=False)) for c in chunks]
+        with self._lock:
+            self._conn.executemany("INSERT INTO chunks (id, file, data) VALUES (?, ?, ?)", rows)
+            self._count = None
+
+    def allocate_ids(self, n: int) -> int:
+        """
+        Reserve n new vector ids and return the first one.
+        The counter is read and bumped inside this connection's write transaction, which commit()
+        ends. Another store object on the same database blocks here until then and continues after
+        these ids, so two writers never hand out the same id.
+        """
+        with self._lock:
+            if not self._conn.in_transaction:
+                self._conn.execute("BEGIN IMMEDIATE")
+            first = self.max_id() + 1
+            self._conn.execute(
+                "INSERT OR REPLACE INTO store_meta (key, value) VALUES ('max_id', ?)", (str(first + n - 1),)
+            )
+        return first
+
+    def get(self, chunk_id: int) -> Optional[Dict]:
+        """Get one chunk by vector id."""
+        with self._lock:
+            row = self._conn.execute("SELECT data FROM chunks WHERE id = ?", (int(chunk_id),)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def get_many(self, ids: Iterable[int]) -> Dict[int, Dict]:
+        """Get chunks by vector id (missing ids are left out)."""
+        ids = [int(i) for i in ids]
+        result = {}
+        with self._lock:
+            # Stay under SQLite's bound-parameter limit
+            for start in range(0, len(ids), 500):
+                batch = ids[start:start + 500]
+                placeholders = ",".join("?" * len(batch))
+                for chunk_id, data in self._conn.execute(
+                    f"SELECT id, data FROM chunks WHERE id IN ({placeholders})", batch
+                ):
+                    result[chunk_id] = json.loads(data)
+        return result
+
+    def ids_for_file(self, file_path: str) -> List[int]:
+        """Vector ids of all chunks from a file."""
+        with self._lock:
+            rows = self._conn.execute("SELECT id FROM chunks WHERE file = ?", (str(file_path),)).fetchall()
+        return [r[0] for r in rows]
+
+    def delete_ids(self, ids: Iterable[int]):
+        """Delete chunks by vector id."""
+        with self._lock:
+            self._conn.executemany("DELETE FROM chunks WHERE id = ?", [(int(i),) for i in ids])
+            self._count = None
+
+    def clear(self):
+        """Delete all chunks (and the file manifest describing them)."""
+        with self._lock:
+            self._conn.execute("DELETE FROM chunks")
+            self._conn.execute("DELETE FROM files")
+            self._conn.execute("DELETE FROM store_meta WHERE key = 'file_manifest'")
+            self._count = None
+
+    def count(self) -> int:
+        """Number of chunks."""
+        if self._count is None:
+            with self._lock:
+                self._count = self._conn.execute("SELECT COUNT(*) FROM chunks").fetchone()[0]
+        return self._count
+
+    def max_id(self) -> int:
+        """Highest vector id ever handed out (-1 if none); survives clear() so ids are never reused."""
+        with self._lock:
+            row = self._conn.execute("SELECT MAX(id) FROM chunks").fetchone()
+            meta = self._conn.execute("SELECT value FROM store_meta WHERE key = 'max_id'").fetchone()
+        candidates = [v for v in (row[0], int(meta[0]) if meta else None) if v is not None]
+        return max(candidates) if candidates else -1
+
+    def filter_rows(self) -> List[Tuple[int, str, Optional[str]]]:
+        """(id, file, type) of every chunk, for search filter bitmaps (snippets aren't read)."""
+        with self._lock:
+            return self._conn.execute("SELECT id, file, json_extract(data, '$.type') FROM chunks").fetchall()
+
+    def first_file(self) -> Optional[str]:
+        """Path of any indexed file (used to guess the repo directory)."""
+        with self._lock:
+            row = self._conn.execute("SELECT file FROM chunks LIMIT 1").fetchone()
+        return row[0] if row else None
+
+    def file_records(self) -> Dict[str, Dict]:
+        """File manifest: path -> {path, size, mtime_ns, hash, chunk_ids} of every indexed file."""
+        with self._lock:
+            rows = self._conn.execute("SELECT path, size, mtime_ns, hash, chunk_ids FROM files").fetchall()
+        return {
+            path: {"path": path, "size": size, "mtime_ns": mtime_ns, "hash": digest, "chunk_ids": json.loads(ids)}
+            for path, size, mtime_ns, digest, ids in rows
+        }
+
+    def put_file_records(self, records: Iterable[Dict]):
+        """Insert (or replace) file manifest records."""
+        rows = [(str(r["path"]), int(r["size"]), int(r["mtime_ns"]), r["hash"], json.dumps(list(r.get("chunk_ids", []))))
+                for r in records]
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO files (path, size, mtime_ns, hash, chunk_ids) VALUES (?, ?, ?, ?, ?)", rows
+            )
+
+    def delete_file_records(self, paths: Iterable[str]):
+        """Drop files from the manifest."""
+        with self._lock:
+            self._conn.executemany("DELETE FROM files WHERE path = ?", [(str(p),) for p in paths])
+
+    def has_file_manifest(self) -> bool:
+        """True if the manifest covers every indexed file (written by a full build)."""
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM store_meta WHERE key = 'file_manifest'").fetchone()
+        return row is not None
+
+    def mark_file_manifest(self):
+        """Record that the manifest is complete (a full build wrote a record for every file)."""
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO store_meta (key, value) VALUES ('file_manifest', '1')")
+
+    def commit(self):
+        """Commit pending writes (called when the index itself is saved)."""
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO store_meta (key, value) VALUES ('max_id', ?)",
+                (str(self.max_id()),)
+            )
+            self._conn.commit()
+
+    def rollback(self):
+        """Discard pending writes, including ids reserved by allocate_ids (the index save failed)."""
+        with self._lock:
+            self._conn.rollback()
+            self._count = None
+
+    def memory_bytes(self) -> int:
+        """Metadata lives on disk; only SQLite's page cache is resident."""
+        return 2 * 1024 * 1024
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class MemoryChunkStore:
+    """RAM-only equivalent for in-memory (privacy mode) stores - never touches disk."""
+
+    def __init__(self):
+        self._chunks: Dict[int, Dict] = {}
+        self._file_ids: Dict[str, List[int]] = {}
+        self._files: Dict[str, Dict] = {}
+        self._file_manifest = False
+        self._max_id = -1
+
+    def insert_many(self, chunks: Iterable[Dict]):
+        for c in chunks:
+            chunk_id = int(c["id"])
+            if chunk_id in self._chunks:
+                raise ValueError(f"Chunk id {chunk_id} is already taken")
+            self._file_ids.setdefault(str(c.get("file")), []).append(chunk_id)
+            self._chunks[chunk_id] = c
+            self._max_id = max(self._max_id, chunk_id)
+
+    def allocate_ids(self, n: int) -> int:
+        first = self._max_id + 1
+        self._max_id += n
+        return first
+
+    def get(self, chunk_id: int) -> Optional[Dict]:
+        return self._chunks.get(int(chunk_id))
+
+    def get_many(self, ids: Iterable[int]) -> Dict[int, Dict]:
+        return {int(i): self._chunks[int(i)] for i in ids if int(i) in self._chunks}
+
+    def ids_for_file(self, file_path: str) -> List[int]:
+        return list(self._file_ids.get(str(file_path), []))
+
+    def delete_ids(self, ids: Iterable[int]):
+        for chunk_id in ids:
+            chunk = self._chunks.pop(int(chunk_id), None)
+            if chunk is None:
+                continue
+            file_ids = self._file_ids.get(str(chunk.get("file")))
+            if file_ids is not None:
+                file_ids.remove(int(chunk_id))
+                if not file_ids:
+                    del self._file_ids[str(chunk.get("file"))]
+
+    def clear(self):
+        self._chunks.clear()
+        self._file_ids.clear()
+        self._files.clear()
+        self._file_manifest = False
+
+    def count(self) -> int:
+        return len(self._chunks)
+
+    def max_id(self) -> int:
+        return self._max_id
+
+    def filter_rows(self) -> List[Tuple[int, str, Optional[str]]]:
+        return [(chunk_id, str(c.get("file")), c.get("type")) for chunk_id, c in self._chunks.items()]
+
+    def first_file(self) -> Optional[str]:
+        return next(iter(self._file_ids), None)
+
+    def file_records(self) -> Dict[str, Dict]:
+        return {path: dict(record) for path, record in self._files.items()}
+
+    def put_file_records(self, records: Iterable[Dict]):
+        for record in records:
+            self._files[str(record["path"])] = dict(record, chunk_ids=list(record.get("chunk_ids", [])))
+
+    def delete_file_records(self, paths: Iterable[str]):
+        for path in paths:
+            self._files.pop(str(path), None)
+
+    def has_file_manifest(self) -> bool:
+        return self._file_manifest
+
+    def mark_file_manifest(self):
+        self._file_manifest = True
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+    def memory_bytes(self) -> int:
+        return sum(len(c.get("snippet", "")) + len(str(c.get("file", ""))) + 200 for c in self._chunks.values())
+
+    def close(self):
+        pass
+
+
+def read_chunk_summary(db_path: Path) -> Dict[str, Any]:
+    """
+    Chunk count and a sample file path for a repo, without loading its metadata.
+    Opens the database read-only so listing repos never creates or locks anything.
+    """
+    conn = sqlite3.connect(f"file:{Path(db_path).resolve().as_posix()}?mode=ro", uri=True, timeout=30)
+    try:
+        count = conn.execute("SELECT COUNT(*) FROM chunks").fetchone()[0]
+        row = conn.execute("SELECT file FROM chunks LIMIT 1").fetchone()
+    finally:
+        conn.close()
+    return {"chunks": count, "first_file": row[0] if row else None}
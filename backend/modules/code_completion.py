@@ -8,9 +8,10 @@ import re
 
 from backend.modules.llm_api import get_fresh_client
 from backend.modules.search import ripgrep_candidates, fuse_results
-from backend.modules.vector_store import FaissStore
+from backend.modules.index_cache import get_store, has_index
 from backend.modules.context_retriever import expand_code_context
 from backend.modules.multi_repo import repo_id_from_path
+from backend.modules.search_filters import SearchFilter
 from backend.config import LLM_PROVIDER, LLM_MODEL, DEEPSEEK_API_KEY, ANTHROPIC_API_KEY, DATA_DIR, TOP_K_EMB, TOP_K_FINAL
 import os
 
@@ -136,25 +137,22 @@ def get_related_code_from_repo(
     try:
         # Get repo ID and load vector store
         repo_id = repo_id_from_path(repo_dir)
-        store = FaissStore(repo_id, base_dir=f"{DATA_DIR}/index")
-        
-        if not store.index_path.exists():
+        if not has_index(repo_id, base_dir=f"{DATA_DIR}/index"):
             return ""
         
-        store.load()
+        store = get_store(repo_id, base_dir=f"{DATA_DIR}/index")
         
         # Create search query from current context
         # Extract key concepts from current code (last few lines)
         lines = current_context.splitlines()
         query_text = " ".join(lines[-5:])  # Use last 5 lines as query
         
-        # Search for related code
-        vec_results = store.query(query_text, k=TOP_K_EMB)
-        
-        # Filter out the current file to avoid duplication
-        filtered_results = [r for r in vec_results if r.get("file") != file_path]
+        # Search for related code, excluding the current file (inside the search, so all k results are usable)
+        filtered_results = store.query(
+            query_text, k=max_results,
+            filters=SearchFilter(exclude_files=[file_path], repo_dir=repo_dir)
+        )
         
-        # Limit results
         related_code_parts = []
         for result in filtered_results[:max_results]:
             file_path_rel = result.get("file", "")
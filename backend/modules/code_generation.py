@@ -10,7 +10,7 @@ import subprocess
 
 from backend.modules.llm_api import get_fresh_client
 from backend.modules.search import ripgrep_candidates, fuse_results
-from backend.modules.vector_store import FaissStore
+from backend.modules.index_cache import get_store, has_index
 from backend.modules.context_retriever import expand_code_context
 from backend.modules.multi_repo import repo_id_from_path
 from backend.config import LLM_PROVIDER, LLM_MODEL, DEEPSEEK_API_KEY, ANTHROPIC_API_KEY, DATA_DIR, TOP_K_EMB, TOP_K_FINAL
@@ -166,12 +166,10 @@ def get_codebase_context(
     try:
         # Get repo ID and load vector store
         repo_id = repo_id_from_path(repo_dir)
-        store = FaissStore(repo_id, base_dir=f"{DATA_DIR}/index")
-        
-        if not store.index_path.exists():
+        if not has_index(repo_id, base_dir=f"{DATA_DIR}/index"):
             return ""
         
-        store.load()
+        store = get_store(repo_id, base_dir=f"{DATA_DIR}/index")
         
         # Search for similar code patterns
         vec_results = store.query(request, k=TOP_K_EMB)
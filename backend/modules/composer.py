@@ -11,7 +11,7 @@ from datetime import datetime
 
 from backend.modules.llm_api import get_fresh_client
 from backend.modules.search import ripgrep_candidates, fuse_results
-from backend.modules.vector_store import FaissStore
+from backend.modules.index_cache import get_store, has_index
 from backend.modules.multi_repo import repo_id_from_path
 from backend.config import LLM_PROVIDER, LLM_MODEL, DEEPSEEK_API_KEY, ANTHROPIC_API_KEY, DATA_DIR, TOP_K_EMB
 import os
@@ -183,10 +183,8 @@ def compose_multi_file_edit(
         codebase_context = ""
         try:
             repo_id = repo_id_from_path(repo_dir)
-            store = FaissStore(repo_id, base_dir=f"{DATA_DIR}/index")
-            
-            if store.index_path.exists():
-                store.load()
+            if has_index(repo_id, base_dir=f"{DATA_DIR}/index"):
+                store = get_store(repo_id, base_dir=f"{DATA_DIR}/index")
                 vec_results = store.query(request, k=TOP_K_EMB)
                 context_parts = []
                 for result in vec_results[:5]:
@@ -11,7 +11,7 @@ import os
 
 from backend.modules.llm_api import get_fresh_client
 from backend.modules.search import ripgrep_candidates, fuse_results
-from backend.modules.vector_store import FaissStore
+from backend.modules.index_cache import get_store, has_index
 from backend.modules.multi_repo import repo_id_from_path
 from backend.modules.context_retriever import expand_code_context
 from backend.config import (
@@ -131,10 +131,8 @@ def edit_code_directly(
         if repo_dir:
             try:
                 repo_id = repo_id_from_path(repo_dir)
-                store = FaissStore(repo_id, base_dir=f"{DATA_DIR}/index")
-                
-                if store.index_path.exists():
-                    store.load()
+                if has_index(repo_id, base_dir=f"{DATA_DIR}/index"):
+                    store = get_store(repo_id, base_dir=f"{DATA_DIR}/index")
                     # Search for related code
                     search_query = f"{instruction} {selected_code[:100]}"
                     vec_results = store.query(search_query, k=min(TOP_K_EMB, 3))
@@ -331,10 +329,8 @@ def stream_edit_code_directly(
         if repo_dir:
             try:
                 repo_id = repo_id_from_path(repo_dir)
-                store = FaissStore(repo_id, base_dir=f"{DATA_DIR}/index")
-                
-                if store.index_path.exists():
-                    store.load()
+                if has_index(repo_id, base_dir=f"{DATA_DIR}/index"):
+                    store = get_store(repo_id, base_dir=f"{DATA_DIR}/index")
                     # Search for related code
                     search_query = f"{instruction} {selected_code[:100]}"
                     vec_results = store.query(search_query, k=min(TOP_K_EMB, 3))
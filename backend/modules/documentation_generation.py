@@ -11,7 +11,7 @@ import ast
 
 from backend.modules.llm_api import get_fresh_client
 from backend.modules.search import ripgrep_candidates, fuse_results
-from backend.modules.vector_store import FaissStore
+from backend.modules.index_cache import get_store, has_index
 from backend.modules.multi_repo import repo_id_from_path
 from backend.config import (
     LLM_PROVIDER, LLM_MODEL, DEEPSEEK_API_KEY, ANTHROPIC_API_KEY,
@@ -532,10 +532,8 @@ def generate_documentation(
             if repo_dir:
                 try:
                     repo_id = repo_id_from_path(repo_dir)
-                    store = FaissStore(repo_id, base_dir=f"{DATA_DIR}/index")
-                    
-                    if store.index_path.exists():
-                        store.load()
+                    if has_index(repo_id, base_dir=f"{DATA_DIR}/index"):
+                        store = get_store(repo_id, base_dir=f"{DATA_DIR}/index")
                         vec_results = store.query(f"documentation {code_to_document[:100]}", k=min(TOP_K_EMB, 3))
                         
                         context_parts = []
@@ -739,10 +737,8 @@ def stream_generate_documentation(
             if repo_dir:
                 try:
                     repo_id = repo_id_from_path(repo_dir)
-                    store = FaissStore(repo_id, base_dir=f"{DATA_DIR}/index")
-                    
-                    if store.index_path.exists():
-                        store.load()
+                    if has_index(repo_id, base_dir=f"{DATA_DIR}/index"):
+                        store = get_store(repo_id, base_dir=f"{DATA_DIR}/index")
                         vec_results = store.query(f"documentation {code_to_document[:100]}", k=min(TOP_K_EMB, 3))
                         
                         context_parts = []
@@ -0,0 +1,147 @@
+"""
+Bulk encoding for indexing.
+Snippets are sorted by token length so each batch pads to similar lengths, then
+encoded in tunable batches - in one process, or across a pool of worker processes
+(sentence-transformers multi-process pool) for large repos on many-core machines.
+"""
+import os
+import time
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from backend.config import EMBED_BATCH_SIZE, EMBED_WORKERS, EMBED_MULTIPROCESS_MIN_CHUNKS
+
+
+def resolve_workers(device: Optional[str] = None) -> int:
+    """Number of encoding processes: EMBED_WORKERS, or (0 = auto) one per 4 CPU cores on CPU."""
+    if EMBED_WORKERS > 0:
+        return EMBED_WORKERS
+    if device and not str(device).startswith("cpu"):
+        # One GPU/accelerator is already saturated by a single process
+        return 1
+    return max(1, (os.cpu_count() or 1) // 4)
+
+
+class EncodingPool:
+    """
+    Encodes many texts with length-bucketed batches, optionally across worker processes.
+    With keep_alive, worker processes are started once and reused by every encode()
+    until close() (a streaming build encodes batch after batch); otherwise they are
+    stopped after each call.
+    """
+
+    def __init__(self, model, batch_size: int = EMBED_BATCH_SIZE, workers: Optional[int] = None,
+                 multiprocess_min: int = EMBED_MULTIPROCESS_MIN_CHUNKS, keep_alive: bool = False):
+        """
+        Args:
+            model: Loaded SentenceTransformer
+            batch_size: Texts per forward pass
+            workers: Worker processes (None = resolve_workers for the model's device)
+            multiprocess_min: Inputs smaller than this are encoded in-process (spawning workers costs a model load each)
+            keep_alive: Keep worker processes between encode() calls (call close() when done)
+        """
+        self.model = model
+        self.batch_size = max(1, batch_size)
+        self.workers = workers if workers is not None else resolve_workers(str(getattr(model, "device", "cpu")))
+        self.multiprocess_min = multiprocess_min
+        self.keep_alive = keep_alive
+        self._pool = None
+        self.stats: Dict[str, Any] = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        """Stop worker processes, if any are running."""
+        if self._pool is not None:
+            pool, self._pool = self._pool, None
+            self.model.stop_multi_process_pool(pool)
+
+    def _token_lengths(self, texts: List[str]) -> np.ndarray:
+        """Token count per text (character count if the model exposes no tokenizer)."""
+        if hasattr(self.model, "token_lengths"):
+            return self.model.token_lengths(texts)
+        tokenizer = getattr(self.model, "tokenizer", None)
+        if tokenizer is not None:
+            try:
+                max_length = getattr(self.model, "max_seq_length", None) or 512
+                lengths = []
+                for start in range(0, len(texts), 4096):
+                    encoded = tokenizer(texts[start:start + 4096], add_special_tokens=False,
+                                        truncation=True, max_length=max_length)
+                    lengths.extend(len(ids) for ids in encoded["input_ids"])
+                return np.asarray(lengths)
+            except Exception as e:
+                print(f"[encoding_pool] Tokenizer length failed ({e}), sorting by characters")
+        return np.fromiter((len(t) for t in texts), dtype=np.int64, count=len(texts))
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        """
+        Encode texts into normalized float32 vectors, returned in input order.
+        Throughput of the call is recorded in self.stats.
+        """
+        texts = list(texts)
+        start = time.time()
+        if not texts:
+            self.stats = {"texts": 0, "seconds": 0.0, "texts_per_second": 0.0, "workers": 0}
+            return np.zeros((0, self.model.get_sentence_embedding_dimension()), dtype=np.float32)
+
+        # Longest first: batches hold similar lengths (little padding) and the slowest batches start early
+        order = np.argsort(-self._token_lengths(texts), kind="stable")
+        ordered = [texts[i] for i in order]
+
+        # A running pool is used for any size; starting one is only worth it for large inputs
+        workers = self.workers if len(texts) >= self.multiprocess_min or self._pool is not None else 1
+        if workers > 1 and hasattr(self.model, "start_multi_process_pool"):
+            embeds = self._encode_multiprocess(ordered, workers)
+        else:
+            workers = 1
+            embeds = self.model.encode(ordered, batch_size=self.batch_size, normalize_embeddings=True)
+
+        out = np.empty((len(texts), embeds.shape[1]), dtype=np.float32)
+        out[order] = np.asarray(embeds, dtype=np.float32)
+
+        elapsed = time.time() - start
+        self.stats = {
+            "texts": len(texts),
+            "seconds": round(elapsed, 3),
+            "texts_per_second": round(len(texts) / elapsed, 1) if elapsed > 0 else None,
+            "workers": workers,
+            "batch_size": self.batch_size
+        }
+        print(f"[encoding_pool] Encoded {len(texts)} texts in {elapsed:.1f}s "
+              f"({self.stats['texts_per_second']}/s, {workers} worker(s), batch {self.batch_size})")
+        return out
+
+    def _start_pool(self, workers: int):
+        """Spawn worker processes (each loads its own model copy)."""
+        # Split cores between workers, so each process' torch threads don't oversubscribe the CPU
+        threads = str(max(1, (os.cpu_count() or 1) // workers))
+        saved = {name: os.environ.get(name) for name in ("OMP_NUM_THREADS", "MKL_NUM_THREADS")}
+        os.environ.update({name: threads for name in saved})
+        try:
+            return self.model.start_multi_process_pool(target_devices=["cpu"] * workers)
+        finally:
+            for name, value in saved.items():
+                if value is None:
+                    os.environ.pop(name, None)
+                else:
+                    os.environ[name] = value
+
+    def _encode_multiprocess(self, ordered: List[str], workers: int) -> np.ndarray:
+        """Encode length-sorted texts across worker processes."""
+        if self._pool is None:
+            self._pool = self._start_pool(workers)
+        try:
+            # Contiguous length-sorted chunks, so every worker batch stays tightly padded
+            chunk_size = max(self.batch_size, min(5000, -(-len(ordered) // (workers * 4))))
+            return self.model.encode_multi_process(
+                ordered, self._pool, batch_size=self.batch_size, chunk_size=chunk_size, normalize_embeddings=True
+            )
+        finally:
+            if not self.keep_alive:
+                self.close()
@@ -0,0 +1,62 @@
+"""
+Read-once view of a source file.
+A FileView reads and decodes a file a single time and caches its line table, so
+every chunker and large-file helper that looks at the same file during one
+indexing or refactor pass shares that work instead of re-reading the file.
+"""
+from bisect import bisect_right
+from itertools import accumulate
+from pathlib import Path
+from typing import List, Optional, Union
+
+
+class FileView:
+    """Decoded text of one file plus lazily built line tables."""
+
+    __slots__ = ("path", "text", "_lines", "_offsets")
+
+    def __init__(self, path, text: str):
+        self.path = Path(path)
+        self.text = text
+        self._lines: Optional[List[str]] = None
+        self._offsets: Optional[List[int]] = None
+
+    @classmethod
+    def read(cls, path) -> "FileView":
+        """Read and decode a file (UTF-8, undecodable bytes dropped). Raises OSError."""
+        with open(path, "rb") as f:
+            data = f.read()
+        return cls(path, data.decode("utf-8", errors="ignore"))
+
+    @classmethod
+    def of(cls, source: Union["FileView", str, Path]) -> "FileView":
+        """`source` itself if it is already a view, otherwise a fresh view of that path."""
+        return source if isinstance(source, FileView) else cls.read(source)
+
+    @property
+    def lines(self) -> List[str]:
+        """Lines without terminators (str.splitlines), computed once."""
+        if self._lines is None:
+            self._lines = self.text.splitlines()
+        return self._lines
+
+    @property
+    def line_count(self) -> int:
+        return len(self.lines)
+
+    @property
+    def line_offsets(self) -> List[int]:
+        """Character offset at which each line starts (index 0 = line 1)."""
+        if self._offsets is None:
+            lengths = [len(line) for line in self.text.splitlines(keepends=True)]
+            self._offsets = [0] + list(accumulate(lengths))[:-1] if lengths else []
+        return self._offsets
+
+    def line_of(self, offset: int) -> int:
+        """1-indexed line containing a character offset (e.g. of a regex match in `text`)."""
+        return max(1, bisect_right(self.line_offsets, offset))
+
+    def snippet(self, start: int, end: int) -> str:
+        """Lines start..end (1-indexed, inclusive) joined with "\\n"."""
+        return "\n".join(self.lines[max(start, 1) - 1:end])
+
@@ -7,7 +7,8 @@ import threading
 from pathlib import Path
 from typing import Dict, Set, Callable, Optional
 from queue import Queue
-import fnmatch
+
+from backend.modules.ignore import IgnoreMatcher
 
 try:
     from watchdog.observers import Observer
@@ -28,14 +29,14 @@ if WATCHDOG_AVAILABLE:
     class CodeChangeHandler(FileSystemEventHandler):
         """Handles file system events for code files."""
         
-        def __init__(self, callback: Callable[[str, str], None], ignore_patterns: Set[str]):
+        def __init__(self, callback: Callable[[str, str], None], matcher: IgnoreMatcher):
             """
             Args:
                 callback: Function to call with (file_path, event_type)
-                ignore_patterns: Patterns to ignore (from .gitignore and config)
+                matcher: The repo's ignore rules (same matcher the indexer walks with)
             """
             self.callback = callback
-            self.ignore_patterns = ignore_patterns
+            self.matcher = matcher
             self.event_queue = Queue()
             self.debounce_time = 2.0  # Wait 2 seconds after last change
             self.last_event_time = {}
@@ -46,25 +47,9 @@ if WATCHDOG_AVAILABLE:
             """Check if file should be ignored based on patterns."""
             path_obj = Path(file_path)
             
-            # Check each pattern
-            for pattern in self.ignore_patterns:
-                # Convert pattern to work with fnmatch
-                if pattern.endswith('/'):
-                    # Directory pattern - only match if actual directory in path
-                    pattern_str = pattern.rstrip('/')
-                    # Check if any parent directory name matches (not file name)
-                    for parent in path_obj.parents:
-                        if fnmatch.fnmatch(parent.name, pattern_str) or pattern_str in str(parent):
-                            return True
-                    # Don't match file names with directory patterns
-                else:
-                    # File pattern - match filename or full path
-                    if fnmatch.fnmatch(path_obj.name, pattern) or fnmatch.fnmatch(str(path_obj), pattern):
-                        return True
-                    # Check parent directories (for patterns like "test_*")
-                    for parent in path_obj.parents:
-                        if fnmatch.fnmatch(parent.name, pattern):
-                            return True
+            # .gitignore rules (events are only delivered for files)
+            if self.matcher.ignores(path_obj, is_dir=False):
+                return True
             
             # Also check file extension - we only care about code files
             code_extensions = {'.py', '.js', '.ts', '.jsx', '.tsx', '.java', '.cpp', '.c', '.h', 
@@ -195,19 +180,20 @@ if WATCHDOG_AVAILABLE:
     class RepoWatcher:
         """Watches a repository directory for changes."""
         
-        def __init__(self, repo_dir: str, callback: Callable[[str, str], None], ignore_patterns: Set[str]):
+        def __init__(self, repo_dir: str, callback: Callable[[str, str], None],
+                     matcher: Optional[IgnoreMatcher] = None):
             """
             Args:
                 repo_dir: Repository directory to watch
                 callback: Function to call with (file_path, event_type) when file changes
-                ignore_patterns: Patterns to ignore
+                matcher: Ignore rules for the repo (defaults to its .gitignore files + DEFAULT_IGNORE_PATTERNS)
             """
             if not WATCHDOG_AVAILABLE:
                 raise ImportError("watchdog library not installed. Run: pip install watchdog")
             
             self.repo_dir = Path(repo_dir).resolve()
             self.callback = callback
-            self.ignore_patterns = ignore_patterns
+            self.matcher = matcher if matcher is not None else IgnoreMatcher(self.repo_dir)
             self.observer = None
             self.handler = None
             self.is_watching = False
@@ -217,7 +203,7 @@ if WATCHDOG_AVAILABLE:
             if self.is_watching:
                 return
             
-            self.handler = CodeChangeHandler(self.callback, self.ignore_patterns)
+            self.handler = CodeChangeHandler(self.callback, self.matcher)
             self.observer = Observer()
             self.observer.schedule(self.handler, str(self.repo_dir), recursive=True)
             self.observer.start()
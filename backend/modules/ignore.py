@@ -0,0 +1,279 @@
+"""
+Gitignore-style path filtering for repository walks and file watching.
+Patterns are compiled once into regexes with .gitignore semantics (anchored
+patterns, `**`, directory-only patterns, `!` negations, nested .gitignore files
+where deeper files and later lines win), and the walker prunes ignored
+directories before entering them, so node_modules/, .git/ or venv/ cost one
+check instead of a full descent.
+"""
+import os
+import re
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+from backend.config import DEFAULT_IGNORE_PATTERNS
+
+GITIGNORE_FILE = ".gitignore"
+
+
+def _translate_segment(segment: str) -> str:
+    """Regex for one path segment of a glob (`*`, `?` and `[...]` never match `/`)."""
+    i, n, out = 0, len(segment), []
+    while i < n:
+        c = segment[i]
+        i += 1
+        if c == "\\" and i < n:
+            out.append(re.escape(segment[i]))
+            i += 1
+        elif c == "*":
+            while i < n and segment[i] == "*":
+                i += 1
+            out.append("[^/]*")
+        elif c == "?":
+            out.append("[^/]")
+        elif c == "[":
+            j = i
+            if j < n and segment[j] in "!^":
+                j += 1
+            if j < n and segment[j] == "]":
+                j += 1
+            while j < n and segment[j] != "]":
+                j += 1
+            if j >= n:
+                out.append("\\[")
+                continue
+            body = segment[i:j].replace("\\", "\\\\")
+            if body[0] in "!^":
+                body = "^" + body[1:]
+            out.append(f"[{body}]")
+            i = j + 1
+        else:
+            out.append(re.escape(c))
+    return "".join(out)
+
+
+def _translate(pattern: str) -> str:
+    """Regex body for a `/`-separated glob relative to its .gitignore's directory."""
+    segments = pattern.split("/")
+    out = []
+    for i, segment in enumerate(segments):
+        last = i == len(segments) - 1
+        if segment == "**":
+            # "a/**" matches everything inside a; "**/" matches zero or more directories
+            out.append(".*" if last else "(?:[^/]*/)*")
+        else:
+            out.append(_translate_segment(segment) + ("" if last else "/"))
+    return "".join(out)
+
+
+class IgnoreRule:
+    """One compiled .gitignore line."""
+
+    __slots__ = ("pattern", "regex", "negated", "dir_only")
+
+    def __init__(self, pattern: str, regex: str, negated: bool, dir_only: bool):
+        self.pattern = pattern
+        self.regex = re.compile(regex)
+        self.negated = negated
+        self.dir_only = dir_only
+
+    @classmethod
+    def parse(cls, line: str) -> Optional["IgnoreRule"]:
+        """Compile a .gitignore line (None for blank lines and comments)."""
+        line = line.rstrip("\r\n")
+        stripped = line.rstrip(" ")
+        if stripped.endswith("\\") and len(stripped) < len(line):
+            stripped += " "  # "\ " keeps a trailing space
+        line = stripped
+        if not line or line.startswith("#"):
+            return None
+        pattern = line
+        negated = line.startswith("!")
+        if negated:
+            line = line[1:]
+        elif line.startswith(("\\!", "\\#")):
+            line = line[1:]
+        dir_only = line.endswith("/")
+        line = line.rstrip("/")
+        if not line:
+            return None
+        # A slash anywhere but at the end anchors the pattern to the .gitignore's directory
+        anchored = "/" in line
+        body = _translate(line.lstrip("/"))
+        if not anchored:
+            body = "(?:.*/)?" + body
+        return cls(pattern, f"^{body}$", negated, dir_only)
+
+
+class IgnoreRules:
+    """The rules of one directory level, in file order (later lines win)."""
+
+    def __init__(self, rules: List[IgnoreRule]):
+        self.rules = rules
+        # One combined regex per kind of path, so paths no rule touches cost a single match
+        self._any_file = self._combine([r for r in rules if not r.dir_only])
+        self._any_dir = self._combine(rules)
+
+    @staticmethod
+    def _combine(rules: List[IgnoreRule]):
+        if not rules:
+            return None
+        return re.compile("|".join(f"(?:{r.regex.pattern})" for r in rules))
+
+    @classmethod
+    def from_lines(cls, lines: Iterable[str]) -> "IgnoreRules":
+        return cls([rule for rule in (IgnoreRule.parse(line) for line in lines) if rule is not None])
+
+    def decide(self, rel_path: str, is_dir: bool) -> Optional[bool]:
+        """True (ignored) / False (re-included by a negation) / None (no rule matches)."""
+        combined = self._any_dir if is_dir else self._any_file
+        if combined is None or not combined.match(rel_path):
+            return None
+        for rule in reversed(self.rules):
+            if (is_dir or not rule.dir_only) and rule.regex.match(rel_path):
+                return not rule.negated
+        return None
+
+
+def _read_lines(path: Path) -> List[str]:
+    try:
+        with open(path, "r", encoding="utf-8", errors="ignore") as f:
+            return f.readlines()
+    except OSError as e:
+        print(f"[ignore] Warning: Could not read {path}: {e}")
+        return []
+
+
+class IgnoreMatcher:
+    """
+    Decides which paths of a repository are ignored: DEFAULT_IGNORE_PATTERNS, then
+    .git/info/exclude and the root .gitignore, then nested .gitignore files (each
+    relative to its own directory). .gitignore files are re-read when they change,
+    so a long-lived matcher (file watcher) follows edits to them.
+    """
+
+    def __init__(self, root, patterns: Optional[Iterable[str]] = None):
+        """
+        Args:
+            root: Repository root
+            patterns: Base patterns replacing the defaults + root .gitignore
+                      (e.g. from parser.load_gitignore); nested .gitignore files still apply
+        """
+        self.root = Path(root)
+        self._patterns = list(patterns) if patterns is not None else None
+        # rel dir -> (.gitignore mtime, rules); "" is the root level
+        self._cache: Dict[str, Tuple[Optional[int], Optional[IgnoreRules]]] = {}
+
+    def _root_lines(self) -> List[str]:
+        if self._patterns is not None:
+            return self._patterns
+        lines = list(DEFAULT_IGNORE_PATTERNS)
+        exclude = self.root / ".git" / "info" / "exclude"
+        if exclude.is_file():
+            lines += _read_lines(exclude)
+        return lines
+
+    def rules_for(self, rel_dir: str) -> Optional[IgnoreRules]:
+        """Rules declared in a directory (relative, "" = root), or None if it declares none."""
+        path = self.root / rel_dir / GITIGNORE_FILE
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except OSError:
+            mtime = None
+        if rel_dir == "" and self._patterns is not None:
+            mtime = None  # the given patterns already include the root .gitignore
+        cached = self._cache.get(rel_dir)
+        if cached is not None and cached[0] == mtime:
+            return cached[1]
+        lines = self._root_lines() if rel_dir == "" else []
+        if mtime is not None:
+            lines = lines + _read_lines(path)
+        rules = IgnoreRules.from_lines(lines) if lines else None
+        if rules is not None and not rules.rules:
+            rules = None
+        self._cache[rel_dir] = (mtime, rules)
+        return rules
+
+    @staticmethod
+    def _decide(rel_path: str, is_dir: bool, chain: List[Tuple[str, IgnoreRules]]) -> bool:
+        # Deepest .gitignore first, so the rule that comes last in git's order wins
+        for prefix, rules in reversed(chain):
+            verdict = rules.decide(rel_path[len(prefix):], is_dir)
+            if verdict is not None:
+                return verdict
+        return False
+
+    def _chain(self, rel_dir: str, chain: List[Tuple[str, IgnoreRules]]) -> List[Tuple[str, IgnoreRules]]:
+        rules = self.rules_for(rel_dir)
+        if rules is None:
+            return chain
+        return chain + [(rel_dir + "/" if rel_dir else "", rules)]
+
+    def is_ignored(self, rel_path: str, is_dir: bool = False) -> bool:
+        """
+        Whether a `/`-separated path relative to the root is ignored, either itself or
+        because a parent directory is (git doesn't look inside ignored directories).
+        """
+        parts = [p for p in rel_path.replace("\\", "/").split("/") if p]
+        if not parts:
+            return False
+        chain = self._chain("", [])
+        rel_dir = ""
+        for part in parts[:-1]:
+            rel_dir = f"{rel_dir}/{part}" if rel_dir else part
+            if self._decide(rel_dir, True, chain):
+                return True
+            chain = self._chain(rel_dir, chain)
+        return self._decide("/".join(parts), is_dir, chain)
+
+    def ignores(self, path, is_dir: Optional[bool] = None) -> bool:
+        """is_ignored for a filesystem path (paths outside the root are never ignored)."""
+        path = Path(path)
+        try:
+            rel = path.relative_to(self.root)
+        except ValueError:
+            try:
+                rel = path.resolve().relative_to(self.root.resolve())
+            except (ValueError, OSError):
+                return False
+        if is_dir is None:
+            is_dir = path.is_dir()
+        return self.is_ignored(rel.as_posix(), is_dir)
+
+    def walk(self, suffixes: Optional[Set[str]] = None) -> Iterator[Path]:
+        """
+        Files under the root that aren't ignored (sorted; each directory's files before its subdirectories).
+        Ignored directories are never entered; symlinked directories aren't followed.
+
+        Args:
+            suffixes: Only yield files with one of these (lowercase) extensions
+        """
+        stack = [(str(self.root), "", self._chain("", []))]
+        while stack:
+            dir_path, rel_dir, chain = stack.pop()
+            try:
+                with os.scandir(dir_path) as it:
+                    entries = sorted(it, key=lambda e: e.name)
+            except OSError as e:
+                print(f"[ignore] Warning: Could not list {dir_path}: {e}")
+                continue
+            subdirs = []
+            for entry in entries:
+                rel = f"{rel_dir}/{entry.name}" if rel_dir else entry.name
+                try:
+                    is_dir = entry.is_dir(follow_symlinks=False)
+                except OSError:
+                    continue
+                if self._decide(rel, is_dir, chain):
+                    continue
+                if is_dir:
+                    subdirs.append((entry.path, rel))
+                elif suffixes is None or os.path.splitext(entry.name)[1].lower() in suffixes:
+                    try:
+                        if entry.is_file():
+                            yield Path(entry.path)
+                    except OSError:
+                        continue
+            # Reversed onto the stack, so directories come out in sorted order
+            for sub_path, sub_rel in reversed(subdirs):
+                stack.append((sub_path, sub_rel, self._chain(sub_rel, chain)))
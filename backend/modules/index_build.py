@@ -0,0 +1,100 @@
+"""
+Helpers for streaming index builds.
+FaissStore.iter_build consumes chunks in fixed-size batches: each batch is
+encoded, its metadata written to a staging chunk store and its vectors appended
+to a VectorSpool, so memory stays bounded by the batch size instead of growing
+with the repo.
+"""
+import os
+from itertools import islice
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional
+
+import numpy as np
+
+from backend.modules.index_generations import fsync_file
+
+# Per-build scratch directories under the index directory (never referenced by a generation)
+STAGING_DIR = "staging"
+
+
+def batched(items: Iterable[Dict], size: int) -> Iterator[List[Dict]]:
+    """Split an iterable into lists of at most `size` items."""
+    iterator = iter(items)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+class VectorSpool:
+    """
+    Append-only buffer of a build's vectors: a raw file on disk, or a list of
+    arrays for in-memory stores (which keep everything in RAM anyway).
+    """
+
+    def __init__(self, d: int, dtype, path: Optional[Path] = None):
+        """
+        Args:
+            d: Vector dimension
+            dtype: Stored dtype (EMBEDDING_STORE_DTYPE)
+            path: Raw spool file (None = keep vectors in RAM)
+        """
+        self.d = d
+        self.dtype = np.dtype(dtype)
+        self.path = Path(path) if path is not None else None
+        self.count = 0
+        self._parts: List[np.ndarray] = []
+        self._file = open(self.path, "wb") if self.path is not None else None
+
+    def __len__(self) -> int:
+        return self.count
+
+    def append(self, vectors: np.ndarray):
+        vectors = np.ascontiguousarray(vectors, dtype=self.dtype).reshape(-1, self.d)
+        if self._file is not None:
+            self._file.write(vectors.tobytes())
+        else:
+            self._parts.append(vectors)
+        self.count += len(vectors)
+
+    def finish(self, out_path: Optional[Path] = None, block_size: int = 65536) -> np.ndarray:
+        """
+        All appended vectors as one (n x d) matrix: written to out_path as .npy and
+        memory-mapped (disk spools), or concatenated (RAM spools).
+        """
+        if self._file is None:
+            parts, self._parts = self._parts, []
+            if not parts:
+                return np.zeros((0, self.d), dtype=self.dtype)
+            return np.concatenate(parts) if len(parts) > 1 else parts[0]
+
+        self._file.close()
+        self._file = None
+        out_path = Path(out_path)
+        tmp_path = out_path.with_name(out_path.name + ".tmp")
+        matrix = np.lib.format.open_memmap(tmp_path, mode="w+", dtype=self.dtype, shape=(self.count, self.d))
+        if self.count:
+            raw = np.memmap(self.path, dtype=self.dtype, mode="r", shape=(self.count, self.d))
+            for start in range(0, self.count, block_size):
+                matrix[start:start + block_size] = raw[start:start + block_size]
+            del raw
+        matrix.flush()
+        del matrix
+        fsync_file(tmp_path)
+        os.replace(tmp_path, out_path)
+        self.discard()
+        return np.load(out_path, mmap_mode="r")
+
+    def discard(self):
+        """Drop the spool (after finish() or when a build is abandoned)."""
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        self._parts = []
+        if self.path is not None:
+            try:
+                self.path.unlink()
+            except FileNotFoundError:
+                pass
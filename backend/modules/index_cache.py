@@ -0,0 +1,210 @@
+"""
+Process-level LRU cache of loaded FaissStore objects.
+Keeps hot repositories resident so searches don't re-read the index from disk.
+"""
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Any
+
+from backend.modules.vector_store import (
+    FaissStore, _in_memory_stores, index_key, get_index_generation
+)
+from backend.config import DATA_DIR, INDEX_CACHE_MAX_MB, INDEX_CACHE_REVALIDATE_SECONDS
+
+
+class _CacheEntry:
+    """A loaded store plus the state it was validated against."""
+
+    def __init__(self, store: FaissStore, generation: int, signature):
+        self.store = store
+        self.generation = generation
+        self.signature = signature
+        self.size_bytes = store.memory_bytes()
+        self.checked_at = time.time()
+        self.hits = 0
+
+
+class IndexCache:
+    """
+    LRU cache of loaded stores keyed by repo.
+
+    Entries are revalidated against the in-process generation counter (free)
+    and, at most every `revalidate_interval` seconds, against file mtime/size.
+    Whole repos are evicted once the memory budget is exceeded.
+    """
+
+    def __init__(self, max_bytes: int, revalidate_interval: float = 2.0):
+        """
+        Args:
+            max_bytes: Total memory budget for cached stores
+            revalidate_interval: Seconds between on-disk revalidation checks
+        """
+        self.max_bytes = max_bytes
+        self.revalidate_interval = revalidate_interval
+        self._entries: "OrderedDict[str, _CacheEntry]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._load_locks: Dict[str, threading.Lock] = {}
+        self.stats = {
+            "hits": 0,
+            "misses": 0,
+            "reloads": 0,
+            "evictions": 0
+        }
+
+    def _is_fresh(self, entry: _CacheEntry) -> bool:
+        """Check if a cached entry still matches the index it was loaded from."""
+        if entry.generation != get_index_generation(entry.store.key):
+            return False
+        if time.time() - entry.checked_at < self.revalidate_interval:
+            return True
+        signature = entry.store.file_signature()
+        entry.checked_at = time.time()
+        return signature is not None and signature == entry.signature
+
+    def get(self, repo_id: str, base_dir: str) -> FaissStore:
+        """
+        Get a loaded store for a repo, loading it from disk on a miss.
+
+        Raises:
+            FileNotFoundError: If the repo has no index
+        """
+        key = index_key(repo_id, base_dir)
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self._is_fresh(entry):
+                self._entries.move_to_end(key)
+                entry.hits += 1
+                self.stats["hits"] += 1
+                return entry.store
+            load_lock = self._load_locks.setdefault(key, threading.Lock())
+
+        # Load outside the global lock; concurrent requests for the same repo wait on one load
+        with load_lock:
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry is not None and self._is_fresh(entry):
+                    self._entries.move_to_end(key)
+                    self.stats["hits"] += 1
+                    return entry.store
+                stale = entry is not None
+
+            if not FaissStore.index_exists(repo_id, base_dir):
+                self.invalidate(repo_id, base_dir)
+                raise FileNotFoundError(f"Index not found for repo: {repo_id}")
+
+            generation = get_index_generation(key)
+            store = FaissStore(repo_id, base_dir=base_dir)
+            signature = store.file_signature()
+            store.load()
+
+            with self._lock:
+                if stale:
+                    self.stats["reloads"] += 1
+                else:
+                    self.stats["misses"] += 1
+                self._put(key, _CacheEntry(store, generation, signature))
+            return store
+
+    def put(self, store: FaissStore):
+        """Insert a freshly built/updated disk store (avoids re-reading what was just written)."""
+        if store.in_memory or store.index is None:
+            return
+        entry = _CacheEntry(store, get_index_generation(store.key), store.file_signature())
+        with self._lock:
+            self._put(store.key, entry)
+
+    def _put(self, key: str, entry: _CacheEntry):
+        """Insert an entry and evict least recently used repos over budget (lock held)."""
+        self._entries.pop(key, None)
+        if entry.size_bytes > self.max_bytes:
+            # Larger than the whole budget - serve it, but don't keep it resident
+            print(f"[index_cache] {entry.store.repo_id} exceeds cache budget, not caching")
+            return
+        self._entries[key] = entry
+        while self._total_bytes() > self.max_bytes and len(self._entries) > 1:
+            evicted_key, evicted = self._entries.popitem(last=False)
+            self.stats["evictions"] += 1
+            print(f"[index_cache] Evicted {evicted.store.repo_id} ({evicted.size_bytes / (1024 * 1024):.1f} MB)")
+
+    def _total_bytes(self) -> int:
+        return sum(e.size_bytes for e in self._entries.values())
+
+    def invalidate(self, repo_id: str, base_dir: str) -> bool:
+        """Drop a repo from the cache."""
+        with self._lock:
+            return self._entries.pop(index_key(repo_id, base_dir), None) is not None
+
+    def clear(self) -> int:
+        """Drop all cached repos. Returns number of entries removed."""
+        with self._lock:
+            count = len(self._entries)
+            self._entries.clear()
+            return count
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get cache statistics."""
+        with self._lock:
+            total = self._total_bytes()
+            repos = [
+                {
+                    "repo_id": e.store.repo_id,
+                    "size_mb": round(e.size_bytes / (1024 * 1024), 2),
+                    "hits": e.hits
+                }
+                for e in reversed(self._entries.values())
+            ]
+        lookups = self.stats["hits"] + self.stats["misses"] + self.stats["reloads"]
+        return {
+            "total_entries": len(repos),
+            "total_size_mb": round(total / (1024 * 1024), 2),
+            "max_size_mb": round(self.max_bytes / (1024 * 1024), 2),
+            "hits": self.stats["hits"],
+            "misses": self.stats["misses"],
+            "reloads": self.stats["reloads"],
+            "evictions": self.stats["evictions"],
+            "hit_rate": round(self.stats["hits"] / lookups * 100, 2) if lookups else 0.0,
+            "repos": repos
+        }
+
+
+# Global cache instance
+_index_cache: Optional[IndexCache] = None
+
+
+def get_index_cache() -> IndexCache:
+    """Get global index cache instance."""
+    global _index_cache
+    if _index_cache is None:
+        _index_cache = IndexCache(
+            max_bytes=INDEX_CACHE_MAX_MB * 1024 * 1024,
+            revalidate_interval=INDEX_CACHE_REVALIDATE_SECONDS
+        )
+    return _index_cache
+
+
+def has_index(repo_id: str, base_dir: str = None) -> bool:
+    """Check if a repo has an index (in-memory or on disk)."""
+    if base_dir is None:
+        base_dir = f"{DATA_DIR}/index"
+    store = _in_memory_stores.get(repo_id)
+    if store is not None and store.index is not None:
+        return True
+    return FaissStore.index_exists(repo_id, base_dir)
+
+
+def get_store(repo_id: str, base_dir: str = None) -> FaissStore:
+    """
+    Get a ready-to-query store for a repo.
+    In-memory (privacy mode) stores are returned directly; disk stores come from the LRU cache.
+
+    Raises:
+        FileNotFoundError: If the repo is not indexed
+    """
+    if base_dir is None:
+        base_dir = f"{DATA_DIR}/index"
+    store = _in_memory_stores.get(repo_id)
+    if store is not None and store.index is not None:
+        return store
+    return get_index_cache().get(repo_id, base_dir)
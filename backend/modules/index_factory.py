@@ -0,0 +1,219 @@
+"""
+FAISS index factory.
+Picks an exact (flat) or approximate (HNSW / IVF) index based on corpus size,
+optionally compresses the stored vectors (fp16 / SQ8 / PQ), trains IVF centroids
+and codecs from a sample, and builds per-query search parameters.
+"""
+import math
+from typing import Dict, Any, Optional, Tuple
+
+import faiss
+import numpy as np
+
+from backend.config import (
+    INDEX_TYPE, INDEX_FLAT_MAX_CHUNKS, INDEX_HNSW_MAX_CHUNKS,
+    INDEX_HNSW_M, INDEX_HNSW_EF_CONSTRUCTION, INDEX_HNSW_EF_SEARCH,
+    INDEX_IVF_NPROBE, INDEX_IVF_TRAIN_SAMPLE, INDEX_PQ_M, INDEX_PQ_NBITS
+)
+
+INDEX_FLAT = "flat"
+INDEX_HNSW = "hnsw"
+INDEX_IVF = "ivf"
+INDEX_TYPES = (INDEX_FLAT, INDEX_HNSW, INDEX_IVF)
+
+COMPRESSION_NONE = "none"
+COMPRESSION_FP16 = "fp16"
+COMPRESSION_SQ8 = "sq8"
+COMPRESSION_PQ = "pq"
+COMPRESSIONS = (COMPRESSION_NONE, COMPRESSION_FP16, COMPRESSION_SQ8, COMPRESSION_PQ)
+
+_SQ_TYPES = {
+    COMPRESSION_FP16: faiss.ScalarQuantizer.QT_fp16,
+    COMPRESSION_SQ8: faiss.ScalarQuantizer.QT_8bit,
+}
+
+
+def choose_index_type(n: int) -> str:
+    """
+    Choose an index type for a corpus of n vectors.
+    Honors INDEX_TYPE if it is forced to a specific type.
+    """
+    if INDEX_TYPE in INDEX_TYPES:
+        return INDEX_TYPE
+    if n <= INDEX_FLAT_MAX_CHUNKS:
+        return INDEX_FLAT
+    if n <= INDEX_HNSW_MAX_CHUNKS:
+        return INDEX_HNSW
+    return INDEX_IVF
+
+
+def ivf_nlist(n: int) -> int:
+    """Number of IVF centroids for n vectors (~4*sqrt(n), bounded)."""
+    return int(min(65536, max(16, 4 * math.sqrt(max(n, 1)))))
+
+
+def pq_m(d: int) -> int:
+    """Number of PQ sub-quantizers: INDEX_PQ_M, or the largest divisor of d up to d/4."""
+    target = INDEX_PQ_M or max(1, d // 4)
+    for m in range(min(target, d), 0, -1):
+        if d % m == 0:
+            return m
+    return 1
+
+
+def effective_compression(compression: str, n: int) -> str:
+    """
+    Resolve the compression actually used for n vectors.
+    Empty corpora stay uncompressed, and PQ falls back to SQ8 until there is enough data to train codebooks.
+    """
+    compression = compression if compression in COMPRESSIONS else COMPRESSION_NONE
+    if n == 0:
+        return COMPRESSION_NONE
+    if compression == COMPRESSION_PQ and n < (1 << INDEX_PQ_NBITS) * 39:
+        return COMPRESSION_SQ8
+    return compression
+
+
+def supports_remove(kind: str) -> bool:
+    """Whether vectors can be physically removed (HNSW graphs can't; removed ids are tombstoned)."""
+    return kind in (INDEX_FLAT, INDEX_IVF)
+
+
+def create_index(kind: str, d: int, n: int, train_vectors: Optional[np.ndarray] = None,
+                 compression: str = COMPRESSION_NONE) -> Tuple[Any, Dict[str, Any]]:
+    """
+    Create an empty (but trained, if needed) inner-product index.
+
+    Args:
+        kind: One of "flat", "hnsw", "ivf"
+        d: Vector dimension
+        n: Expected number of vectors (sizes IVF)
+        train_vectors: Sample for IVF centroid / SQ8 / PQ training
+        compression: One of "none", "fp16", "sq8", "pq"
+
+    Returns:
+        Tuple of (index accepting add_with_ids, params dict recorded in index metadata)
+    """
+    params: Dict[str, Any] = {}
+    if compression == COMPRESSION_PQ:
+        params.update({"pq_m": pq_m(d), "pq_nbits": INDEX_PQ_NBITS})
+
+    if kind == INDEX_FLAT:
+        if compression == COMPRESSION_NONE:
+            inner = faiss.IndexFlatIP(d)
+        elif compression == COMPRESSION_PQ:
+            inner = faiss.IndexPQ(d, params["pq_m"], INDEX_PQ_NBITS, faiss.METRIC_INNER_PRODUCT)
+        else:
+            inner = faiss.IndexScalarQuantizer(d, _SQ_TYPES[compression], faiss.METRIC_INNER_PRODUCT)
+        code_size = inner.code_size
+
+    elif kind == INDEX_HNSW:
+        if compression == COMPRESSION_NONE:
+            inner = faiss.IndexHNSWFlat(d, INDEX_HNSW_M, faiss.METRIC_INNER_PRODUCT)
+        elif compression == COMPRESSION_PQ:
+            inner = faiss.IndexHNSWPQ(d, params["pq_m"], INDEX_HNSW_M, INDEX_PQ_NBITS, faiss.METRIC_INNER_PRODUCT)
+        else:
+            inner = faiss.IndexHNSWSQ(d, _SQ_TYPES[compression], INDEX_HNSW_M, faiss.METRIC_INNER_PRODUCT)
+        inner.hnsw.efConstruction = INDEX_HNSW_EF_CONSTRUCTION
+        inner.hnsw.efSearch = INDEX_HNSW_EF_SEARCH
+        params.update({
+            "M": INDEX_HNSW_M,
+            "efConstruction": INDEX_HNSW_EF_CONSTRUCTION,
+            "efSearch": INDEX_HNSW_EF_SEARCH
+        })
+        code_size = faiss.downcast_index(inner.storage).code_size
+
+    elif kind == INDEX_IVF:
+        if train_vectors is None or len(train_vectors) == 0:
+            raise ValueError("IVF index needs training vectors")
+        # Don't ask for more centroids than the sample can support
+        nlist = min(ivf_nlist(n), max(1, len(train_vectors) // 39))
+        quantizer = faiss.IndexFlatIP(d)
+        if compression == COMPRESSION_NONE:
+            inner = faiss.IndexIVFFlat(quantizer, d, nlist, faiss.METRIC_INNER_PRODUCT)
+        elif compression == COMPRESSION_PQ:
+            inner = faiss.IndexIVFPQ(quantizer, d, nlist, params["pq_m"], INDEX_PQ_NBITS, faiss.METRIC_INNER_PRODUCT)
+        else:
+            inner = faiss.IndexIVFScalarQuantizer(quantizer, d, nlist, _SQ_TYPES[compression],
+                                                  faiss.METRIC_INNER_PRODUCT)
+        inner.nprobe = INDEX_IVF_NPROBE
+        params.update({"nlist": nlist, "nprobe": INDEX_IVF_NPROBE})
+        code_size = inner.code_size
+
+    else:
+        raise ValueError(f"Unknown index type: {kind}")
+
+    if not inner.is_trained:
+        if train_vectors is None or len(train_vectors) == 0:
+            raise ValueError(f"{kind}/{compression} index needs training vectors")
+        inner.train(np.ascontiguousarray(train_vectors, dtype=np.float32))
+        params["train_size"] = len(train_vectors)
+    params["code_size"] = int(code_size)
+
+    # IVF carries its own ids; the others are wrapped so chunk ids stay stable
+    index = inner if kind == INDEX_IVF else faiss.IndexIDMap2(inner)
+    return index, params
+
+
+def train_sample_size(kind: str, n: int, compression: str = COMPRESSION_NONE) -> int:
+    """How many vectors to sample for training (0 if the index needs no training)."""
+    if kind == INDEX_IVF:
+        return min(n, max(ivf_nlist(n) * 39, min(INDEX_IVF_TRAIN_SAMPLE, n)))
+    if compression in (COMPRESSION_SQ8, COMPRESSION_PQ):
+        return min(n, INDEX_IVF_TRAIN_SAMPLE)
+    return 0
+
+
+def mmap_io_flags(kind: str) -> int:
+    """
+    faiss.read_index flags that memory-map an index's vector codes instead of copying them
+    (0 if this FAISS build can't for the type). Mapped indexes are read-only.
+    """
+    if kind == INDEX_IVF:
+        # Inverted lists (codes + ids) are mapped; only the centroids are read into RAM
+        return faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY
+    flat_codes = getattr(faiss, "IO_FLAG_MMAP_IFC", 0)
+    if flat_codes:
+        # Flat/SQ/PQ codes (HNSW: its storage) are mapped; id maps and HNSW graphs are still read
+        return flat_codes | faiss.IO_FLAG_READ_ONLY
+    return 0
+
+
+def positive_int(value: Any, name: str) -> Optional[int]:
+    """
+    Parse an optional search knob (nprobe, ef_search, k) from request data.
+    None stays None; anything but a positive integer raises ValueError naming the parameter.
+    """
+    if value is None:
+        return None
+    if isinstance(value, bool) or (isinstance(value, float) and not value.is_integer()):
+        raise ValueError(f"{name} must be a positive integer")
+    try:
+        number = int(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"{name} must be a positive integer") from None
+    if number < 1:
+        raise ValueError(f"{name} must be a positive integer")
+    return number
+
+
+def search_params(kind: str, nprobe: Optional[int] = None, ef_search: Optional[int] = None, selector=None):
+    """
+    Build per-query search parameters (thread-safe alternative to mutating the shared index).
+    `selector` (a faiss.IDSelector) restricts the search to matching ids.
+    Returns None when defaults stored in the index should be used.
+    Raises ValueError if nprobe / ef_search isn't a positive integer.
+    """
+    nprobe = positive_int(nprobe, "nprobe")
+    ef_search = positive_int(ef_search, "ef_search")
+    if kind == INDEX_IVF and (nprobe or selector is not None):
+        params = faiss.SearchParametersIVF(sel=selector) if selector is not None else faiss.SearchParametersIVF()
+        params.nprobe = nprobe or INDEX_IVF_NPROBE
+        return params
+    if kind == INDEX_HNSW and (ef_search or selector is not None):
+        params = faiss.SearchParametersHNSW(sel=selector) if selector is not None else faiss.SearchParametersHNSW()
+        params.efSearch = ef_search or INDEX_HNSW_EF_SEARCH
+        return params
+    if selector is not None:
+        return faiss.SearchParameters(sel=selector)
+    return None
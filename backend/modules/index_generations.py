@@ -0,0 +1,329 @@
+"""
+Versioned index generations for FaissStore.
+Every save publishes an immutable generation manifest (generations/gen-N.json)
+listing the files it consists of, then atomically repoints CURRENT at it.
+Data files are never rewritten in place, so a reader keeps using the generation
+it opened while writers publish newer ones; generations no reader holds are
+garbage-collected. Writers number, write and publish a generation under
+publish_lock, which also excludes writers in other processes.
+"""
+import json
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Optional, Set
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+GENERATIONS_DIR = "generations"
+CURRENT_FILE = "CURRENT"
+LOCK_FILE = "LOCK"
+
+# Pre-generation layout (single set of files rewritten by every save)
+LEGACY_FILES = (
+    "faiss.index", "embeddings.npy", "embedding_ids.npy",
+    "segments.json", "tombstones.npy", "snippets.pack", "chunks.db"
+)
+# SQLite side files that live and die with a chunks database
+SQLITE_SUFFIXES = ("-wal", "-shm")
+
+# In-process readers: index key -> {generation: open stores}
+_pins: Dict[str, Dict[int, int]] = {}
+_pins_lock = threading.Lock()
+# One publisher per index at a time (generation numbers must not collide)
+_publish_locks: Dict[str, threading.RLock] = {}
+# Open LOCK file and nesting depth per index, owned by the thread holding its publish lock
+_lock_files: Dict[str, list] = {}
+# Generation a data file was written for (base-000012.index, segments/seg-000012.ids.npy...)
+_FILE_GENERATION = re.compile(r"^(?:base|chunks|tombstones|snippets|seg)-(\d+)")
+
+
+class GenerationConflict(RuntimeError):
+    """CURRENT no longer points at the generation a writer started from."""
+
+
+def generation_name(generation: int) -> str:
+    return f"gen-{generation:06d}.json"
+
+
+def _lock_file(f):
+    if fcntl is not None:
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        return
+    f.seek(0)
+    while True:
+        try:
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+            return
+        except OSError:
+            time.sleep(0.05)  # LK_LOCK gives up after ~10s
+
+
+def _unlock_file(f):
+    if fcntl is not None:
+        fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+    else:
+        f.seek(0)
+        msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+@contextmanager
+def publish_lock(key: str, base: Path):
+    """
+    Exclusive right to publish (and garbage-collect) an index's generations.
+    Re-entrant within a thread; across processes an advisory lock on generations/LOCK
+    makes e.g. a CLI re-index wait for the server's watcher. Writers hold it from
+    choosing a generation number until publish() returns, so data files named after
+    that number are never written twice and never collected before they are published.
+    """
+    with _pins_lock:
+        lock = _publish_locks.setdefault(key, threading.RLock())
+    with lock:
+        held = _lock_files.get(key)
+        if held is None:
+            gen_dir = Path(base) / GENERATIONS_DIR
+            gen_dir.mkdir(parents=True, exist_ok=True)
+            f = open(gen_dir / LOCK_FILE, "a+b")
+            try:
+                _lock_file(f)
+            except BaseException:
+                f.close()
+                raise
+            held = _lock_files[key] = [f, 0]
+        held[1] += 1
+        try:
+            yield
+        finally:
+            held[1] -= 1
+            if held[1] == 0:
+                del _lock_files[key]
+                try:
+                    _unlock_file(held[0])
+                finally:
+                    held[0].close()
+
+
+def fsync_file(path: Path):
+    """Flush a written file to disk before it is referenced by a manifest."""
+    with open(path, "rb+") as f:
+        os.fsync(f.fileno())
+
+
+def fsync_dir(path: Path):
+    """Make a rename durable (no-op where directories can't be opened, e.g. Windows)."""
+    try:
+        fd = os.open(str(path), os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def _replace(src: Path, dst: Path, retries: int = 5):
+    """os.replace, retried briefly: on Windows it fails while a reader has dst open."""
+    for attempt in range(retries):
+        try:
+            os.replace(src, dst)
+            return
+        except PermissionError:
+            if attempt == retries - 1:
+                raise
+            time.sleep(0.05 * (attempt + 1))
+
+
+def read_current(base: Path) -> Optional[Dict]:
+    """Manifest of the current generation (None if the index predates generations or doesn't exist)."""
+    base = Path(base)
+    try:
+        name = (base / CURRENT_FILE).read_text(encoding="utf-8").strip()
+    except FileNotFoundError:
+        return None
+    with open(base / GENERATIONS_DIR / name, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def current_pointer(base: Path) -> Optional[str]:
+    """Name of the current generation manifest (cheap check for cache revalidation)."""
+    try:
+        return (Path(base) / CURRENT_FILE).read_text(encoding="utf-8").strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def current_generation(base: Path) -> int:
+    """Number of the current generation (0 for a pre-generation or missing index)."""
+    pointer = current_pointer(base)
+    if pointer is None:
+        return 0
+    return int(pointer[len("gen-"):-len(".json")])
+
+
+def next_generation(base: Path) -> int:
+    """Number the next published generation will get (stable only under publish_lock)."""
+    return current_generation(base) + 1
+
+
+def publish(key: str, base: Path, manifest: Dict, expected_gen: Optional[int] = None,
+            generation: Optional[int] = None) -> int:
+    """
+    Publish a new generation: write its manifest, fsync, then atomically swap CURRENT.
+    All files the manifest references must already be written and fsynced.
+
+    Args:
+        key: Index key (see vector_store.index_key)
+        base: Index directory
+        manifest: Files of the generation (see manifest_files) and its info
+        expected_gen: Generation the writer started from; if CURRENT moved on since, nothing is
+                      published (None = replace whatever is current, e.g. a full build)
+        generation: Number the writer named its data files after, taken from next_generation
+                    under the same publish_lock (defaults to next_generation)
+
+    Returns:
+        The new generation number
+
+    Raises:
+        GenerationConflict: If CURRENT is no longer expected_gen or generation is already taken
+    """
+    base = Path(base)
+    gen_dir = base / GENERATIONS_DIR
+    with publish_lock(key, base):
+        current = current_generation(base)
+        if expected_gen is not None and current != expected_gen:
+            raise GenerationConflict(f"CURRENT is generation {current}, expected {expected_gen}")
+        if generation is None:
+            generation = current + 1
+        elif generation <= current:
+            raise GenerationConflict(f"Generation {generation} is not newer than CURRENT ({current})")
+        manifest = dict(manifest, generation=generation, published_at=time.time())
+        name = generation_name(generation)
+
+        tmp_path = gen_dir / (name + ".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, gen_dir / name)
+        fsync_dir(gen_dir)
+
+        tmp_path = base / (CURRENT_FILE + ".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(name)
+            f.flush()
+            os.fsync(f.fileno())
+        _replace(tmp_path, base / CURRENT_FILE)
+        fsync_dir(base)
+    return generation
+
+
+def pin(key: str, generation: int):
+    """Record that an in-process store is reading a generation (keeps it from GC)."""
+    with _pins_lock:
+        counts = _pins.setdefault(key, {})
+        counts[generation] = counts.get(generation, 0) + 1
+
+
+def unpin(key: str, generation: int):
+    with _pins_lock:
+        counts = _pins.get(key, {})
+        if generation in counts:
+            counts[generation] -= 1
+            if counts[generation] <= 0:
+                del counts[generation]
+
+
+def pinned(key: str) -> Set[int]:
+    with _pins_lock:
+        return set(_pins.get(key, {}))
+
+
+def manifest_files(manifest: Dict) -> Set[str]:
+    """Paths (relative to the index directory) a generation consists of."""
+    files = set()
+    for name in ("chunks", "index", "embeddings", "embedding_ids", "tombstones", "pack"):
+        if manifest.get(name):
+            files.add(manifest[name])
+    if manifest.get("chunks"):
+        files |= {manifest["chunks"] + suffix for suffix in SQLITE_SUFFIXES}
+    for segment in manifest.get("segments", []):
+        files.add(f"segments/{segment}.vectors.npy")
+        files.add(f"segments/{segment}.ids.npy")
+    return files
+
+
+def collect_garbage(key: str, base: Path, keep: int = 2) -> int:
+    """
+    Delete generations (and the files only they use) that no reader can still need:
+    everything older than the newest `keep` generations that isn't pinned in-process.
+    Other processes re-read CURRENT on revalidation, so the `keep` window covers them.
+    Runs under publish_lock and never touches data files numbered after CURRENT: those
+    belong to a save that hasn't published yet.
+
+    Returns:
+        Number of files deleted
+    """
+    base = Path(base)
+    gen_dir = base / GENERATIONS_DIR
+    if not gen_dir.exists():
+        return 0
+    with publish_lock(key, base):
+        return _collect_garbage(key, base, gen_dir, keep)
+
+
+def _collect_garbage(key: str, base: Path, gen_dir: Path, keep: int) -> int:
+    manifests = {}
+    for path in gen_dir.glob("gen-*.json"):
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                manifests[path.name] = json.load(f)
+        except (OSError, ValueError):
+            continue
+    current = current_pointer(base)
+    current_number = current_generation(base)
+    held = pinned(key)
+    newest = sorted(manifests, reverse=True)[:max(1, keep)]
+    live = {
+        name for name, m in manifests.items()
+        if name in newest or name == current or m.get("generation") in held
+    }
+    referenced = set()
+    for name in live:
+        referenced |= manifest_files(manifests[name])
+
+    candidates = [gen_dir / name for name in manifests if name not in live]
+    for pattern in ("base-*", "chunks-*.db*", "tombstones-*.npy", "snippets-*.pack", "segments/*.npy"):
+        for p in base.glob(pattern):
+            if p.relative_to(base).as_posix() in referenced or p.name.endswith(".tmp"):
+                continue
+            number = _FILE_GENERATION.match(p.name)
+            if number is not None and int(number.group(1)) > current_number:
+                continue  # written for a generation that isn't published yet
+            candidates.append(p)
+    if current is not None and 0 not in held:
+        # Pre-generation files no generation adopted, once no in-process reader uses that layout
+        legacy = [name + suffix for name in LEGACY_FILES
+                  for suffix in (("",) + SQLITE_SUFFIXES if name.endswith(".db") else ("",))]
+        candidates += [base / name for name in legacy
+                       if name not in referenced and (base / name).exists()]
+
+    removed = 0
+    for path in candidates:
+        try:
+            path.unlink()
+            removed += 1
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            # Windows: a reader may still have it memory-mapped; retried on the next save
+            print(f"[index_generations] Could not remove {path.name}: {e}")
+    return removed
@@ -0,0 +1,285 @@
+"""
+Background indexing jobs.
+Indexing a repo can take minutes, so endpoints submit the work to a small
+executor and return a job id right away. The job table keeps each job's status,
+latest progress (files, chunks, embed rate, ETA) and a bounded event history
+that clients poll or stream; jobs keep running if the client disconnects, and
+can be cancelled between batches.
+"""
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from backend.config import INDEX_JOB_WORKERS, INDEX_JOB_HISTORY
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+CANCELLED = "cancelled"
+FINISHED = (SUCCEEDED, FAILED, CANCELLED)
+
+
+class JobCancelled(Exception):
+    """Raised inside a job's work when cancellation was requested."""
+
+
+class IndexJob:
+    """One indexing job: status, progress and event history (thread-safe)."""
+
+    def __init__(self, kind: str, owner: Optional[Any] = None, params: Optional[Dict] = None,
+                 key: Optional[str] = None, max_events: int = 1000):
+        """
+        Args:
+            kind: What the job does ("index_repo", "index_repos", "clone_and_index")
+            owner: User id that submitted it (only they can see/cancel it)
+            params: Request parameters worth showing in status (no secrets)
+            key: Jobs with the same key don't run concurrently (e.g. the same repo)
+            max_events: Progress events kept for streaming
+        """
+        self.id = uuid.uuid4().hex[:12]
+        self.kind = kind
+        self.owner = owner
+        self.params = params or {}
+        self.key = key
+        self.status = QUEUED
+        self.progress: Dict[str, Any] = {}
+        self.result: Optional[Dict] = None
+        self.error: Optional[str] = None
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self._cancel = threading.Event()
+        self._changed = threading.Condition()
+        self._events: List[Dict] = []
+        self._seq = 0
+        self._max_events = max_events
+        self._embed_started: Optional[float] = None
+
+    @property
+    def finished(self) -> bool:
+        return self.status in FINISHED
+
+    @property
+    def cancel_requested(self) -> bool:
+        return self._cancel.is_set()
+
+    def cancel(self):
+        """Ask the job to stop at its next progress report."""
+        self._cancel.set()
+
+    def check_cancelled(self):
+        if self._cancel.is_set():
+            raise JobCancelled(f"Job {self.id} cancelled")
+
+    def report(self, event: Dict):
+        """
+        Progress callback for the work (e.g. FaissStore.build_stream's progress).
+        Adds an ETA when the total file count is known, and raises JobCancelled
+        if the job was cancelled - this is where long-running work stops.
+        """
+        if event.get("stage") != "done":
+            # (Once "done" is reported the index is already published)
+            self.check_cancelled()
+        progress = dict(self.progress, **event)
+        files, total = progress.get("files"), progress.get("total_files")
+        if event.get("stage") == "embedding":
+            now = time.time()
+            if self._embed_started is None:
+                self._embed_started = now - event.get("elapsed", 0)
+            if files and total:
+                rate = files / max(now - self._embed_started, 1e-6)
+                progress["eta_seconds"] = round(max(total - files, 0) / rate, 1)
+                progress["percent"] = round(min(100.0, 100.0 * files / total), 1)
+        elif event.get("stage") in ("indexing", "done"):
+            progress["eta_seconds"] = 0
+        self._publish(progress, dict(event, type="progress"))
+
+    def _publish(self, progress: Optional[Dict], event: Dict):
+        with self._changed:
+            if progress is not None:
+                self.progress = progress
+            self._seq += 1
+            self._events.append(dict(event, seq=self._seq, job_id=self.id, time=time.time()))
+            del self._events[:-self._max_events]
+            self._changed.notify_all()
+
+    def _set_status(self, status: str, result: Optional[Dict] = None, error: Optional[str] = None):
+        now = time.time()
+        if status == RUNNING:
+            self.started_at = now
+        elif status in FINISHED:
+            self.finished_at = now
+        self.status, self.result, self.error = status, result, error
+        event = {"type": "status", "status": status}
+        if result is not None:
+            event["result"] = result
+        if error is not None:
+            event["error"] = error
+        self._publish(None, event)
+
+    def wait_finished(self, timeout: Optional[float] = None) -> bool:
+        """Wait up to `timeout` seconds for the job to finish; returns whether it has."""
+        with self._changed:
+            if not self.finished:
+                self._changed.wait(timeout)
+            return self.finished
+
+    def events_since(self, seq: int = 0, timeout: float = 15.0) -> Tuple[List[Dict], bool]:
+        """
+        Events after `seq`, waiting up to `timeout` seconds for new ones.
+
+        Returns:
+            (events, finished) - finished means no further events will come
+        """
+        with self._changed:
+            if self._seq <= seq and not self.finished:
+                self._changed.wait(timeout)
+            events = [e for e in self._events if e["seq"] > seq]
+            return events, self.finished and (not events or events[-1]["seq"] == self._seq)
+
+    def to_dict(self) -> Dict:
+        end = self.finished_at or time.time()
+        return {
+            "job_id": self.id,
+            "kind": self.kind,
+            "status": self.status,
+            "params": self.params,
+            "progress": self.progress,
+            "result": self.result,
+            "error": self.error,
+            "cancel_requested": self.cancel_requested,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "elapsed_seconds": round(end - self.started_at, 3) if self.started_at else 0.0
+        }
+
+
+class IndexJobManager:
+    """Runs indexing jobs on a bounded thread pool and keeps a table of recent jobs."""
+
+    def __init__(self, max_workers: int = INDEX_JOB_WORKERS, history: int = INDEX_JOB_HISTORY):
+        """
+        Args:
+            max_workers: Jobs that run at the same time (the rest wait queued)
+            history: Finished jobs kept in the table for polling
+        """
+        self._executor = ThreadPoolExecutor(max_workers=max(1, max_workers), thread_name_prefix="index-job")
+        self._jobs: "OrderedDict[str, IndexJob]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.history = history
+
+    def submit(self, kind: str, work: Callable[[IndexJob], Dict], owner: Optional[Any] = None,
+               params: Optional[Dict] = None, key: Optional[str] = None,
+               context: Optional[Callable[[], Any]] = None) -> IndexJob:
+        """
+        Queue work as a job. If the same owner already has an unfinished job with the same key,
+        that job is returned instead; another owner's job gets its own job that starts once the
+        earlier jobs with the key have finished.
+
+        Args:
+            kind: Job kind (shown in status)
+            work: Called with the job; returns the result dict. Should pass job.report as its
+                  progress callback so the job can report progress and be cancelled
+            owner: Submitting user id
+            params: Parameters shown in status
+            key: Deduplication/serialization key (e.g. "index:<repo_id>")
+            context: Context manager factory entered around the work (e.g. Flask's app.app_context)
+
+        Returns:
+            The (new or already running) job
+        """
+        with self._lock:
+            earlier = [job for job in self._jobs.values() if key is not None and job.key == key and not job.finished]
+            for job in earlier:
+                if job.owner == owner:
+                    return job
+            job = IndexJob(kind, owner=owner, params=params, key=key)
+            self._jobs[job.id] = job
+            self._prune()
+        job._publish(None, {"type": "status", "status": QUEUED})
+        self._executor.submit(self._run, job, work, context, earlier)
+        print(f"[index_jobs] Queued {kind} job {job.id}")
+        return job
+
+    def _run(self, job: IndexJob, work: Callable[[IndexJob], Dict], context, earlier: List[IndexJob]):
+        # Earlier jobs were queued first, so they already hold a worker or get one before this job
+        for other in earlier:
+            while not job.cancel_requested and not other.wait_finished(timeout=1.0):
+                pass
+        if job.cancel_requested:
+            job._set_status(CANCELLED)
+            return
+        job._set_status(RUNNING)
+        try:
+            if context is not None:
+                with context():
+                    result = work(job)
+            else:
+                result = work(job)
+            job._set_status(SUCCEEDED, result=result)
+            print(f"[index_jobs] Job {job.id} succeeded")
+        except JobCancelled:
+            job._set_status(CANCELLED)
+            print(f"[index_jobs] Job {job.id} cancelled")
+        except Exception as e:
+            job._set_status(FAILED, error=str(e))
+            print(f"[index_jobs] Job {job.id} failed: {e}")
+
+    def _prune(self):
+        """Drop the oldest finished jobs beyond the history limit (caller holds the lock)."""
+        finished = [job_id for job_id, job in self._jobs.items() if job.finished]
+        for job_id in finished[:max(0, len(finished) - self.history)]:
+            del self._jobs[job_id]
+
+    def get(self, job_id: str) -> Optional[IndexJob]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def list_jobs(self, owner: Optional[Any] = None) -> List[IndexJob]:
+        """Jobs (newest first), optionally only those of one owner."""
+        with self._lock:
+            jobs = list(self._jobs.values())
+        return [job for job in reversed(jobs) if owner is None or job.owner == owner]
+
+    def cancel(self, job_id: str) -> bool:
+        """
+        Request cancellation. Queued jobs never start; running jobs stop at their next
+        progress report (a build in progress is discarded, the previous index stays).
+
+        Returns:
+            True if the job exists and wasn't finished yet
+        """
+        job = self.get(job_id)
+        if job is None or job.finished:
+            return False
+        job.cancel()
+        job._publish(None, {"type": "status", "status": job.status, "cancel_requested": True})
+        return True
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            jobs = list(self._jobs.values())
+        counts: Dict[str, int] = {}
+        for job in jobs:
+            counts[job.status] = counts.get(job.status, 0) + 1
+        return {"jobs": len(jobs), "by_status": counts}
+
+
+# Global job manager instance
+_job_manager: Optional[IndexJobManager] = None
+_job_manager_lock = threading.Lock()
+
+
+def get_index_job_manager() -> IndexJobManager:
+    """Get global index job manager instance."""
+    global _job_manager
+    if _job_manager is None:
+        with _job_manager_lock:
+            if _job_manager is None:
+                _job_manager = IndexJobManager()
+    return _job_manager
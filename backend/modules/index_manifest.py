@@ -0,0 +1,95 @@
+"""
+File manifest for incremental re-indexing.
+Every index records, per source file, its size, mtime, content hash and chunk ids
+(in the chunk store, so the manifest is committed together with the chunks it
+describes). Re-indexing diffs the working tree against it: files whose size and
+mtime match are skipped without being read, the rest are hashed, and only added
+or modified files need to be re-chunked and re-embedded.
+"""
+import hashlib
+import os
+from typing import Dict, Iterable, List, Optional
+
+
+def content_hash(path) -> str:
+    """SHA-1 of a file's bytes."""
+    digest = hashlib.sha1()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def file_record(path, chunk_ids: Iterable[int] = ()) -> Optional[Dict]:
+    """
+    Manifest record of a file as it is on disk now.
+    Take it *before* chunking the file: if the file changes in between, the record is
+    stale rather than the index, and the next diff simply re-chunks the file.
+
+    Returns:
+        {path, size, mtime_ns, hash, chunk_ids}, or None if the file can't be read
+    """
+    try:
+        st = os.stat(path)
+        digest = content_hash(path)
+    except OSError:
+        return None
+    return {
+        "path": str(path),
+        "size": st.st_size,
+        "mtime_ns": st.st_mtime_ns,
+        "hash": digest,
+        "chunk_ids": [int(i) for i in chunk_ids]
+    }
+
+
+def diff_files(paths: Iterable, manifest: Dict[str, Dict]) -> Dict:
+    """
+    Compare the files currently in the tree with a manifest.
+
+    Args:
+        paths: Files that should be indexed (e.g. parser.iter_text_files(repo))
+        manifest: path -> record, as returned by chunk_store.file_records()
+
+    Returns:
+        {"added": {path: record}, "modified": {path: record}, "deleted": [path],
+         "touched": [record], "unchanged": int}
+        Records of added/modified files are taken now (before chunking). "touched" files
+        have a new size/mtime but the same content: only their records need refreshing.
+    """
+    added: Dict[str, Dict] = {}
+    modified: Dict[str, Dict] = {}
+    touched: List[Dict] = []
+    unchanged = 0
+    # Files still indexable; anything else in the manifest was deleted (or became unreadable/ignored)
+    present = set()
+    for path in paths:
+        path = str(path)
+        old = manifest.get(path)
+        if old is not None:
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            if st.st_size == old["size"] and st.st_mtime_ns == old["mtime_ns"]:
+                present.add(path)
+                unchanged += 1
+                continue
+        record = file_record(path)
+        if record is None:
+            continue
+        present.add(path)
+        if old is None:
+            added[path] = record
+        elif record["hash"] != old["hash"]:
+            modified[path] = record
+        else:
+            touched.append(dict(record, chunk_ids=old["chunk_ids"]))
+            unchanged += 1
+    return {
+        "added": added,
+        "modified": modified,
+        "deleted": [path for path in manifest if path not in present],
+        "touched": touched,
+        "unchanged": unchanged
+    }
@@ -0,0 +1,145 @@
+"""
+Append-only delta segments for FaissStore.
+New/updated chunks land in small immutable segments next to the base index and
+deletions in a tombstone set, so a watcher save writes only what changed.
+Queries search the base index and every segment and merge the top-k; a compactor
+periodically folds everything back into a new base index.
+"""
+import json
+import os
+from pathlib import Path
+from typing import Dict, List, Optional, Set, Tuple
+
+import numpy as np
+
+
+def save_npy_atomic(path: Path, arr: np.ndarray):
+    """Write an .npy file via temp file + rename, so readers that mmap the old file are never truncated."""
+    tmp_path = path.with_name(path.name + ".tmp")
+    with open(tmp_path, "wb") as f:
+        np.save(f, arr)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def save_json_atomic(path: Path, data):
+    """Write a JSON file via temp file + rename."""
+    tmp_path = path.with_name(path.name + ".tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+class DeltaSegment:
+    """A small immutable batch of vectors added after the base index was written."""
+
+    def __init__(self, name: str, vectors: np.ndarray, ids: np.ndarray, saved: bool = False):
+        self.name = name
+        self.vectors = vectors
+        self.ids = np.asarray(ids, dtype=np.int64)
+        self.saved = saved
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @staticmethod
+    def paths(segment_dir: Path, name: str) -> Tuple[Path, Path]:
+        return segment_dir / f"{name}.vectors.npy", segment_dir / f"{name}.ids.npy"
+
+    def save(self, segment_dir: Path):
+        """Write the segment (once - segments are never modified afterwards)."""
+        segment_dir.mkdir(parents=True, exist_ok=True)
+        vectors_path, ids_path = self.paths(segment_dir, self.name)
+        save_npy_atomic(vectors_path, np.asarray(self.vectors))
+        save_npy_atomic(ids_path, self.ids)
+        self.saved = True
+
+    @classmethod
+    def load(cls, segment_dir: Path, name: str) -> "DeltaSegment":
+        vectors_path, ids_path = cls.paths(segment_dir, name)
+        return cls(name, np.load(vectors_path, mmap_mode="r"), np.load(ids_path), saved=True)
+
+    @classmethod
+    def merge(cls, name: str, segments: List["DeltaSegment"]) -> "DeltaSegment":
+        """Combine unsaved segments into one, so each save writes at most one new segment."""
+        return cls(
+            name,
+            np.concatenate([np.asarray(s.vectors) for s in segments]),
+            np.concatenate([s.ids for s in segments])
+        )
+
+
+def exact_search(vectors: np.ndarray, ids: np.ndarray, embs: np.ndarray, k: int, block_size: int = 65536):
+    """
+    Exact inner-product top-k over a (possibly memory-mapped) matrix, scanned blockwise.
+    Returns (D, I) shaped like faiss search results, padded with -inf / -1.
+    """
+    nq = len(embs)
+    D = np.full((nq, k), -np.inf, dtype=np.float32)
+    I = np.full((nq, k), -1, dtype=np.int64)
+    if vectors is None or len(vectors) == 0 or k <= 0:
+        return D, I
+    for start in range(0, len(vectors), block_size):
+        block = np.asarray(vectors[start:start + block_size], dtype=np.float32)
+        scores = embs @ block.T
+        block_ids = np.broadcast_to(ids[start:start + block_size], scores.shape)
+        # Merge this block's scores with the running top-k
+        all_scores = np.concatenate([D, scores], axis=1)
+        all_ids = np.concatenate([I, block_ids], axis=1)
+        top = np.argpartition(-all_scores, k - 1, axis=1)[:, :k]
+        D = np.take_along_axis(all_scores, top, axis=1)
+        I = np.take_along_axis(all_ids, top, axis=1)
+    order = np.argsort(-D, axis=1)
+    D = np.take_along_axis(D, order, axis=1)
+    I = np.take_along_axis(I, order, axis=1)
+    I[np.isinf(D)] = -1
+    return D, I
+
+
+def rerank_candidates(embs: np.ndarray, candidates: np.ndarray, k: int,
+                      vectors: np.ndarray, rows: Dict[int, int]):
+    """
+    Re-score candidate ids with exact inner products against stored vectors
+    (only the candidates' rows are read). Ids without a row are dropped.
+    """
+    nq = len(embs)
+    D = np.full((nq, k), -np.inf, dtype=np.float32)
+    I = np.full((nq, k), -1, dtype=np.int64)
+    for q in range(nq):
+        ids = [int(i) for i in candidates[q] if int(i) in rows]
+        if not ids:
+            continue
+        scores = np.asarray(vectors[[rows[i] for i in ids]], dtype=np.float32) @ embs[q]
+        top = np.argsort(-scores)[:k]
+        D[q, :len(top)] = scores[top]
+        I[q, :len(top)] = np.asarray(ids, dtype=np.int64)[top]
+    return D, I
+
+
+def merge_topk(results: List[Tuple[np.ndarray, np.ndarray]], k: int, exclude: Optional[Set[int]] = None):
+    """
+    Merge per-segment (D, I) results into one top-k per query.
+    Skips padding, excluded (tombstoned) ids and duplicates (an id can briefly
+    exist in both the base and a segment around a compaction).
+    """
+    D_all = np.concatenate([D for D, _ in results], axis=1)
+    I_all = np.concatenate([I for _, I in results], axis=1)
+    nq = len(D_all)
+    D = np.full((nq, k), -np.inf, dtype=np.float32)
+    I = np.full((nq, k), -1, dtype=np.int64)
+    exclude = exclude or set()
+    for q in range(nq):
+        seen = set()
+        n = 0
+        for j in np.argsort(-D_all[q]):
+            chunk_id = int(I_all[q, j])
+            if chunk_id < 0 or chunk_id in exclude or chunk_id in seen:
+                continue
+            seen.add(chunk_id)
+            D[q, n] = D_all[q, j]
+            I[q, n] = chunk_id
+            n += 1
+            if n >= k:
+                break
+    return D, I
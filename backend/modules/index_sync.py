@@ -3,12 +3,20 @@ Index synchronization manager for automatic index updates.
 Manages file watchers and incremental indexing.
 """
 import threading
+import time
 from pathlib import Path
-from typing import Dict, Set, Optional
+from typing import Callable, Dict, List, Set, Optional
+import numpy as np
 from backend.modules.file_watcher import RepoWatcher, WATCHDOG_AVAILABLE
-from backend.modules.vector_store import FaissStore
-from backend.modules.parser import semantic_chunks, fallback_line_chunks, iter_text_files, should_ignore, load_gitignore
-from backend.config import DATA_DIR
+from backend.modules.vector_store import FaissStore, index_key, writer_lock
+from backend.modules.encoding_pool import EncodingPool
+from backend.modules.index_manifest import diff_files
+from backend.modules.ignore import IgnoreMatcher
+from backend.modules.slice_pool import iter_file_chunks
+from backend.modules.parser import (
+    file_chunks, iter_repo_chunks, iter_text_files, is_indexable
+)
+from backend.config import DATA_DIR, INDEX_BUILD_BATCH_SIZE, INDEX_INCREMENTAL_MAX_CHANGED_RATIO
 
 
 class IndexSyncManager:
@@ -16,6 +24,8 @@ class IndexSyncManager:
     
     def __init__(self):
         self.watchers: Dict[str, RepoWatcher] = {}
+        # Per-repo ignore rules, shared by the watcher and the event handler
+        self.matchers: Dict[str, IgnoreMatcher] = {}
         self.lock = threading.Lock()
         self.enabled = True
     
@@ -42,8 +52,8 @@ class IndexSyncManager:
                 # Already watching
                 return
             
-            # Load ignore patterns
-            ignore_patterns = load_gitignore(repo_path)
+            # Same .gitignore semantics as the indexer's walk
+            matcher = IgnoreMatcher(repo_path)
             
             # Create callback
             def on_file_change(file_path: str, event_type: str):
@@ -51,9 +61,10 @@ class IndexSyncManager:
             
             # Create and start watcher
             try:
-                watcher = RepoWatcher(str(repo_path), on_file_change, ignore_patterns)
+                watcher = RepoWatcher(str(repo_path), on_file_change, matcher)
                 watcher.start()
                 self.watchers[repo_id] = watcher
+                self.matchers[repo_id] = matcher
                 print(f"[index_sync] Started watching repository: {repo_id} ({repo_dir})")
             except Exception as e:
                 print(f"[index_sync] Error starting watcher for {repo_id}: {e}")
@@ -63,6 +74,7 @@ class IndexSyncManager:
         with self.lock:
             if repo_id in self.watchers:
                 watcher = self.watchers.pop(repo_id)
+                self.matchers.pop(repo_id, None)
                 watcher.stop()
                 print(f"[index_sync] Stopped watching repository: {repo_id}")
     
@@ -78,9 +90,9 @@ class IndexSyncManager:
             # File not in repo (shouldn't happen)
             return
         
-        # Check if should ignore
-        ignore_patterns = load_gitignore(repo_path)
-        if should_ignore(file_path_obj, repo_path, ignore_patterns):
+        # Only files the full index would contain (ignored paths / other extensions are skipped)
+        matcher = self.matchers.get(repo_id) or IgnoreMatcher(repo_path)
+        if not is_indexable(file_path_obj, matcher):
             return
         
         print(f"[index_sync] File {event_type}: {relative_path}")
@@ -89,52 +101,42 @@ class IndexSyncManager:
         if base_dir is None:
             base_dir = f"{DATA_DIR}/index"
         
-        store = FaissStore(repo_id, base_dir=base_dir)
-        
         # Check if index exists
-        if not store.index_path.exists():
+        if not FaissStore.index_exists(repo_id, base_dir):
             print(f"[index_sync] Index not found for {repo_id}, skipping update")
             return
         
-        try:
-            store.load()
-        except Exception as e:
-            print(f"[index_sync] Error loading index for {repo_id}: {e}")
-            return
-        
-        # Handle different event types
-        if event_type in ['created', 'modified']:
-            # Add/update file chunks
-            if file_path_obj.exists() and file_path_obj.is_file():
-                try:
-                    # Get chunks for this file
-                    chunks = semantic_chunks(file_path_obj)
-                    if not chunks:
-                        chunks = fallback_line_chunks(file_path_obj)
-                    
-                    # Update in index
-                    store.update_file_chunks(str(file_path_obj), chunks)
-                    print(f"[index_sync] Updated index for {relative_path} ({len(chunks)} chunks)")
-                except Exception as e:
-                    print(f"[index_sync] Error updating {relative_path}: {e}")
-        
-        elif event_type == 'deleted':
-            # Remove file chunks
+        # Private copy for writing; cached readers pick up the change via the generation counter.
+        # Other writers of this index wait from load() to save(), so the update applies to the latest generation
+        with writer_lock(index_key(repo_id, base_dir)):
+            store = FaissStore(repo_id, base_dir=base_dir)
             try:
-                store.remove_chunks_by_file(str(file_path_obj))
-                print(f"[index_sync] Removed {relative_path} from index")
+                store.load()
             except Exception as e:
-                print(f"[index_sync] Error removing {relative_path}: {e}")
-        
-        # Save store
-        try:
-            import faiss
-            faiss.write_index(store.index, str(store.index_path))
-            with open(store.meta_path, "w", encoding="utf-8") as f:
-                import json
-                json.dump(store.metas, f, ensure_ascii=False)
-        except Exception as e:
-            print(f"[index_sync] Error saving index: {e}")
+                print(f"[index_sync] Error loading index for {repo_id}: {e}")
+                return
+            
+            # Handle different event types
+            if event_type in ['created', 'modified']:
+                # Add/update file chunks
+                if file_path_obj.exists() and file_path_obj.is_file():
+                    try:
+                        # Get chunks for this file
+                        chunks = file_chunks(file_path_obj)
+                        
+                        # Update in index
+                        store.update_file_chunks(str(file_path_obj), chunks)
+                        print(f"[index_sync] Updated index for {relative_path} ({len(chunks)} chunks)")
+                    except Exception as e:
+                        print(f"[index_sync] Error updating {relative_path}: {e}")
+            
+            elif event_type == 'deleted':
+                # Remove file chunks
+                try:
+                    store.remove_chunks_by_file(str(file_path_obj))
+                    print(f"[index_sync] Removed {relative_path} from index")
+                except Exception as e:
+                    print(f"[index_sync] Error removing {relative_path}: {e}")
     
     def stop_all(self):
         """Stop all watchers."""
@@ -147,6 +149,136 @@ class IndexSyncManager:
         return repo_id in self.watchers
 
 
+def _full_build_reason(store: FaissStore) -> Optional[str]:
+    """Why a store can't be re-indexed incrementally (None if it can)."""
+    if store.in_memory:
+        return "in-memory store"
+    if not store.exists():
+        return "no index yet"
+    if store.index is None:
+        try:
+            store.load()
+        except Exception as e:
+            return f"index unreadable: {e}"
+    if not store.chunks.has_file_manifest():
+        return "index has no file manifest"
+    if store.index_info.get("model") != store.model_fingerprint:
+        return "embedding model changed"
+    return None
+
+
+def reindex_repo(store: FaissStore, repo_dir: str, use_semantic: bool = True, full: bool = False,
+                 progress: Optional[Callable[[Dict], None]] = None, batch_size: Optional[int] = None) -> Dict:
+    """
+    Index a repository, re-chunking and re-embedding only the files that changed since its last index.
+    
+    The working tree is diffed against the index's file manifest (see index_manifest): files with
+    the same size and mtime are skipped without being read, so a no-op re-index costs one walk.
+    Falls back to a full streaming build when there is nothing to diff against (no index yet,
+    in-memory store, index built before manifests or with another embedding model), when `full`
+    is set, or when more than INDEX_INCREMENTAL_MAX_CHANGED_RATIO of the files changed.
+    
+    Args:
+        store: The repo's FaissStore (loaded or not)
+        repo_dir: Repository directory path
+        use_semantic: Semantic (function/class) chunking, else line-based
+        full: Force a full rebuild
+        progress: Called with progress events ("scanning", "diff", "embedding", "indexing", "done");
+                  raising from it (e.g. a cancelled job) leaves the index unchanged
+        batch_size: Chunks per embedding step (defaults to INDEX_BUILD_BATCH_SIZE)
+    
+    Returns:
+        Build stats plus "mode" ("full" or "incremental"); incremental runs also report
+        added/modified/deleted/unchanged file counts and added/removed chunks
+    """
+    start = time.time()
+    report = progress or (lambda event: None)
+    paths = list(iter_text_files(Path(repo_dir)))
+    report({"stage": "scanning", "total_files": len(paths)})
+    
+    reason = "requested" if full else _full_build_reason(store)
+    diff = None
+    if reason is None:
+        manifest = store.chunks.file_records()
+        diff = diff_files(paths, manifest)
+        changed = len(diff["added"]) + len(diff["modified"]) + len(diff["deleted"])
+        if changed > INDEX_INCREMENTAL_MAX_CHANGED_RATIO * max(len(manifest), 1):
+            reason = f"{changed} of {len(manifest)} files changed"
+    if reason is not None:
+        print(f"[index_sync] Full build of {store.repo_id} ({reason})")
+        slicing: Dict = {}
+        stats = store.build_stream(iter_repo_chunks(repo_dir, use_semantic, stats=slicing, files=paths),
+                                   batch_size=batch_size, progress=progress)
+        return dict(stats, mode="full", slicing=slicing)
+    
+    to_chunk = {**diff["added"], **diff["modified"]}
+    report({"stage": "diff", "total_files": len(to_chunk), "added": len(diff["added"]),
+            "modified": len(diff["modified"]), "deleted": len(diff["deleted"]), "unchanged": diff["unchanged"]})
+    
+    batch_size = max(1, batch_size or INDEX_BUILD_BATCH_SIZE)
+    totals = {"cached": 0, "encoded": 0, "seconds": 0.0, "workers": 0}
+    chunks: List[Dict] = []
+    parts: List[np.ndarray] = []
+    records: Dict[str, Dict] = {}
+    vanished: List[str] = []
+    slicing: Dict = {}
+    if to_chunk:
+        # All changes are applied at once below, so a cancelled run leaves the index untouched
+        with EncodingPool(store.model, keep_alive=True) as encoder:
+            pending: List[Dict] = []
+            sliced = iter_file_chunks([Path(p) for p in to_chunk], use_semantic, stats=slicing)
+            for files, (path, file_chunk_list) in enumerate(sliced, start=1):
+                path = str(path)
+                if file_chunk_list is None:
+                    vanished.append(path)
+                else:
+                    pending.extend(file_chunk_list)
+                    records[path] = to_chunk[path]
+                if len(pending) < batch_size and files < len(to_chunk):
+                    continue
+                if pending:
+                    parts.append(store._encode_chunks([c["snippet"] for c in pending], encoder=encoder))
+                    for key in ("cached", "encoded", "seconds"):
+                        totals[key] += store.last_encode_stats.get(key, 0)
+                    totals["workers"] = max(totals["workers"], store.last_encode_stats.get("workers", 0))
+                    chunks.extend(pending)
+                    pending = []
+                elapsed = time.time() - start
+                report({
+                    "stage": "embedding", "files": files, "chunks": len(chunks),
+                    "cached": totals["cached"], "encoded": totals["encoded"], "elapsed": round(elapsed, 3),
+                    "chunks_per_second": round(len(chunks) / elapsed, 1) if elapsed > 0 else None
+                })
+    
+    report({"stage": "indexing", "files": len(to_chunk), "chunks": len(chunks)})
+    vectors = np.concatenate(parts) if parts else np.zeros((0, store.dimension), dtype=np.float32)
+    applied = store.replace_files(chunks, vectors, records, deleted=diff["deleted"] + vanished,
+                                  touched=diff["touched"])
+    
+    elapsed = time.time() - start
+    stats = dict(
+        totals,
+        mode="incremental",
+        seconds=round(totals["seconds"], 3),
+        chunks=store.chunks.count(),
+        files=len(paths),
+        added=len(diff["added"]),
+        modified=len(diff["modified"]),
+        deleted=len(diff["deleted"]) + len(vanished),
+        unchanged=diff["unchanged"],
+        chunks_added=applied["added"],
+        chunks_removed=applied["removed"],
+        build_seconds=round(elapsed, 3),
+        chunks_per_second=round(len(chunks) / elapsed, 1) if elapsed > 0 else None,
+        slicing=slicing
+    )
+    store.last_build_stats = stats
+    print(f"[index_sync] Re-indexed {store.repo_id}: {stats['added']} added, {stats['modified']} modified, "
+          f"{stats['deleted']} deleted, {stats['unchanged']} unchanged files in {elapsed:.2f}s")
+    report(dict(stats, stage="done"))
+    return stats
+
+
 # Global manager instance
 _sync_manager: Optional[IndexSyncManager] = None
 
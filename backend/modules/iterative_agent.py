@@ -6,7 +6,7 @@ from pathlib import Path
 from typing import List, Dict, Set, Optional, Tuple
 import json
 
-from backend.modules.vector_store import FaissStore
+from backend.modules.index_cache import get_store, has_index
 from backend.modules.search import ripgrep_candidates, fuse_results
 from backend.modules.question_decomposer import decompose_question
 from backend.modules.context_retriever import expand_code_context
@@ -73,11 +73,10 @@ class IterativeSearchAgent:
             base_dir = f"{DATA_DIR}/index"
         self.base_dir = base_dir
         
-        # Load vector store
-        self.store = FaissStore(self.repo_id, base_dir=base_dir)
-        if not self.store.index_path.exists():
+        # Load vector store (shared, cached across requests)
+        if not has_index(self.repo_id, base_dir=base_dir):
             raise ValueError(f"Repository not indexed: {self.repo_id}")
-        self.store.load()
+        self.store = get_store(self.repo_id, base_dir=base_dir)
         
         # Track search steps
         self.search_steps: List[SearchStep] = []
@@ -89,7 +88,8 @@ class IterativeSearchAgent:
         self.reasoning_chain: Optional[ReasoningChain] = None
         self._original_question = original_question or ""
     
-    def search_single_query(self, query: str, top_k: int = TOP_K_FINAL, expand_context: bool = True) -> List[Dict]:
+    def search_single_query(self, query: str, top_k: int = TOP_K_FINAL, expand_context: bool = True,
+                            vec_results: Optional[List[Dict]] = None) -> List[Dict]:
         """
         Perform a single search query.
         
@@ -97,13 +97,15 @@ class IterativeSearchAgent:
             query: Search query
             top_k: Maximum number of results
             expand_context: Whether to expand code context
+            vec_results: Precomputed vector results (from a batched query); searched here if None
         
         Returns:
             List of search results with repo_id added
         """
         # Hybrid search: ripgrep + vector
         rg_results = ripgrep_candidates(query, str(self.repo_dir), top_k=TOP_K_RG)
-        vec_results = self.store.query(query, k=TOP_K_EMB)
+        if vec_results is None:
+            vec_results = self.store.query(query, k=TOP_K_EMB)
         fused = fuse_results(rg_results, vec_results, top_k=top_k)
         
         # Add repo_id for consistency
@@ -155,6 +157,13 @@ class IterativeSearchAgent:
         
         print(f"[iterative_agent] Starting iterative search with {max_steps} steps")
         
+        # Vector search for all steps at once (one encode pass + one index search)
+        try:
+            vec_batches = self.store.query_batch(sub_questions[:max_steps], k=TOP_K_EMB)
+        except Exception as e:
+            print(f"[iterative_agent] Batched vector search failed, searching per step: {e}")
+            vec_batches = [None] * max_steps
+        
         for i, query in enumerate(sub_questions[:max_steps], 1):
             print(f"[iterative_agent] Step {i}/{max_steps}: Searching for '{query[:60]}...'")
             
@@ -168,7 +177,8 @@ class IterativeSearchAgent:
             
             # Perform search
             try:
-                results = self.search_single_query(query, top_k=results_per_step, expand_context=True)
+                results = self.search_single_query(query, top_k=results_per_step, expand_context=True,
+                                                   vec_results=vec_batches[i - 1])
                 
                 # Deduplicate if requested
                 if deduplicate:
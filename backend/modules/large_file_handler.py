@@ -3,41 +3,58 @@ Utilities for handling large files in refactoring and analysis.
 Provides better chunking strategies, streaming support, and edge case handling.
 """
 from pathlib import Path
-from typing import List, Dict, Optional, Tuple
+from typing import List, Dict, Optional, Tuple, Union
 import re
-from backend.modules.parser import semantic_chunks, fallback_line_chunks
+from backend.modules.file_view import FileView
+from backend.modules.parser import semantic_chunks
+
+
+def _view(file: Union[Path, FileView], views: Optional[Dict[str, FileView]] = None) -> Optional[FileView]:
+    """FileView of a path (reused from / added to `views`), or None if it can't be read."""
+    if isinstance(file, FileView):
+        return file
+    key = str(file)
+    if views is not None and key in views:
+        return views[key]
+    try:
+        view = FileView.read(file)
+    except OSError:
+        return None
+    if views is not None:
+        views[key] = view
+    return view
 
 
 def chunk_large_file_semantically(
-    file_path: Path,
+    file_path: Union[Path, FileView],
     max_chunks: int = 5,
     max_lines_per_chunk: int = 200,
     start_line: Optional[int] = None,
-    end_line: Optional[int] = None
+    end_line: Optional[int] = None,
+    views: Optional[Dict[str, FileView]] = None
 ) -> List[Dict]:
     """
     Chunk a large file semantically (by functions/classes) for refactoring.
     
     Args:
-        file_path: Path to the file
+        file_path: Path to the file, or a FileView of it
         max_chunks: Maximum number of chunks to return
         max_lines_per_chunk: Maximum lines per chunk
         start_line: Optional start line (1-indexed) - only chunk this range
         end_line: Optional end line (1-indexed) - only chunk this range
+        views: Optional path -> FileView cache shared across one pass, so the file is read once
     
     Returns:
         List of chunk dicts with 'file', 'start', 'end', 'snippet', 'type' (function/class/etc)
     """
-    if not file_path.exists():
+    view = _view(file_path, views)
+    if view is None:
         return []
+    file_path = view.path
     
     try:
-        # Try semantic chunking first (functions/classes)
-        chunks = semantic_chunks(file_path)
-        
-        if not chunks:
-            # Fallback to line-based chunking
-            chunks = fallback_line_chunks(file_path)
+        # Semantic chunking (functions/classes), falling back to line-based chunks of the same view
+        chunks = semantic_chunks(view)
         
         # Filter by line range if specified
         if start_line or end_line:
@@ -59,15 +76,9 @@ def chunk_large_file_semantically(
                     chunk_end = end_line
                 
                 # Re-extract snippet for adjusted range
-                try:
-                    content = file_path.read_text(encoding="utf-8", errors="ignore")
-                    lines = content.splitlines()
-                    snippet_lines = lines[chunk_start - 1:chunk_end]
-                    chunk["snippet"] = "\n".join(snippet_lines)
-                    chunk["start"] = chunk_start
-                    chunk["end"] = chunk_end
-                except:
-                    pass
+                chunk["snippet"] = view.snippet(chunk_start, chunk_end)
+                chunk["start"] = chunk_start
+                chunk["end"] = chunk_end
                 
                 filtered_chunks.append(chunk)
             chunks = filtered_chunks
@@ -96,20 +107,22 @@ def chunk_large_file_semantically(
         return []
 
 
-def get_file_size_category(file_path: Path) -> str:
+def get_file_size_category(file_path: Union[Path, FileView]) -> str:
     """
     Categorize file size for appropriate handling strategy.
     
+    Args:
+        file_path: Path to the file, or a FileView of it
+    
     Returns:
         "small" (< 200 lines), "medium" (200-1000), "large" (1000-5000), "very_large" (> 5000)
     """
     try:
-        if not file_path.exists():
+        view = _view(file_path)
+        if view is None:
             return "unknown"
         
-        content = file_path.read_text(encoding="utf-8", errors="ignore")
-        lines = content.splitlines()
-        line_count = len(lines)
+        line_count = view.line_count
         
         if line_count < 200:
             return "small"
@@ -124,7 +137,7 @@ def get_file_size_category(file_path: Path) -> str:
 
 
 def extract_specific_sections(
-    file_path: Path,
+    file_path: Union[Path, FileView],
     section_type: str = "function",
     max_sections: int = 5
 ) -> List[Dict]:
@@ -132,7 +145,7 @@ def extract_specific_sections(
     Extract specific sections (functions, classes) from a file for targeted refactoring.
     
     Args:
-        file_path: Path to the file
+        file_path: Path to the file, or a FileView of it
         section_type: "function", "class", or "all"
         max_sections: Maximum number of sections to return
     
@@ -150,7 +163,7 @@ def extract_specific_sections(
         
         if section_type == "all":
             filtered.append(chunk)
-        elif section_type == "function" and "function" in chunk_type:
+        elif section_type == "function" and ("function" in chunk_type or chunk_type == "method"):
             filtered.append(chunk)
         elif section_type == "class" and "class" in chunk_type:
             filtered.append(chunk)
@@ -172,7 +185,8 @@ def estimate_token_count(text: str) -> int:
 def optimize_for_refactoring(
     evidences: List[Dict],
     max_total_tokens: int = 8000,  # Conservative estimate for refactoring
-    prefer_semantic: bool = True
+    prefer_semantic: bool = True,
+    views: Optional[Dict[str, FileView]] = None
 ) -> List[Dict]:
     """
     Optimize code snippets for refactoring by:
@@ -184,17 +198,20 @@ def optimize_for_refactoring(
         evidences: List of evidence dicts
         max_total_tokens: Maximum total tokens to send to LLM
         prefer_semantic: Whether to prefer semantic chunks over line-based
+        views: Optional path -> FileView cache (e.g. files the caller already read); evidences
+               from the same file share one read
     
     Returns:
         Optimized list of evidences
     """
     optimized = []
     total_tokens = 0
+    views = views if views is not None else {}
     
     for ev in evidences:
         file_path = Path(ev.get("file", ""))
         
-        if not file_path.exists():
+        if str(file_path) not in views and not file_path.exists():
             # Keep original if file doesn't exist
             optimized.append(ev)
             continue
@@ -215,7 +232,8 @@ def optimize_for_refactoring(
                 max_chunks=3,
                 max_lines_per_chunk=150,
                 start_line=ev.get("start"),
-                end_line=ev.get("end")
+                end_line=ev.get("end"),
+                views=views
             )
             
             if chunks:
@@ -0,0 +1,183 @@
+"""
+Process-wide registry for embedding models.
+Each (model name, device, backend) is loaded once and shared by every FaissStore,
+so requests no longer pay for model construction.
+"""
+import threading
+import time
+from typing import Dict, Optional, Tuple, Any
+
+from backend.config import (
+    EMBEDDING_MODEL, EMBEDDING_DEVICE, EMBEDDING_BACKEND,
+    EMBEDDING_ONNX_FILE, EMBEDDING_ONNX_QUANTIZE, EMBEDDING_ONNX_THREADS
+)
+
+BACKEND_TORCH = "torch"
+BACKEND_ONNX = "onnx"
+
+
+class ModelRegistry:
+    """Lazily loads and caches embedding models - SentenceTransformer or ONNX (thread-safe)."""
+
+    def __init__(self):
+        self._models: Dict[Tuple[str, str, str], Any] = {}
+        self._load_locks: Dict[Tuple[str, str, str], threading.Lock] = {}
+        self._lock = threading.Lock()
+        self._model_info: Dict[Tuple[str, str, str], Dict[str, Any]] = {}
+        self.stats = {
+            "loads": 0,
+            "hits": 0,
+            "load_errors": 0,
+            "total_load_seconds": 0.0
+        }
+
+    def _make_key(self, model_name: Optional[str], device: Optional[str],
+                  backend: Optional[str] = None) -> Tuple[str, str, str]:
+        """Normalize (model name, device, backend) into a registry key."""
+        backend = backend or EMBEDDING_BACKEND
+        if backend == BACKEND_ONNX:
+            # onnxruntime runs on the CPU provider regardless of EMBEDDING_DEVICE
+            device = "cpu"
+        return (model_name or EMBEDDING_MODEL, device or EMBEDDING_DEVICE or "auto", backend)
+
+    def get_model(self, model_name: Optional[str] = None, device: Optional[str] = None,
+                  backend: Optional[str] = None):
+        """
+        Get a shared embedding model, loading it on first use.
+
+        Args:
+            model_name: Model name or path (defaults to EMBEDDING_MODEL)
+            device: Device to load the model on (defaults to EMBEDDING_DEVICE / auto)
+            backend: "torch" or "onnx" (defaults to EMBEDDING_BACKEND)
+
+        Returns:
+            Loaded SentenceTransformer (or OnnxEmbedder) instance
+        """
+        key = self._make_key(model_name, device, backend)
+
+        # Fast path: already loaded (no locking needed for dict reads)
+        model = self._models.get(key)
+        if model is not None:
+            self.stats["hits"] += 1
+            return model
+
+        # One lock per key so loading one model doesn't block another
+        with self._lock:
+            load_lock = self._load_locks.setdefault(key, threading.Lock())
+
+        with load_lock:
+            model = self._models.get(key)
+            if model is not None:
+                self.stats["hits"] += 1
+                return model
+
+            model = self._load(key)
+            self._models[key] = model
+            return model
+
+    def _load(self, key: Tuple[str, str, str]):
+        """Construct the model for a registry key and record load metrics."""
+        model_name, device, backend = key
+        print(f"[model_registry] Loading embedding model: {model_name} (device: {device}, backend: {backend})")
+        start = time.time()
+        try:
+            if backend == BACKEND_ONNX:
+                from backend.modules.onnx_embedder import OnnxEmbedder
+                model = OnnxEmbedder(
+                    model_name, onnx_file=EMBEDDING_ONNX_FILE or None,
+                    quantize=EMBEDDING_ONNX_QUANTIZE, threads=EMBEDDING_ONNX_THREADS
+                )
+            elif backend == BACKEND_TORCH:
+                from sentence_transformers import SentenceTransformer
+                model = SentenceTransformer(model_name, device=None if device == "auto" else device)
+            else:
+                raise ValueError(f"Unknown EMBEDDING_BACKEND: {backend} (expected 'torch' or 'onnx')")
+        except Exception as e:
+            self.stats["load_errors"] += 1
+            print(f"[model_registry] Error loading model {model_name}: {e}")
+            raise
+
+        elapsed = time.time() - start
+        self.stats["loads"] += 1
+        self.stats["total_load_seconds"] += elapsed
+        self._model_info[key] = {
+            "model": model_name,
+            "device": str(getattr(model, "device", device)),
+            "backend": backend,
+            "quantized": bool(getattr(model, "quantized", False)),
+            "dimension": model.get_sentence_embedding_dimension(),
+            "load_seconds": round(elapsed, 3),
+            "loaded_at": time.time()
+        }
+        print(f"[model_registry] Model loaded in {elapsed:.2f}s")
+        return model
+
+    def warmup(self, model_name: Optional[str] = None, device: Optional[str] = None, background: bool = True):
+        """
+        Load a model ahead of the first request.
+
+        Args:
+            model_name: Model name or path (defaults to EMBEDDING_MODEL)
+            device: Device to load the model on
+            background: If True, load in a daemon thread so startup isn't blocked
+        """
+        def _warmup():
+            try:
+                model = self.get_model(model_name, device)
+                # Run one tiny encode so lazy kernels/tokenizers are initialized too
+                model.encode(["warmup"], normalize_embeddings=True)
+            except Exception as e:
+                print(f"[model_registry] Warmup failed: {e}")
+
+        if background:
+            thread = threading.Thread(target=_warmup, daemon=True, name="embedding-warmup")
+            thread.start()
+            return thread
+        _warmup()
+        return None
+
+    def is_loaded(self, model_name: Optional[str] = None, device: Optional[str] = None) -> bool:
+        """Check if a model is already loaded."""
+        return self._make_key(model_name, device) in self._models
+
+    def unload(self, model_name: Optional[str] = None, device: Optional[str] = None) -> bool:
+        """Drop a model from the registry (it will be reloaded on next use)."""
+        key = self._make_key(model_name, device)
+        with self._lock:
+            self._model_info.pop(key, None)
+            return self._models.pop(key, None) is not None
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get registry statistics, including per-model load times."""
+        return {
+            "loaded_models": [dict(info) for info in self._model_info.values()],
+            "loads": self.stats["loads"],
+            "hits": self.stats["hits"],
+            "load_errors": self.stats["load_errors"],
+            "total_load_seconds": round(self.stats["total_load_seconds"], 3)
+        }
+
+
+# Global registry instance
+_model_registry: Optional[ModelRegistry] = None
+_registry_lock = threading.Lock()
+
+
+def get_model_registry() -> ModelRegistry:
+    """Get global model registry instance."""
+    global _model_registry
+    if _model_registry is None:
+        with _registry_lock:
+            if _model_registry is None:
+                _model_registry = ModelRegistry()
+    return _model_registry
+
+
+def get_embedding_model(model_name: Optional[str] = None, device: Optional[str] = None):
+    """Get the shared embedding model (loads it on first call)."""
+    return get_model_registry().get_model(model_name, device)
+
+
+def warmup_embedding_model(background: bool = True):
+    """Warm up the default embedding model (called at app startup)."""
+    return get_model_registry().warmup(background=background)
@@ -2,12 +2,17 @@
 Multi-repository support for querying across multiple codebases.
 """
 from pathlib import Path
-from typing import List, Dict, Set, Optional
+from typing import Callable, List, Dict, Set, Optional
 import json
 
 from backend.modules.vector_store import FaissStore
+from backend.modules.index_cache import get_store, has_index, get_index_cache
+from backend.modules.chunk_store import read_chunk_summary
+from backend.modules.index_generations import read_current
+from backend.modules.search_filters import SearchFilter
 from backend.modules.search import ripgrep_candidates, fuse_results
-from backend.modules.parser import slice_repo
+from backend.modules.index_sync import reindex_repo
+from backend.modules.index_jobs import JobCancelled
 from backend.config import DATA_DIR, TOP_K_EMB, TOP_K_RG, TOP_K_FINAL
 
 
@@ -24,7 +29,7 @@ def get_indexed_repos(base_dir: str = None) -> List[Dict]:
         base_dir: Base directory for indices (defaults to DATA_DIR/index)
     
     Returns:
-        List of dicts with 'repo_id', 'repo_dir', and 'chunks' info
+        List of dicts with 'repo_id', 'repo_dir', 'chunks' and 'index_type' info
     """
     if base_dir is None:
         base_dir = f"{DATA_DIR}/index"
@@ -37,26 +42,47 @@ def get_indexed_repos(base_dir: str = None) -> List[Dict]:
     
     for repo_dir in base_path.iterdir():
         if repo_dir.is_dir():
+            # Current index generation (None for indexes written before generations)
+            try:
+                manifest = read_current(repo_dir)
+            except (OSError, ValueError):
+                manifest = None
+            chunks_path = repo_dir / ((manifest or {}).get("chunks") or "chunks.db")
             meta_path = repo_dir / "meta.json"
-            index_path = repo_dir / "faiss.index"
             
-            if meta_path.exists() and index_path.exists():
+            if FaissStore.index_exists(repo_dir.name, base_dir) and (chunks_path.exists() or meta_path.exists()):
                 try:
-                    with open(meta_path, "r", encoding="utf-8") as f:
-                        metas = json.load(f)
+                    if chunks_path.exists():
+                        # Count + one sample row; no snippets are deserialized
+                        summary = read_chunk_summary(chunks_path)
+                    else:
+                        # Legacy index not loaded since the chunk store was introduced
+                        with open(meta_path, "r", encoding="utf-8") as f:
+                            metas = json.load(f)
+                        summary = {
+                            "chunks": len(metas) if isinstance(metas, list) else 0,
+                            "first_file": metas[0].get("file") if isinstance(metas, list) and metas else None
+                        }
                     
                     # Try to get repo_dir from stored metadata
                     repo_dir_path = None
-                    if metas and isinstance(metas, list) and len(metas) > 0:
-                        first_file = metas[0].get("file", "")
-                        if first_file:
-                            repo_dir_path = str(Path(first_file).parent)
+                    if summary["first_file"]:
+                        repo_dir_path = str(Path(summary["first_file"]).parent)
+                    
+                    index_type = "flat"
+                    info_path = repo_dir / "index_info.json"
+                    if manifest is not None:
+                        index_type = manifest.get("info", {}).get("type", "flat")
+                    elif info_path.exists():
+                        with open(info_path, "r", encoding="utf-8") as f:
+                            index_type = json.load(f).get("type", "flat")
                     
                     indexed_repos.append({
                         "repo_id": repo_dir.name,
                         "repo_dir": repo_dir_path,
-                        "chunks": len(metas) if isinstance(metas, list) else 0,
-                        "index_path": str(index_path)
+                        "chunks": summary["chunks"],
+                        "index_path": str(repo_dir),
+                        "index_type": index_type
                     })
                 except Exception as e:
                     print(f"[multi_repo] Error reading repo {repo_dir.name}: {e}")
@@ -68,7 +94,8 @@ def search_multiple_repos(
     repo_dirs: List[str],
     query: str,
     top_k: int = TOP_K_FINAL,
-    base_dir: str = None
+    base_dir: str = None,
+    filters: Optional[SearchFilter] = None
 ) -> List[Dict]:
     """
     Search across multiple repositories and merge results.
@@ -78,6 +105,7 @@ def search_multiple_repos(
         query: Search query
         top_k: Maximum number of results to return per repo (before merging)
         base_dir: Base directory for indices
+        filters: Optional SearchFilter (path prefixes/globs are relative to each repo)
     
     Returns:
         Merged list of search results with 'repo_id' field added
@@ -86,26 +114,31 @@ def search_multiple_repos(
         base_dir = f"{DATA_DIR}/index"
     
     all_results = []
+    # The query is encoded once per embedding model and reused for every repo
+    query_embs = {}
     
-    for repo_dir in repo_dirs:
+    for repo_index, repo_dir in enumerate(repo_dirs):
         repo_path = Path(repo_dir)
         if not repo_path.exists():
             print(f"[multi_repo] Repo not found: {repo_dir}, skipping")
             continue
         
         rid = repo_id_from_path(repo_dir)
-        store = FaissStore(rid, base_dir=base_dir)
         
-        if not store.index_path.exists():
+        if not has_index(rid, base_dir=base_dir):
             print(f"[multi_repo] Repo {rid} not indexed, skipping")
             continue
         
         try:
-            store.load()
+            store = get_store(rid, base_dir=base_dir)
             
             # Hybrid search for this repo
             rg_results = ripgrep_candidates(query, repo_dir, top_k=TOP_K_RG)
-            vec_results = store.query(query, k=TOP_K_EMB)
+            fingerprint = store.model_fingerprint
+            if fingerprint not in query_embs:
+                query_embs[fingerprint] = store.encode_queries([query])
+            repo_filters = filters.for_repo(repo_dir) if filters is not None else None
+            vec_results = store.search_embeddings(query_embs[fingerprint], k=TOP_K_EMB, filters=repo_filters)[0]
             fused = fuse_results(rg_results, vec_results, top_k=top_k)
             
             # Add repo_id to each result
@@ -136,14 +169,19 @@ def search_multiple_repos(
 
 def index_multiple_repos(
     repo_dirs: List[str],
-    base_dir: str = None
+    base_dir: str = None,
+    progress: Optional[Callable[[Dict], None]] = None,
+    full: bool = False
 ) -> Dict:
     """
-    Index multiple repositories.
+    Index multiple repositories (incrementally for repos that are already indexed, see reindex_repo).
     
     Args:
         repo_dirs: List of repository directory paths
         base_dir: Base directory for indices
+        progress: Called with each repo's build progress events (plus repo_id, repo_index, repos);
+                  a JobCancelled raised from it stops the whole run
+        full: Rebuild every repo from scratch
     
     Returns:
         Dict with indexing results for each repo
@@ -156,7 +194,7 @@ def index_multiple_repos(
         "repos": []
     }
     
-    for repo_dir in repo_dirs:
+    for repo_index, repo_dir in enumerate(repo_dirs):
         repo_path = Path(repo_dir)
         if not repo_path.exists():
             results["repos"].append({
@@ -170,19 +208,26 @@ def index_multiple_repos(
         
         try:
             # Index the repository
-            chunks = slice_repo(repo_dir)
             store = FaissStore(rid, base_dir=base_dir)
-            store.build(chunks)
+            report = None
+            if progress is not None:
+                def report(event, rid=rid, repo_index=repo_index):
+                    progress(dict(event, repo_id=rid, repo_index=repo_index, repos=len(repo_dirs)))
+            stats = reindex_repo(store, repo_dir, full=full, progress=report)
+            get_index_cache().put(store)
             
             results["repos"].append({
                 "repo_id": rid,
                 "repo_dir": repo_dir,
                 "ok": True,
-                "chunks": len(chunks)
+                "chunks": stats["chunks"],
+                "indexing": stats
             })
             
-            print(f"[multi_repo] Indexed {rid}: {len(chunks)} chunks")
+            print(f"[multi_repo] Indexed {rid}: {stats['chunks']} chunks")
             
+        except JobCancelled:
+            raise
         except Exception as e:
             error_msg = str(e)
             results["repos"].append({
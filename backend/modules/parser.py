@@ -1,21 +1,33 @@
-﻿from pathlib import Path
-from typing import List, Dict, Set, Optional
-import fnmatch
-from backend.config import CHUNK_LINES, DEFAULT_IGNORE_PATTERNS
+﻿import json
+import re
+import threading
+import time
+from itertools import accumulate
+from pathlib import Path
+from typing import Callable, Iterable, List, Dict, Set, Optional, Tuple, Union
+from backend.config import (
+    CHUNK_LINES, CHUNKER, DEFAULT_IGNORE_PATTERNS, EMBEDDING_MODEL,
+    CHUNK_TOKEN_SIZING, CHUNK_TOKEN_WINDOW, CHUNK_MIN_TOKENS, CHUNK_SPLIT_OVERLAP_LINES
+)
+from backend.modules.ignore import IgnoreMatcher
+from backend.modules.file_view import FileView
+# Tree-sitter is optional: without it (or a language's grammar package) chunking falls back to regex/lines
+from backend.modules.ts_chunker import TREE_SITTER_AVAILABLE, get_parser, tree_sitter_chunks
 
-# Tree-sitter imports (optional - fallback if not available)
-try:
-    import tree_sitter
-    from tree_sitter import Language, Parser
-    TREE_SITTER_AVAILABLE = True
-except ImportError:
-    TREE_SITTER_AVAILABLE = False
-    print("[parser] tree-sitter not available, using fallback line-based chunking")
+if not TREE_SITTER_AVAILABLE:
+    print("[parser] tree-sitter not available, using regex/line-based chunking")
 
-def load_gitignore(root: Path) -> Set[str]:
-    """Load patterns from .gitignore if it exists"""
+# Files the indexer reads
+TEXT_EXTENSIONS = {".py",".js",".ts",".jsx",".tsx",".vue",".go",".java",".cs",".cpp",".c",".rs",".md"}
+
+def load_gitignore(root: Path) -> List[str]:
+    """
+    Ignore patterns for a repo root: DEFAULT_IGNORE_PATTERNS followed by the lines of its
+    .gitignore, in order (negations depend on it). Nested .gitignore files are handled by
+    IgnoreMatcher itself.
+    """
     gitignore_path = root / ".gitignore"
-    patterns = set(DEFAULT_IGNORE_PATTERNS)
+    patterns = list(DEFAULT_IGNORE_PATTERNS)
     
     if gitignore_path.exists():
         try:
@@ -24,142 +36,69 @@ def load_gitignore(root: Path) -> Set[str]:
                     line = line.strip()
                     # Skip comments and empty lines
                     if line and not line.startswith('#'):
-                        # Normalize pattern
-                        if not line.endswith('/'):
-                            # Treat as both file and directory pattern
-                            patterns.add(line)
-                            patterns.add(line + '/')
-                        else:
-                            patterns.add(line)
+                        patterns.append(line)
         except Exception as e:
             print(f"[parser] Warning: Could not read .gitignore: {e}")
     
     return patterns
 
-def should_ignore(path: Path, root: Path, ignore_patterns: Set[str]) -> bool:
-    """Check if a path should be ignored based on patterns (similar to .gitignore logic)"""
-    try:
-        rel_path = path.relative_to(root)
-        rel_str = str(rel_path).replace('\\', '/')
-        parts = rel_str.split('/')
-        
-        # Check each pattern
-        for pattern in ignore_patterns:
-            pattern_clean = pattern.strip()
-            if not pattern_clean:
-                continue
-            
-            # Normalize pattern
-            is_dir_pattern = pattern_clean.endswith('/')
-            pattern_base = pattern_clean.rstrip('/')
-            
-            # Check each segment of the path
-            for i in range(len(parts)):
-                segment = parts[i]
-                partial_path = '/'.join(parts[:i+1])
-                
-                # Exact match on segment
-                if segment == pattern_base or fnmatch.fnmatch(segment, pattern_base):
-                    return True
-                
-                # Directory pattern - match if path starts with pattern
-                if is_dir_pattern and partial_path.startswith(pattern_base + '/'):
-                    return True
-                if is_dir_pattern and partial_path == pattern_base:
-                    return True
-                
-                # Full path match
-                if fnmatch.fnmatch(partial_path, pattern_base) or fnmatch.fnmatch(partial_path, pattern_clean):
-                    return True
-            
-            # Full path match (for file patterns)
-            if fnmatch.fnmatch(rel_str, pattern_base):
-                return True
-            
-            # Match any part of the path
-            if any(fnmatch.fnmatch(part, pattern_base) for part in parts):
-                return True
-        
-        return False
-    except ValueError:
-        # Path is not relative to root (shouldn't happen, but handle gracefully)
-        return False
+def should_ignore(path: Path, root: Path, ignore_patterns: Optional[Iterable[str]] = None) -> bool:
+    """
+    Check if a path should be ignored (.gitignore semantics, see IgnoreMatcher).
+    Compiles the patterns on every call - keep an IgnoreMatcher around to check many paths.
+    """
+    return IgnoreMatcher(root, patterns=ignore_patterns).ignores(path)
 
-def iter_text_files(root: Path, ignore_patterns: Set[str] = None):
+def iter_text_files(root: Path, ignore_patterns: Optional[Iterable[str]] = None,
+                    matcher: Optional[IgnoreMatcher] = None):
     """
     Iterate over text files in the repository, excluding ignored patterns.
+    Ignored directories (node_modules/, .git/...) are pruned without being entered.
     
     Args:
         root: Root directory to scan
-        ignore_patterns: Set of ignore patterns (defaults to loading from .gitignore + defaults)
+        ignore_patterns: Ignore patterns replacing the defaults + root .gitignore (e.g. from load_gitignore)
+        matcher: Prebuilt IgnoreMatcher for this root (defaults to one built from ignore_patterns)
     """
-    if ignore_patterns is None:
-        ignore_patterns = load_gitignore(root)
-    
-    exts = {".py",".js",".ts",".jsx",".tsx",".vue",".go",".java",".cs",".cpp",".c",".rs",".md"}
-    
-    # Track what we've seen to avoid duplicates
-    seen_files = set()
-    
-    for p in root.rglob("*"):
-        # Skip if already seen or if ignored
-        if str(p) in seen_files:
-            continue
-            
-        if should_ignore(p, root, ignore_patterns):
-            continue
-        
-        # Check if it's a file with supported extension
-        if p.is_file() and p.suffix.lower() in exts:
-            seen_files.add(str(p))
-            yield p
+    if matcher is None:
+        matcher = IgnoreMatcher(root, patterns=ignore_patterns)
+    yield from matcher.walk(TEXT_EXTENSIONS)
 
-def get_language_parser(file_path: Path) -> Optional[Parser]:
-    """Get appropriate tree-sitter parser for the file type"""
-    if not TREE_SITTER_AVAILABLE:
-        return None
-    
-    ext = file_path.suffix.lower()
-    language_map = {
-        '.py': 'python',
-        '.js': 'javascript',
-        '.ts': 'javascript',  # TypeScript uses JavaScript parser
-        '.jsx': 'javascript',
-        '.tsx': 'javascript',
-    }
-    
-    lang_name = language_map.get(ext)
-    if not lang_name:
-        return None
-    
-    try:
-        # Try to load language (this requires tree-sitter languages to be built)
-        # For now, we'll use a simpler approach that works without building
-        # In production, you'd build the languages first
-        return None  # Will fallback to line-based for now
-    except Exception as e:
-        print(f"[parser] Could not load tree-sitter parser for {ext}: {e}")
-        return None
+def is_indexable(path: Path, matcher: IgnoreMatcher) -> bool:
+    """Whether iter_text_files would yield this file (used for watcher events)."""
+    return path.suffix.lower() in TEXT_EXTENSIONS and not matcher.ignores(path, is_dir=False)
+
+def get_language_parser(file_path: Path):
+    """Get appropriate tree-sitter parser for the file type (None if no grammar is installed)"""
+    return get_parser(file_path.suffix.lower())
 
-def semantic_chunks(file_path: Path) -> List[Dict]:
+def semantic_chunks(file: Union[Path, FileView], chunker: str = CHUNKER) -> List[Dict]:
     """
-    Extract semantic chunks from code using pattern-based semantic extraction.
-    Falls back to line-based chunking if semantic extraction fails.
-    Note: Uses regex patterns for semantic extraction (works without tree-sitter).
+    Extract semantic chunks (functions, classes, methods) from code.
+    Uses the tree-sitter grammar for the file's language when one is installed, otherwise
+    regex patterns (Python/JS/TS). Falls back to line-based chunking if neither applies.
+    
+    Args:
+        file: File path, or a FileView to reuse text already read
+        chunker: "auto" (tree-sitter, then regex) or "regex"
     """
-    ext = file_path.suffix.lower()
-    text = file_path.read_text(encoding="utf-8", errors="ignore")
-    lines = text.splitlines()
+    view = FileView.of(file)
+    ext = view.path.suffix.lower()
     
     chunks = []
     
+    if chunker != "regex":
+        chunks = tree_sitter_chunks(view) or []
+        if chunks:
+            return chunks
+    
     # Use pattern-based semantic extraction (works without tree-sitter)
     if ext in ['.py', '.js', '.ts', '.jsx', '.tsx']:
-        chunks = extract_semantic_units(file_path, text, lines, ext)
+        chunks = extract_semantic_units(view.path, view.text, view.lines, ext)
     
     # Fallback to line-based if semantic extraction didn't work
     if not chunks:
-        return fallback_line_chunks(file_path)
+        return fallback_line_chunks(view)
     
     return chunks
 
@@ -287,9 +226,11 @@ def extract_semantic_units(file_path: Path, text: str, lines: List[str], ext: st
     
     return chunks
 
-def fallback_line_chunks(file_path: Path, lines_per=CHUNK_LINES) -> List[Dict]:
-    """Fallback: simple line-based chunking"""
-    text = file_path.read_text(encoding="utf-8", errors="ignore").splitlines()
+def fallback_line_chunks(file: Union[Path, FileView], lines_per=CHUNK_LINES) -> List[Dict]:
+    """Fallback: simple line-based chunking (of a path or a FileView)"""
+    view = FileView.of(file)
+    text = view.lines
+    file_path = view.path
     chunks = []
     start = 1
     while start <= len(text):
@@ -304,45 +245,221 @@ def fallback_line_chunks(file_path: Path, lines_per=CHUNK_LINES) -> List[Dict]:
         start = end + 1
     return chunks
 
-def slice_repo(repo_dir: str, use_semantic: bool = True) -> List[Dict]:
+# === Token-aware chunk sizing ===
+# Rough WordPiece pieces when the model's tokenizer isn't available: words split every ~6 chars, symbols alone
+_WORD_RE = re.compile(r"[A-Za-z]+|\d+|[^\sA-Za-z\d]")
+_tokenizer_lock = threading.Lock()
+_line_token_counter: Optional[Callable[[List[str]], List[int]]] = None
+_token_window: Optional[int] = None
+
+def _estimate_line_tokens(lines: List[str]) -> List[int]:
+    return [sum(1 + (len(w) - 1) // 6 for w in _WORD_RE.findall(line)) for line in lines]
+
+def _load_token_counter() -> Tuple[Callable[[List[str]], List[int]], int]:
+    """(per-line token counter, token window) for EMBEDDING_MODEL, loaded once per process."""
+    global _line_token_counter, _token_window
+    with _tokenizer_lock:
+        if _line_token_counter is not None:
+            return _line_token_counter, _token_window
+        model_dir = Path(EMBEDDING_MODEL)
+        counter, max_seq_length = _estimate_line_tokens, 256
+        try:
+            with open(model_dir / "sentence_bert_config.json", "r", encoding="utf-8") as f:
+                max_seq_length = int(json.load(f).get("max_seq_length", max_seq_length))
+        except (OSError, ValueError, TypeError):
+            pass
+        if (model_dir / "tokenizer.json").is_file():
+            try:
+                from tokenizers import Tokenizer
+                tokenizer = Tokenizer.from_file(str(model_dir / "tokenizer.json"))
+                tokenizer.no_truncation()
+                tokenizer.no_padding()
+                counter = lambda lines: [len(e.ids) for e in tokenizer.encode_batch(lines, add_special_tokens=False)]
+            except Exception as e:
+                print(f"[parser] Could not load tokenizer from {model_dir} ({e}), estimating chunk tokens")
+        # [CLS] and [SEP] take two positions of the model's input
+        _token_window = CHUNK_TOKEN_WINDOW if CHUNK_TOKEN_WINDOW > 0 else max(16, max_seq_length - 2)
+        _line_token_counter = counter
+        return _line_token_counter, _token_window
+
+def _inner_boundaries(lines: List[str], start: int, end: int) -> Set[int]:
+    """Lines in start+1..end that begin an inner unit: after a blank line, or at the body's outermost indent."""
+    indents = [len(l) - len(l.lstrip()) for l in lines[start:end] if l.strip()]
+    body_indent = min(indents) if indents else 0
+    boundaries = set()
+    for line in range(start + 1, end + 1):
+        text = lines[line - 1]
+        if text.strip() and (not lines[line - 2].strip() or len(text) - len(text.lstrip()) <= body_indent):
+            boundaries.add(line)
+    return boundaries
+
+def _split_by_tokens(start: int, end: int, lines: List[str], tokens: Callable[[int, int], int],
+                     window: int, overlap: int) -> List[Tuple[int, int]]:
+    """Cut start..end into line ranges of at most `window` tokens, preferring inner boundaries."""
+    boundaries = _inner_boundaries(lines, start, end)
+    pieces = []
+    piece_start = start
+    while True:
+        piece_end = piece_start
+        while piece_end < end and tokens(piece_start, piece_end + 1) <= window:
+            piece_end += 1
+        if piece_end < end:
+            # Back up to the last boundary in the second half of the piece, if there is one
+            cuts = [b for b in boundaries if piece_start + (piece_end - piece_start) // 2 < b <= piece_end]
+            if cuts:
+                piece_end = max(cuts) - 1
+        pieces.append((piece_start, piece_end))
+        if piece_end >= end:
+            return pieces
+        piece_start = max(piece_end + 1 - overlap, piece_start + 1)
+
+def _same_scope(a: Dict, b: Dict) -> bool:
     """
-    Slice repository into chunks.
+    Whether two chunks are known to belong to the same scope. Tree-sitter definitions carry
+    "parent" (None for module level); regex units and the code between definitions don't, so
+    two of them may sit in different classes and are never merged. Line windows of a file
+    without semantic chunks have no scopes to cross.
+    """
+    if "parent" in a and "parent" in b:
+        return a["parent"] == b["parent"]
+    return a["type"] == b["type"] == "lines"
+
+def fit_chunks(chunks: List[Dict], view: FileView, stats: Optional[Dict] = None,
+               window: Optional[int] = None, min_tokens: int = CHUNK_MIN_TOKENS,
+               overlap: int = CHUNK_SPLIT_OVERLAP_LINES) -> List[Dict]:
+    """
+    Resize one file's chunks to the embedding model's token window.
+    Chunks over the window (which the model would silently truncate) are split at inner
+    boundaries with `overlap` lines repeated; adjacent chunks of the same scope (see _same_scope)
+    are merged while one of them is under `min_tokens` and the result still fits. Every chunk
+    gets a "tokens" count.
     
     Args:
-        repo_dir: Repository directory path
-        use_semantic: If True, use semantic chunking (functions/classes). 
-                     If False or semantic fails, fallback to line-based.
+        chunks: Chunks of the file (semantic or line-based)
+        view: The file they were cut from
+        stats: Optional dict whose counters are incremented: raw_chunks, oversized, split_pieces,
+               merged, truncated (chunks still over the window, e.g. one very long line), tokens
+        window: Tokens per chunk (defaults to the model's window, see CHUNK_TOKEN_WINDOW)
     """
-    repo = Path(repo_dir)
-    results = []
-    semantic_count = 0
-    fallback_count = 0
+    counter, default_window = _load_token_counter()
+    window = window or default_window
+    lines = view.lines
+    prefix = [0] + list(accumulate(counter(lines))) if lines else [0]
+    tokens = lambda start, end: prefix[min(end, len(lines))] - prefix[max(start, 1) - 1]
+    counts = {"raw_chunks": len(chunks), "oversized": 0, "split_pieces": 0, "merged": 0, "truncated": 0, "tokens": 0}
+
+    sized: List[Dict] = []
+    for chunk in sorted(chunks, key=lambda c: (c["start"], c["end"])):
+        if tokens(chunk["start"], chunk["end"]) <= window or chunk["end"] <= chunk["start"]:
+            sized.append(dict(chunk))
+            continue
+        counts["oversized"] += 1
+        pieces = _split_by_tokens(chunk["start"], chunk["end"], lines, tokens, window, max(0, overlap))
+        counts["split_pieces"] += len(pieces)
+        for number, (start, end) in enumerate(pieces, 1):
+            sized.append(dict(chunk, start=start, end=end, snippet="\n".join(lines[start - 1:end]),
+                              part=number, split=True))
+
+    merged: List[Dict] = []
+    for chunk in sized:
+        prev = merged[-1] if merged else None
+        if (prev is not None and min_tokens > 0 and not prev.get("split") and not chunk.get("split")
+                and _same_scope(prev, chunk) and chunk["start"] > prev["end"]
+                and not any(l.strip() for l in lines[prev["end"]:chunk["start"] - 1])
+                and min(tokens(prev["start"], prev["end"]), tokens(chunk["start"], chunk["end"])) < min_tokens
+                and tokens(prev["start"], chunk["end"]) <= window):
+            names = [n for n in (prev.get("name"), chunk.get("name")) if n]
+            prev_type = prev["type"] if prev["type"] != "lines" else chunk["type"]
+            prev.update(end=chunk["end"], snippet="\n".join(lines[prev["start"] - 1:chunk["end"]]),
+                        type=prev_type, merged=prev.get("merged", 1) + chunk.get("merged", 1))
+            if names:
+                prev["name"] = ", ".join(names)
+            counts["merged"] += 1
+            continue
+        merged.append(chunk)
+
+    for chunk in merged:
+        chunk.pop("split", None)
+        chunk["tokens"] = tokens(chunk["start"], chunk["end"])
+        counts["tokens"] += chunk["tokens"]
+        if chunk["tokens"] > window:
+            counts["truncated"] += 1
+    if stats is not None:
+        for key, value in counts.items():
+            stats[key] = stats.get(key, 0) + value
+    return merged
+
+def file_chunks(file: Union[Path, FileView], use_semantic: bool = True, stats: Optional[Dict] = None) -> List[Dict]:
+    """
+    Chunks of one file: semantic units if possible, otherwise fixed-size line ranges,
+    then resized to the embedding model's token window (see fit_chunks, CHUNK_TOKEN_SIZING).
     
-    for f in iter_text_files(repo):
-        if use_semantic:
-            chunks = semantic_chunks(f)
-            # Check if we got semantic chunks (function/class) vs fallback (lines)
-            if chunks:
-                # Check if any chunk is semantic (not all are "lines")
-                has_semantic = any(c.get("type") in ["function", "class"] for c in chunks)
-                if has_semantic:
-                    semantic_count += len(chunks)
-                    results.extend(chunks)
-                else:
-                    # All chunks are "lines" type - semantic extraction didn't work
-                    fallback_count += len(chunks)
-                    results.extend(chunks)
-            else:
-                # No chunks returned - use fallback
-                fallback_chunks = fallback_line_chunks(f)
-                fallback_count += len(fallback_chunks)
-                results.extend(fallback_chunks)
-        else:
-            fallback_chunks = fallback_line_chunks(f)
-            fallback_count += len(fallback_chunks)
-            results.extend(fallback_chunks)
+    Args:
+        stats: Optional dict updated with fit_chunks' sizing counters
+    """
+    view = FileView.of(file)
+    if not use_semantic:
+        chunks = fallback_line_chunks(view)
+    else:
+        # semantic_chunks already falls back to line chunks of the same view
+        chunks = semantic_chunks(view)
+    if CHUNK_TOKEN_SIZING and chunks:
+        chunks = fit_chunks(chunks, view, stats=stats)
+    return chunks
+
+def iter_repo_chunks(repo_dir: str, use_semantic: bool = True, stats: Optional[Dict] = None,
+                     files: Optional[Iterable[Path]] = None, workers: Optional[int] = None):
+    """
+    Walk the repository and yield chunks file by file, so callers can index repos
+    of any size without materializing every chunk.
+    Large repos are chunked by a process pool (see slice_pool); the output order is the same.
     
+    Args:
+        repo_dir: Repository directory path
+        use_semantic: If True, use semantic chunking (functions/classes), else line-based
+        stats: Optional dict updated in place with files/semantic/fallback counts, stage timings
+               (walk_seconds, chunk_seconds, chunk_cpu_seconds), workers/timeouts/errors and token
+               sizing counts (raw_chunks, oversized, split_pieces, merged, truncated, tokens)
+        files: Files to chunk, if the caller already walked the repo (defaults to iter_text_files)
+        workers: Slicing processes (None = SLICE_WORKERS for large repos, 1 = in-process)
+    """
+    from backend.modules.slice_pool import iter_file_chunks
+
+    stats = stats if stats is not None else {}
+    stats.update(files=0, semantic=0, fallback=0)
+    walk_start = time.perf_counter()
+    files = list(files if files is not None else iter_text_files(Path(repo_dir)))
+    stats["walk_seconds"] = round(time.perf_counter() - walk_start, 3)
+    for f, chunks in iter_file_chunks(files, use_semantic, workers=workers, stats=stats):
+        if chunks is None:
+            continue
+        stats["files"] += 1
+        # A file counts as semantic if any chunk is a function/class (vs all "lines")
+        if use_semantic and any(c.get("type") in ["function", "class", "method"] for c in chunks):
+            stats["semantic"] += len(chunks)
+        else:
+            stats["fallback"] += len(chunks)
+        yield from chunks
     if use_semantic:
-        print(f"[parser] Semantic chunks: {semantic_count}, Fallback chunks: {fallback_count}")
+        print(f"[parser] Semantic chunks: {stats['semantic']}, Fallback chunks: {stats['fallback']}")
+    print(f"[parser] Sliced {stats['files']} files with {stats['workers']} worker(s): "
+          f"walk {stats['walk_seconds']}s, chunk {stats['chunk_seconds']}s")
+    if stats["raw_chunks"]:
+        print(f"[parser] Token sizing: {stats['raw_chunks']} -> {stats['semantic'] + stats['fallback']} chunks "
+              f"({stats['oversized']} split into {stats['split_pieces']}, {stats['merged']} merged, "
+              f"{stats['truncated']} still over the window)")
+
+def slice_repo(repo_dir: str, use_semantic: bool = True, workers: Optional[int] = None,
+               stats: Optional[Dict] = None) -> List[Dict]:
+    """
+    Slice repository into chunks.
     
-    return results
+    Args:
+        repo_dir: Repository directory path
+        use_semantic: If True, use semantic chunking (functions/classes). 
+                     If False or semantic fails, fallback to line-based.
+        workers: Slicing processes (None = SLICE_WORKERS for large repos, 1 = in-process)
+        stats: Optional dict updated in place with counts, per-stage timings and chunk
+               token sizing/truncation counts (see iter_repo_chunks)
+    """
+    return list(iter_repo_chunks(repo_dir, use_semantic, stats=stats, workers=workers))
@@ -133,6 +133,13 @@ class PrivacyMode:
                             results["indexes_cleared"] += 1
                             print(f"[privacy] Cleared disk index: {repo_dir.name}")
                 
+                # Drop indexes kept resident in memory
+                try:
+                    from backend.modules.index_cache import get_index_cache
+                    get_index_cache().clear()
+                except ImportError:
+                    pass
+                
                 # Clear caches
                 cache_dir = Path(DATA_DIR) / "cache"
                 if cache_dir.exists():
@@ -148,6 +155,15 @@ class PrivacyMode:
                             results["caches_cleared"] += 1
                             print(f"[privacy] Cleared disk cache: {cache_type_dir.name}")
                 
+                # Clear content-addressed chunk embeddings (binary files)
+                try:
+                    from backend.modules.cache import get_chunk_embedding_store
+                    chunk_store = get_chunk_embedding_store()
+                    if chunk_store is not None:
+                        chunk_store.clear()
+                except ImportError:
+                    pass
+                
                 return {
                     "ok": True,
                     "message": "All disk data cleared successfully",
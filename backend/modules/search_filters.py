@@ -0,0 +1,231 @@
+"""
+Metadata filters for vector search.
+A SearchFilter scopes a query by path prefix/glob, language, chunk type and excluded
+files. FilterIndex keeps per-language / per-type bitmaps over a store's chunk ids so
+a filter turns into a FAISS ID selector and is applied inside the search - k results
+come back after filtering instead of being post-filtered out of k.
+"""
+import fnmatch
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple, Any
+
+import faiss
+import numpy as np
+
+from backend.modules.language_detector import EXTENSION_TO_LANGUAGE
+
+CHUNK_TYPES = ("function", "method", "class", "lines")
+
+
+def _as_list(value) -> List[str]:
+    if value is None or value == "":
+        return []
+    if isinstance(value, str):
+        return [v.strip() for v in value.split(",") if v.strip()]
+    return [str(v) for v in value if str(v)]
+
+
+def _norm_path(path: str) -> str:
+    return os.path.normcase(os.path.normpath(str(path)))
+
+
+def _clean_prefix(prefix: str) -> str:
+    prefix = prefix.replace("\\", "/")
+    while prefix.startswith("./"):
+        prefix = prefix[2:]
+    return prefix.lstrip("/")
+
+
+def language_of(file_path: str) -> Optional[str]:
+    """Language of a file by extension (None if unknown)."""
+    return EXTENSION_TO_LANGUAGE.get(Path(str(file_path)).suffix.lower())
+
+
+class SearchFilter:
+    """Which chunks a search may return. Empty fields don't filter."""
+
+    def __init__(self, path_prefix=None, path_glob=None, language=None, chunk_type=None,
+                 exclude_files=None, repo_dir: Optional[str] = None):
+        """
+        Args:
+            path_prefix: Path prefix(es) relative to the repo root, e.g. "src/"
+            path_glob: fnmatch-style pattern(s) on the repo-relative path, e.g. "*.py" ("*" also matches "/")
+            language: Language name(s) as in language_detector (e.g. "python", "typescript")
+            chunk_type: Chunk type(s): "function", "method", "class", "lines"
+            exclude_files: File path(s) whose chunks are never returned
+            repo_dir: Repo root that prefixes/globs are relative to (if unknown, they match any path suffix)
+        """
+        self.path_prefix = [_clean_prefix(p) for p in _as_list(path_prefix)]
+        self.path_glob = [g.replace("\\", "/") for g in _as_list(path_glob)]
+        self.language = [l.lower() for l in _as_list(language)]
+        self.chunk_type = [t.lower() for t in _as_list(chunk_type)]
+        self.exclude_files = {_norm_path(f) for f in _as_list(exclude_files)}
+        self.repo_dir = repo_dir
+
+        unknown = set(self.chunk_type) - set(CHUNK_TYPES)
+        if unknown:
+            raise ValueError(f"Unknown chunk type(s): {', '.join(sorted(unknown))}")
+
+    @classmethod
+    def from_dict(cls, data: Optional[Dict[str, Any]], repo_dir: Optional[str] = None) -> Optional["SearchFilter"]:
+        """Build a filter from request JSON ({"path_prefix", "path_glob", "language", "type", "exclude_files"})."""
+        if not data:
+            return None
+        if not isinstance(data, dict):
+            raise ValueError("filters must be an object")
+        search_filter = cls(
+            path_prefix=data.get("path_prefix"),
+            path_glob=data.get("path_glob"),
+            language=data.get("language"),
+            chunk_type=data.get("type", data.get("chunk_type")),
+            exclude_files=data.get("exclude_files"),
+            repo_dir=repo_dir
+        )
+        return None if search_filter.is_empty() else search_filter
+
+    def for_repo(self, repo_dir: str) -> "SearchFilter":
+        """Copy of this filter with paths relative to another repo."""
+        copy = SearchFilter.__new__(SearchFilter)
+        copy.__dict__.update(self.__dict__)
+        copy.repo_dir = repo_dir
+        return copy
+
+    def is_empty(self) -> bool:
+        return not (self.path_prefix or self.path_glob or self.language or self.chunk_type or self.exclude_files)
+
+    def cache_key(self) -> str:
+        """Stable string for result caches."""
+        return "|".join([
+            ",".join(sorted(self.path_prefix)), ",".join(sorted(self.path_glob)),
+            ",".join(sorted(self.language)), ",".join(sorted(self.chunk_type)),
+            ",".join(sorted(self.exclude_files))
+        ])
+
+    def _relative(self, file_path: str) -> Tuple[str, bool]:
+        """(posix path relative to repo_dir, whether it really is relative)."""
+        path = str(file_path).replace("\\", "/")
+        if self.repo_dir:
+            root = str(Path(self.repo_dir).resolve()).replace("\\", "/").rstrip("/") + "/"
+            if os.path.normcase(path).startswith(os.path.normcase(root)):
+                return path[len(root):], True
+        return path, False
+
+    def match_file(self, file_path: str) -> bool:
+        """Whether chunks of this file pass the file-level parts of the filter."""
+        if self.exclude_files and _norm_path(file_path) in self.exclude_files:
+            return False
+        if self.language and language_of(file_path) not in self.language:
+            return False
+        if self.path_prefix or self.path_glob:
+            rel, is_relative = self._relative(file_path)
+            if self.path_prefix:
+                if is_relative:
+                    ok = any(rel.startswith(p) for p in self.path_prefix)
+                else:
+                    ok = any(rel.startswith(p) or f"/{p}" in rel for p in self.path_prefix)
+                if not ok:
+                    return False
+            if self.path_glob:
+                ok = any(fnmatch.fnmatch(rel, g) or (not is_relative and fnmatch.fnmatch(rel, f"*/{g}"))
+                         for g in self.path_glob)
+                if not ok:
+                    return False
+        return True
+
+    def matches(self, chunk: Dict) -> bool:
+        """Whether a chunk passes the filter (for results that didn't come from a FilterIndex)."""
+        if self.chunk_type and chunk.get("type") not in self.chunk_type:
+            return False
+        return self.match_file(chunk.get("file", ""))
+
+
+class FilterIndex:
+    """
+    Column view of a store's chunk ids (file, type) with precomputed bitmaps.
+    Language and type bitmaps are built once; path conditions are evaluated
+    per distinct file and expanded through the file column.
+    """
+
+    def __init__(self, rows: Iterable[Tuple[int, str, Optional[str]]], cache_size: int = 32):
+        """
+        Args:
+            rows: (chunk id, file, type) for every chunk
+        """
+        ids, file_codes, type_codes = [], [], []
+        files: Dict[str, int] = {}
+        types: Dict[Optional[str], int] = {}
+        for chunk_id, file_path, chunk_type in rows:
+            ids.append(int(chunk_id))
+            file_codes.append(files.setdefault(str(file_path), len(files)))
+            type_codes.append(types.setdefault(chunk_type, len(types)))
+        self.ids = np.asarray(ids, dtype=np.int64)
+        self.file_codes = np.asarray(file_codes, dtype=np.int32)
+        self.files = list(files)
+        self.max_id = int(self.ids.max()) if len(self.ids) else -1
+
+        type_codes = np.asarray(type_codes, dtype=np.int32)
+        self.type_bitmaps = {t: type_codes == code for t, code in types.items()}
+        file_languages = np.array([language_of(f) or "" for f in self.files], dtype=object)
+        self.language_bitmaps = {
+            lang: np.isin(self.file_codes, np.flatnonzero(file_languages == lang))
+            for lang in set(file_languages) if lang
+        }
+        self._cache: "OrderedDict[Tuple, np.ndarray]" = OrderedDict()
+        self._cache_size = cache_size
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def mask(self, search_filter: SearchFilter) -> np.ndarray:
+        """Boolean mask over self.ids of chunks passing the filter."""
+        mask = np.ones(len(self.ids), dtype=bool)
+        if search_filter.chunk_type:
+            mask &= np.logical_or.reduce(
+                [self.type_bitmaps.get(t, np.zeros(len(self.ids), dtype=bool)) for t in search_filter.chunk_type]
+            )
+        if search_filter.language:
+            mask &= np.logical_or.reduce(
+                [self.language_bitmaps.get(l, np.zeros(len(self.ids), dtype=bool)) for l in search_filter.language]
+            )
+        if search_filter.path_prefix or search_filter.path_glob or search_filter.exclude_files:
+            file_ok = np.fromiter((search_filter.match_file(f) for f in self.files), dtype=bool, count=len(self.files))
+            mask &= file_ok[self.file_codes]
+        return mask
+
+    def bitmap(self, search_filter: SearchFilter) -> np.ndarray:
+        """
+        Packed little-endian bitmap over chunk ids 0..max_id (the layout faiss.IDSelectorBitmap reads).
+        Cached per filter, so repeated scoped searches don't re-evaluate paths.
+        """
+        key = (search_filter.cache_key(), search_filter.repo_dir)
+        with self._lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                return self._cache[key]
+        dense = np.zeros(self.max_id + 1, dtype=bool)
+        dense[self.ids[self.mask(search_filter)]] = True
+        packed = np.packbits(dense, bitorder="little")
+        with self._lock:
+            self._cache[key] = packed
+            while len(self._cache) > self._cache_size:
+                self._cache.popitem(last=False)
+        return packed
+
+
+def bitmap_contains(bitmap: np.ndarray, ids: np.ndarray) -> np.ndarray:
+    """Vectorized membership test of ids in a packed bitmap (ids past its end are not members)."""
+    ids = np.asarray(ids, dtype=np.int64)
+    inside = (ids >= 0) & (ids < len(bitmap) * 8)
+    out = np.zeros(len(ids), dtype=bool)
+    safe = ids[inside]
+    out[inside] = (bitmap[safe >> 3] >> (safe & 7)) & 1 == 1
+    return out
+
+
+def id_selector(bitmap: np.ndarray):
+    """FAISS selector over a packed bitmap. The caller must keep `bitmap` alive during the search."""
+    return faiss.IDSelectorBitmap(len(bitmap) * 8, faiss.swig_ptr(bitmap))
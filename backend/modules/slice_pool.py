@@ -0,0 +1,180 @@
+"""
+Parallel repository slicing.
+Reading and chunking files is CPU-bound Python (regex extraction), so for large
+repos the files are fanned out over a process pool in fixed-size work units.
+Results come back in walk order, so the output is identical to sequential
+slicing, and every file gets a time budget: a file whose semantic chunking
+overruns it is chunked by lines instead, so one pathological file can't stall
+indexing.
+"""
+import multiprocessing
+import os
+import signal
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeout
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from backend.config import SLICE_WORKERS, SLICE_PARALLEL_MIN_FILES, SLICE_UNIT_FILES, SLICE_FILE_TIMEOUT
+from backend.modules.file_view import FileView
+from backend.modules.parser import file_chunks
+
+# Per-file result: (chunks or None if unreadable, "ok" / "timeout" / "error", seconds spent, sizing counters)
+FileResult = Tuple[Optional[List[Dict]], str, float, Dict]
+# Counters of parser.fit_chunks summed over files into the stats of iter_file_chunks
+SIZING_KEYS = ("raw_chunks", "oversized", "split_pieces", "merged", "truncated", "tokens")
+
+
+class _FileTimeout(Exception):
+    pass
+
+
+def _on_alarm(signum, frame):
+    raise _FileTimeout()
+
+
+def resolve_slice_workers() -> int:
+    """Number of slicing processes: SLICE_WORKERS, or (0 = auto) one per CPU core."""
+    if SLICE_WORKERS > 0:
+        return SLICE_WORKERS
+    return max(1, os.cpu_count() or 1)
+
+
+def _line_chunks(path: str, sizing: Dict) -> Optional[List[Dict]]:
+    try:
+        return file_chunks(Path(path), use_semantic=False, stats=sizing)
+    except OSError:
+        return None
+
+
+def chunk_file(path: str, use_semantic: bool = True, timeout: float = SLICE_FILE_TIMEOUT) -> FileResult:
+    """
+    Chunk one file, falling back to line chunks if semantic chunking takes longer than `timeout`.
+    The limit is enforced with SIGALRM, i.e. only on POSIX and in a main thread (always the case
+    in pool workers); elsewhere the pool's per-unit deadline is the only limit.
+    """
+    start = time.perf_counter()
+    sizing: Dict = {}
+    try:
+        view = FileView.read(path)
+    except OSError:
+        return None, "error", time.perf_counter() - start, sizing
+    use_alarm = (timeout > 0 and hasattr(signal, "setitimer")
+                 and threading.current_thread() is threading.main_thread())
+    if use_alarm:
+        previous = signal.signal(signal.SIGALRM, _on_alarm)
+        signal.setitimer(signal.ITIMER_REAL, timeout)
+    try:
+        chunks, status = file_chunks(view, use_semantic, stats=sizing), "ok"
+    except _FileTimeout:
+        chunks, status = None, "timeout"
+    finally:
+        if use_alarm:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+            signal.signal(signal.SIGALRM, previous)
+    if status == "timeout":
+        sizing = {}
+        chunks = file_chunks(view, use_semantic=False, stats=sizing)
+    return chunks, status, time.perf_counter() - start, sizing
+
+
+def _chunk_unit(paths: List[str], use_semantic: bool, timeout: float) -> List[FileResult]:
+    """Worker entry point: chunk a unit of files."""
+    return [chunk_file(path, use_semantic, timeout) for path in paths]
+
+
+def _iter_sequential(files: List[Path], use_semantic: bool, timeout: float) -> Iterator[Tuple[Path, FileResult]]:
+    for path in files:
+        yield path, chunk_file(str(path), use_semantic, timeout)
+
+
+def _iter_parallel(files: List[Path], use_semantic: bool, workers: int, timeout: float,
+                   unit_size: int) -> Iterator[Tuple[Path, FileResult]]:
+    units = [files[start:start + unit_size] for start in range(0, len(files), unit_size)]
+    # Spawned like the encoding pool's workers: forking a process with model/request threads isn't safe
+    executor = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+    pending = deque()
+    next_unit = 0
+    stuck = False
+    try:
+        while units[next_unit:] or pending:
+            # A bounded window of units in flight: memory stays flat and results are consumed in order
+            while next_unit < len(units) and len(pending) < workers * 4:
+                unit = units[next_unit]
+                pending.append((unit, executor.submit(_chunk_unit, [str(p) for p in unit], use_semantic, timeout)))
+                next_unit += 1
+            unit, future = pending.popleft()
+            try:
+                # Backstop for hangs the in-worker alarm can't interrupt (e.g. inside a C extension)
+                results = future.result(timeout=timeout * len(unit) + 60 if timeout > 0 else None)
+            except FutureTimeout:
+                stuck = True
+                print(f"[slice_pool] Unit of {len(unit)} files timed out, chunking it by lines")
+                results = []
+                for p in unit:
+                    sizing: Dict = {}
+                    results.append((_line_chunks(str(p), sizing), "timeout", 0.0, sizing))
+            except Exception as e:
+                # Broken pool (a worker died): finish this unit in-process
+                print(f"[slice_pool] Worker failed ({e}), chunking {len(unit)} files in-process")
+                results = _chunk_unit([str(p) for p in unit], use_semantic, timeout)
+            yield from zip(unit, results)
+    finally:
+        executor.shutdown(wait=not stuck, cancel_futures=True)
+        if stuck:
+            # A hung worker would otherwise keep running after the executor is gone
+            for process in list((getattr(executor, "_processes", None) or {}).values()):
+                process.terminate()
+
+
+def iter_file_chunks(files: Iterable[Path], use_semantic: bool = True, workers: Optional[int] = None,
+                     stats: Optional[Dict] = None, timeout: float = SLICE_FILE_TIMEOUT,
+                     unit_size: int = SLICE_UNIT_FILES) -> Iterator[Tuple[Path, Optional[List[Dict]]]]:
+    """
+    Chunk files, yielding (path, chunks) in input order (chunks is None for unreadable files).
+
+    Args:
+        files: Files to chunk
+        use_semantic: Semantic (function/class) chunking, else line-based
+        workers: Worker processes (None = resolve_slice_workers, used for SLICE_PARALLEL_MIN_FILES+ files;
+                 1 = in-process)
+        stats: Optional dict updated in place with workers, errors, timeouts, chunk_seconds (time the
+               caller waited for chunks), chunk_cpu_seconds (time spent chunking, summed over files)
+               and the token sizing counters of parser.fit_chunks (SIZING_KEYS)
+        timeout: Per-file semantic chunking budget in seconds (0 = no limit)
+        unit_size: Files per work unit
+    """
+    files = list(files)
+    if workers is None:
+        workers = resolve_slice_workers() if len(files) >= SLICE_PARALLEL_MIN_FILES else 1
+    workers = max(1, min(workers, -(-len(files) // max(1, unit_size))))
+    stats = stats if stats is not None else {}
+    stats.update(workers=workers, errors=0, timeouts=0, chunk_seconds=0.0, chunk_cpu_seconds=0.0)
+    stats.update({key: 0 for key in SIZING_KEYS})
+
+    if workers > 1:
+        results = _iter_parallel(files, use_semantic, workers, timeout, max(1, unit_size))
+    else:
+        results = _iter_sequential(files, use_semantic, timeout)
+    waited = 0.0
+    resumed = time.perf_counter()
+    try:
+        for path, (chunks, status, seconds, sizing) in results:
+            if status == "timeout":
+                stats["timeouts"] += 1
+                print(f"[slice_pool] Semantic chunking of {path} exceeded {timeout}s, used line chunks")
+            if chunks is None:
+                stats["errors"] += 1
+            stats["chunk_cpu_seconds"] += seconds
+            for key in SIZING_KEYS:
+                stats[key] += sizing.get(key, 0)
+            waited += time.perf_counter() - resumed
+            yield path, chunks
+            resumed = time.perf_counter()
+        waited += time.perf_counter() - resumed
+    finally:
+        results.close()
+        stats["chunk_seconds"] = round(waited, 3)
+        stats["chunk_cpu_seconds"] = round(stats["chunk_cpu_seconds"], 3)
@@ -0,0 +1,153 @@
+"""
+Snippet storage for index metadata.
+Chunks can keep their snippet inline, or store only file/line range + content hash
+and have the text read back for the results a query actually returns - from the
+working tree, or from a packed blob file for cloned/uploaded repos.
+"""
+import hashlib
+import os
+import threading
+import zlib
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+SNIPPET_INLINE = "inline"
+SNIPPET_SOURCE = "source"
+SNIPPET_PACKED = "packed"
+SNIPPET_MODES = (SNIPPET_INLINE, SNIPPET_SOURCE, SNIPPET_PACKED)
+
+
+def snippet_hash(text: str) -> str:
+    """Short content hash used to detect ranges that no longer match the indexed text."""
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()[:16]
+
+
+def read_line_range(lines: List[str], start: int, end: int) -> str:
+    """Join lines start..end (1-based, inclusive) exactly the way the parser builds snippets."""
+    return "\n".join(lines[start - 1:end])
+
+
+def read_source_lines(file_path: str) -> Optional[List[str]]:
+    """Read a source file the same way the parser does (None if it's gone)."""
+    try:
+        return Path(file_path).read_text(encoding="utf-8", errors="ignore").splitlines()
+    except (FileNotFoundError, NotADirectoryError, PermissionError):
+        return None
+
+
+class PackedSnippetStore:
+    """
+    Append-only file of zlib-compressed snippets, addressed by (offset, length).
+    Rewritten on full rebuilds; removed chunks just leave dead bytes until then.
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        self._pending: List[bytes] = []
+        self._size = self.path.stat().st_size if self.path.exists() else 0
+
+    def append(self, text: str) -> Tuple[int, int]:
+        """Queue a snippet for writing; returns its (offset, length). Written by flush()."""
+        data = zlib.compress(text.encode("utf-8"))
+        with self._lock:
+            offset = self._size
+            self._pending.append(data)
+            self._size += len(data)
+        return offset, len(data)
+
+    def flush(self):
+        """Write queued snippets."""
+        with self._lock:
+            if not self._pending:
+                return
+            with open(self.path, "ab") as f:
+                f.write(b"".join(self._pending))
+                f.flush()
+                os.fsync(f.fileno())
+            self._pending = []
+
+    def read_many(self, locations: List[Tuple[int, int]]) -> List[Optional[str]]:
+        """Read snippets by (offset, length); unreadable entries come back as None."""
+        out: List[Optional[str]] = []
+        try:
+            with open(self.path, "rb") as f:
+                for offset, length in locations:
+                    try:
+                        f.seek(offset)
+                        out.append(zlib.decompress(f.read(length)).decode("utf-8"))
+                    except (zlib.error, UnicodeDecodeError):
+                        out.append(None)
+        except FileNotFoundError:
+            return [None] * len(locations)
+        return out
+
+    def clear(self):
+        """Drop all snippets (full rebuild)."""
+        with self._lock:
+            self._pending = []
+            self._size = 0
+            with open(self.path, "wb"):
+                pass
+
+    def size_bytes(self) -> int:
+        return self._size
+
+
+def strip_snippet(chunk: Dict, mode: str, pack: Optional[PackedSnippetStore] = None) -> Dict:
+    """
+    Build the stored form of a chunk for a snippet mode.
+    Non-inline modes keep file/start/end/type plus a content hash (and pack location).
+    """
+    if mode == SNIPPET_INLINE or "snippet" not in chunk:
+        return chunk
+    stored = {k: v for k, v in chunk.items() if k != "snippet"}
+    stored["hash"] = snippet_hash(chunk["snippet"])
+    if mode == SNIPPET_PACKED and pack is not None:
+        stored["blob"] = list(pack.append(chunk["snippet"]))
+    return stored
+
+
+def hydrate_snippets(chunks: List[Dict], pack: Optional[PackedSnippetStore] = None) -> List[Dict]:
+    """
+    Fill in "snippet" for chunks stored without one (in place).
+
+    Packed text is used when its hash matches; otherwise the line range is read
+    from the working tree. If the file changed since indexing, the current text
+    of the range is returned and the chunk is marked "stale".
+    """
+    missing = [c for c in chunks if "snippet" not in c]
+    if not missing:
+        return chunks
+
+    packed = [c for c in missing if c.get("blob") and pack is not None]
+    if packed:
+        texts = pack.read_many([tuple(c["blob"]) for c in packed])
+        for chunk, text in zip(packed, texts):
+            if text is not None and snippet_hash(text) == chunk.get("hash"):
+                chunk["snippet"] = text
+
+    # Group the rest by file so each file is read once
+    by_file: Dict[str, List[Dict]] = {}
+    for chunk in missing:
+        if "snippet" not in chunk:
+            by_file.setdefault(str(chunk.get("file")), []).append(chunk)
+    for file_path, file_chunks in by_file.items():
+        lines = read_source_lines(file_path)
+        for chunk in file_chunks:
+            if lines is None:
+                chunk["snippet"] = ""
+                chunk["stale"] = True
+                continue
+            text = read_line_range(lines, chunk["start"], chunk["end"])
+            chunk["snippet"] = text
+            if chunk.get("hash") and snippet_hash(text) != chunk["hash"]:
+                chunk["stale"] = True
+
+    for chunk in missing:
+        chunk.pop("blob", None)  # storage detail, not part of a search result
+
+    stale = sum(1 for c in missing if c.get("stale"))
+    if stale:
+        print(f"[snippet_store] {stale} of {len(missing)} snippets changed since indexing")
+    return chunks
@@ -0,0 +1,304 @@
+"""
+Tree-sitter chunker.
+Parses a file with its language's precompiled grammar (the tree-sitter-<language>
+wheels) and emits one chunk per function, class and method, each with the scope
+it is declared in. Code between definitions (imports, constants, fields) becomes
+"lines" chunks, and definitions longer than CHUNK_MAX_LINES are split at
+statement boundaries. Grammars are loaded once per process.
+"""
+import importlib
+import threading
+from typing import Dict, List, Optional, Tuple
+
+from backend.config import CHUNK_MAX_LINES
+from backend.modules.file_view import FileView
+
+try:
+    from tree_sitter import Language, Parser
+    TREE_SITTER_AVAILABLE = True
+except ImportError:
+    TREE_SITTER_AVAILABLE = False
+
+# Extension -> (grammar package, function returning its language)
+GRAMMARS = {
+    ".py": ("tree_sitter_python", "language"),
+    ".js": ("tree_sitter_javascript", "language"),
+    ".jsx": ("tree_sitter_javascript", "language"),
+    ".ts": ("tree_sitter_typescript", "language_typescript"),
+    ".tsx": ("tree_sitter_typescript", "language_tsx"),
+    ".go": ("tree_sitter_go", "language"),
+    ".java": ("tree_sitter_java", "language"),
+    ".rs": ("tree_sitter_rust", "language"),
+    ".cs": ("tree_sitter_c_sharp", "language"),
+    ".cpp": ("tree_sitter_cpp", "language"),
+    ".c": ("tree_sitter_c", "language"),
+}
+
+# Node types (across all grammars above) that become chunks
+FUNCTION_NODES = {
+    "function_definition",             # Python, C, C++
+    "function_declaration",            # JS/TS, Go
+    "generator_function_declaration",  # JS/TS
+    "method_definition",               # JS/TS
+    "method_declaration",              # Go, Java, C#
+    "constructor_declaration",         # Java, C#
+    "function_item",                   # Rust
+}
+CLASS_NODES = {
+    "class_definition",                # Python
+    "class_declaration",               # JS/TS, Java, C#
+    "abstract_class_declaration",      # TS
+    "interface_declaration",           # TS, Java, C#
+    "enum_declaration",                # TS, Java, C#
+    "record_declaration",              # Java, C#
+    "struct_declaration",              # C#
+    "type_declaration",                # Go
+    "struct_item", "enum_item", "trait_item", "impl_item",  # Rust
+    "class_specifier", "struct_specifier",                  # C++, C (only with a body)
+}
+# JS/TS `const f = () => {...}` / `const f = function () {...}`
+VARIABLE_DECLARATIONS = {"lexical_declaration", "variable_declaration"}
+FUNCTION_VALUES = {"arrow_function", "function_expression", "function", "generator_function"}
+# Innermost declarator node types that hold a C/C++ function's name
+DECLARATOR_NAMES = {"identifier", "field_identifier", "qualified_identifier", "destructor_name", "operator_name"}
+
+_languages: Dict[Tuple[str, str], Optional["Language"]] = {}
+_languages_lock = threading.Lock()
+# Parsers aren't thread-safe: one per thread and grammar
+_local = threading.local()
+
+
+def _load_language(ext: str) -> Optional["Language"]:
+    """The grammar for an extension, loaded once per process (None if it isn't installed)."""
+    spec = GRAMMARS.get(ext)
+    if spec is None or not TREE_SITTER_AVAILABLE:
+        return None
+    with _languages_lock:
+        if spec in _languages:
+            return _languages[spec]
+        module_name, function_name = spec
+        try:
+            language = Language(getattr(importlib.import_module(module_name), function_name)())
+        except (ImportError, AttributeError, TypeError, ValueError) as e:
+            print(f"[ts_chunker] Grammar {module_name} not available ({e}), using regex/line chunking")
+            language = None
+        _languages[spec] = language
+        return language
+
+
+def get_parser(ext: str) -> Optional["Parser"]:
+    """This thread's parser for a file extension (None if no grammar is available)."""
+    language = _load_language(ext)
+    if language is None:
+        return None
+    parsers = getattr(_local, "parsers", None)
+    if parsers is None:
+        parsers = _local.parsers = {}
+    parser = parsers.get(GRAMMARS[ext])
+    if parser is None:
+        parser = parsers[GRAMMARS[ext]] = Parser(language)
+    return parser
+
+
+def _text(node) -> Optional[str]:
+    return node.text.decode("utf-8", errors="ignore") if node is not None else None
+
+
+def _name(node) -> Optional[str]:
+    """Declared name of a definition node."""
+    name = node.child_by_field_name("name")
+    if name is not None:
+        return _text(name)
+    if node.type == "impl_item":
+        return _text(node.child_by_field_name("type"))
+    if node.type == "type_declaration":
+        for child in node.named_children:
+            if child.child_by_field_name("name") is not None:
+                return _text(child.child_by_field_name("name"))
+    declarator = node.child_by_field_name("declarator")
+    while declarator is not None and declarator.type not in DECLARATOR_NAMES:
+        declarator = declarator.child_by_field_name("declarator")
+    return _text(declarator)
+
+
+def _classify(node) -> Optional[Tuple[str, object, Optional[str]]]:
+    """(kind, definition node, name) if a node is a definition, else None. kind is "function" or "class"."""
+    if node.type == "decorated_definition":
+        inner = node.child_by_field_name("definition")
+        found = _classify(inner) if inner is not None else None
+        return (found[0], inner, found[2]) if found else None
+    if node.type in FUNCTION_NODES:
+        return "function", node, _name(node)
+    if node.type in CLASS_NODES:
+        if node.type in ("class_specifier", "struct_specifier") and node.child_by_field_name("body") is None:
+            return None
+        return "class", node, _name(node)
+    if node.type in VARIABLE_DECLARATIONS:
+        declarators = [c for c in node.named_children if c.type == "variable_declarator"]
+        if len(declarators) == 1:
+            value = declarators[0].child_by_field_name("value")
+            if value is not None and value.type in FUNCTION_VALUES:
+                return "function", value, _text(declarators[0].child_by_field_name("name"))
+    return None
+
+
+def _receiver(node) -> Optional[str]:
+    """Type a Go method is declared on."""
+    receiver = node.child_by_field_name("receiver")
+    if receiver is None:
+        return None
+    for param in receiver.named_children:
+        kind = param.child_by_field_name("type")
+        if kind is not None:
+            return _text(kind).lstrip("*")
+    return None
+
+
+def _leading_comments_start(node, lines: List[str]) -> int:
+    """First row of a definition including the comments (doc comments, decorators' notes) right above it."""
+    row = node.start_point[0]
+    sibling = node.prev_named_sibling
+    while (sibling is not None and "comment" in sibling.type and sibling.end_point[0] >= row - 1
+           and not lines[sibling.start_point[0]].encode("utf-8")[:sibling.start_point[1]].strip()):
+        row = sibling.start_point[0]
+        sibling = sibling.prev_named_sibling
+    return row
+
+
+def _split(start: int, end: int, breaks: List[int], max_lines: int) -> List[Tuple[int, int]]:
+    """Split start..end into ranges of at most max_lines, preferring to cut before a line in `breaks`."""
+    parts = []
+    while end - start + 1 > max_lines:
+        limit = start + max_lines  # the next part may start at most here
+        candidates = [b for b in breaks if start + max_lines // 2 < b <= limit]
+        cut = candidates[-1] if candidates else limit
+        parts.append((start, cut - 1))
+        start = cut
+    parts.append((start, end))
+    return parts
+
+
+def _statement_starts(node, max_depth: int = 4) -> List[int]:
+    """1-indexed lines where statements/members inside a definition's body begin (nested blocks included)."""
+    starts = set()
+    stack = [(node.child_by_field_name("body") or node, 0)]
+    while stack:
+        parent, depth = stack.pop()
+        for child in parent.named_children:
+            starts.add(child.start_point[0] + 1)
+            if depth < max_depth and child.end_point[0] > child.start_point[0]:
+                stack.append((child, depth + 1))
+    return sorted(starts)
+
+
+def _gap_breaks(lines: List[str], start: int, end: int) -> List[int]:
+    """Lines in start..end that follow a blank line (preferred cut points for top-level code)."""
+    return [i for i in range(start + 1, end + 1) if not lines[i - 2].strip()]
+
+
+def _assemble(spans: List[Tuple], lines: List[str], file_str: str, max_lines: int) -> List[Dict]:
+    """Turn definition spans into non-overlapping, size-capped chunks plus chunks for the code between them."""
+    spans.sort(key=lambda s: (s[0], -s[1]))
+    kept = []
+    skip_until = 0
+    for i, (start, end, kind, name, parent, breaks) in enumerate(spans):
+        if start <= skip_until:
+            continue  # inside a class that is kept whole
+        if kind == "class":
+            nested = spans[i + 1] if i + 1 < len(spans) and spans[i + 1][0] <= end else None
+            if nested is not None and nested[0] > start:
+                end = nested[0] - 1  # header: up to the first member
+            elif nested is not None:
+                skip_until = end  # a member starts on the class's first line: keep the class whole
+        kept.append((start, end, kind, name, parent, breaks))
+
+    # Code between definitions (imports, constants, fields, closing braces of long classes)
+    covered = [False] * (len(lines) + 2)
+    for start, end, *_ in kept:
+        for line in range(start, min(end, len(lines)) + 1):
+            covered[line] = True
+    line = 1
+    while line <= len(lines):
+        if covered[line]:
+            line += 1
+            continue
+        gap_start = line
+        while line <= len(lines) and not covered[line]:
+            line += 1
+        gap_end = line - 1
+        while gap_start <= gap_end and not lines[gap_start - 1].strip():
+            gap_start += 1
+        while gap_end >= gap_start and not lines[gap_end - 1].strip():
+            gap_end -= 1
+        if any(any(ch.isalnum() for ch in lines[i - 1]) for i in range(gap_start, gap_end + 1)):
+            kept.append((gap_start, gap_end, "lines", None, None, _gap_breaks(lines, gap_start, gap_end)))
+    kept.sort(key=lambda s: s[0])
+
+    chunks = []
+    for start, end, kind, name, parent, breaks in kept:
+        end = min(end, len(lines))
+        if end < start:
+            continue
+        if end - start + 1 > max_lines and not isinstance(breaks, list):
+            breaks = _statement_starts(breaks)  # only worked out for definitions that need splitting
+        parts = _split(start, end, breaks, max_lines)
+        for number, (part_start, part_end) in enumerate(parts, 1):
+            chunk = {
+                "file": file_str,
+                "start": part_start, "end": part_end,
+                "snippet": "\n".join(lines[part_start - 1:part_end]),
+                "type": kind
+            }
+            if kind != "lines":
+                chunk["name"] = name
+                chunk["parent"] = parent
+            if len(parts) > 1:
+                chunk["part"] = number
+            chunks.append(chunk)
+    return chunks
+
+
+def tree_sitter_chunks(view: FileView, max_lines: int = CHUNK_MAX_LINES) -> Optional[List[Dict]]:
+    """
+    Chunk a file along its syntax tree.
+
+    Returns:
+        Chunks ({file, start, end, snippet, type, name, parent[, part]}, type "function" / "method" /
+        "class" / "lines"), or None if no grammar is available for the file's extension
+    """
+    parser = get_parser(view.path.suffix.lower())
+    if parser is None:
+        return None
+    text = view.text
+    lines = view.lines
+    # Tree-sitter rows only break at "\n"; str.splitlines also breaks at \r, \f, \x1c... (rare)
+    if len(lines) != text.count("\n") + (0 if not text or text.endswith("\n") else 1):
+        return None
+    tree = parser.parse(text.encode("utf-8"))
+
+    # (start, end, type, name, parent scope, definition node - or, for gaps, preferred split lines)
+    spans: List[Tuple] = []
+    # Iterative walk (deeply nested expressions would overflow recursion); function bodies aren't entered
+    stack = [(tree.root_node, None, False)]
+    while stack:
+        node, scope, in_class = stack.pop()
+        for child in node.named_children:
+            found = _classify(child)
+            if found is None:
+                stack.append((child, scope, in_class))
+                continue
+            kind, definition, name = found
+            start, end = _leading_comments_start(child, lines) + 1, child.end_point[0] + 1
+            if child.end_point[1] == 0 and end > start:
+                end -= 1  # the node ends at the start of the next line
+            if kind == "function":
+                chunk_type, parent = ("method", scope) if in_class else ("function", scope)
+                if definition.type == "method_declaration" and definition.child_by_field_name("receiver") is not None:
+                    chunk_type, parent = "method", _receiver(definition)
+                spans.append((start, end, chunk_type, name, parent, definition))
+            else:
+                spans.append((start, end, "class", name, scope, definition))
+                body = definition.child_by_field_name("body") or definition
+                stack.append((body, f"{scope}.{name}" if scope and name else (name or scope), True))
+
+    return _assemble(spans, lines, str(view.path), max(1, max_lines))
@@ -1,12 +1,80 @@
-﻿import os, faiss, json
+﻿import os, faiss, json, shutil
+import hashlib
+import threading
+import time
+import weakref
+from contextlib import nullcontext
 import numpy as np
-from sentence_transformers import SentenceTransformer
 from pathlib import Path
-from typing import Dict
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Set
+from backend.modules.model_registry import get_embedding_model
+from backend.modules.cache import get_chunk_embedding_store, get_query_embedding_cache
+from backend.modules.chunk_store import SqliteChunkStore, MemoryChunkStore
+from backend.modules.snippet_store import (
+    SNIPPET_INLINE, SNIPPET_PACKED, SNIPPET_MODES,
+    PackedSnippetStore, strip_snippet, hydrate_snippets
+)
+from backend.modules.index_segments import (
+    DeltaSegment, save_npy_atomic, save_json_atomic, exact_search, rerank_candidates, merge_topk
+)
+from backend.modules.index_generations import (
+    CURRENT_FILE, GenerationConflict, read_current, current_pointer, current_generation, next_generation,
+    publish, publish_lock, pin, unpin, collect_garbage, fsync_file
+)
+from backend.modules.search_filters import SearchFilter, FilterIndex, bitmap_contains, id_selector
+from backend.modules.encoding_pool import EncodingPool
+from backend.modules.index_build import STAGING_DIR, VectorSpool, batched
+from backend.modules.index_manifest import file_record
+from backend.modules.index_factory import (
+    INDEX_FLAT, INDEX_HNSW, INDEX_IVF, INDEX_TYPES, COMPRESSION_NONE,
+    choose_index_type, create_index, train_sample_size, supports_remove, search_params,
+    effective_compression, mmap_io_flags
+)
+from backend.config import (
+    EMBEDDING_MODEL, EMBEDDING_BACKEND, EMBEDDING_ONNX_QUANTIZE, EMBEDDING_STORE_DTYPE, INDEX_TOMBSTONE_REBUILD_RATIO,
+    INDEX_COMPRESSION, INDEX_COMPRESSION_IN_MEMORY, INDEX_RERANK_FACTOR, CHUNK_SNIPPET_STORAGE,
+    INDEX_SEGMENT_MAX_DELTAS, INDEX_SEGMENT_MAX_DELTA_RATIO, INDEX_BACKGROUND_COMPACTION,
+    INDEX_KEEP_GENERATIONS, INDEX_MMAP, INDEX_BUILD_BATCH_SIZE
+)
 
 # Global registry for in-memory stores (used when privacy mode is enabled)
 _in_memory_stores: Dict[str, 'FaissStore'] = {}
 
+# In-process index generation counters, bumped on every write.
+# Lets the index cache detect local writes without touching disk.
+_index_generations: Dict[str, int] = {}
+_generation_lock = threading.Lock()
+# One writer per index at a time in this process (see writer_lock)
+_writer_locks: Dict[str, threading.RLock] = {}
+
+
+def index_key(repo_id: str, base_dir: str) -> str:
+    """Stable key for a repo's index (base_dir + repo_id)."""
+    return str((Path(base_dir) / repo_id).resolve())
+
+
+def get_index_generation(key: str) -> int:
+    """Get the current in-process generation for an index key."""
+    return _index_generations.get(key, 0)
+
+
+def bump_index_generation(key: str) -> int:
+    """Mark an index as changed. Returns the new generation."""
+    with _generation_lock:
+        _index_generations[key] = _index_generations.get(key, 0) + 1
+        return _index_generations[key]
+
+
+def writer_lock(key: str) -> threading.RLock:
+    """
+    Lock serializing the writers of an index in this process (re-entrant).
+    Every FaissStore write method holds it; a caller that loads a private store to write
+    should hold it from load() through the write, so it never edits a stale generation.
+    """
+    with _generation_lock:
+        return _writer_locks.setdefault(key, threading.RLock())
+
+
 class FaissStore:
     # def __init__(self, repo_id: str, base_dir="data/index"):
     #     self.repo_id = repo_id
@@ -17,141 +85,1242 @@ class FaissStore:
     #     self.model = SentenceTransformer("bge-m3")  # 中文英文都稳
     #     self.index = None
     #     self.metas = []
-    def __init__(self, repo_id: str, base_dir: str = "data/index", in_memory: bool = False):
+    def __init__(self, repo_id: str, base_dir: str = "data/index", in_memory: bool = False,
+                 model_name: Optional[str] = None, device: Optional[str] = None,
+                 compression: Optional[str] = None, snippet_storage: Optional[str] = None):
         """
         repo_id  : 用仓库名当索引子目录（例如 'my-portfolio'）
         base_dir : 索引根目录（默认 data/index），app.py 会传入 f"{DATA_DIR}/index"
         in_memory: If True, store in RAM only (no disk writes). Used for privacy mode.
+        model_name/device: Embedding model override (defaults to EMBEDDING_MODEL / EMBEDDING_DEVICE)
+        compression: Vector compression for (re)builds: "none", "fp16", "sq8", "pq"
+                     (defaults to INDEX_COMPRESSION / INDEX_COMPRESSION_IN_MEMORY)
+        snippet_storage: "inline", "source" or "packed" (defaults to CHUNK_SNIPPET_STORAGE)
         """
         self.repo_id = repo_id
         self.in_memory = in_memory
+        if compression is None:
+            compression = INDEX_COMPRESSION_IN_MEMORY if in_memory else INDEX_COMPRESSION
+        self.compression = compression
+        snippet_storage = snippet_storage or CHUNK_SNIPPET_STORAGE
+        if snippet_storage not in SNIPPET_MODES or (in_memory and snippet_storage == SNIPPET_PACKED):
+            # Packed blobs need disk; in-memory stores keep text inline instead
+            snippet_storage = SNIPPET_INLINE
+        self.snippet_storage = snippet_storage
+        self.model_name = model_name
+        self.device = device
+        self.key = index_key(repo_id, base_dir)
         
         if not in_memory:
             # Disk-based storage
             self.base = Path(base_dir) / repo_id
             self.base.mkdir(parents=True, exist_ok=True)
-            self.meta_path = self.base / "meta.json"
+            self.meta_path = self.base / "meta.json"  # legacy metadata, imported into chunks.db on load
+            self.chunks_path = self.base / "chunks.db"
+            # Files of the generation in use. These are the pre-generation names; load()/save()
+            # point them at the versioned, never-rewritten files listed in generations/gen-N.json
+            self.pack_path = self.base / "snippets.pack"
             self.index_path = self.base / "faiss.index"
+            # Raw embedding matrix + row-aligned chunk ids (memory-mapped on load)
+            self.embeddings_path = self.base / "embeddings.npy"
+            self.embedding_ids_path = self.base / "embedding_ids.npy"
+            # Summary of the current generation (index type, params, recall/latency) for listing tools
+            self.info_path = self.base / "index_info.json"
+            # Append-only delta segments + tombstones written between compactions
+            self.segment_dir = self.base / "segments"
+            self.manifest_path = self.base / "segments.json"
+            self.tombstones_path = self.base / "tombstones.npy"
         else:
             # In-memory storage (no disk paths)
             self.base = None
             self.meta_path = None
+            self.chunks_path = None
+            self.pack_path = None
             self.index_path = None
+            self.embeddings_path = None
+            self.embedding_ids_path = None
+            self.info_path = None
+            self.segment_dir = None
+            self.manifest_path = None
+            self.tombstones_path = None
             # Register in global registry
             _in_memory_stores[repo_id] = self
 
-        # 向量模型（中英都稳），用于把代码片段编码成向量
-        self.model = SentenceTransformer(r"C:\Users\57811\models\all-MiniLM-L6-v2")
-        #self.model = SentenceTransformer("bge-m3")
-        #self.model = SentenceTransformer("sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2")
+        self.index = None
+        self._chunks = None  # chunk id -> metadata (SQLite on disk, dict for in-memory), opened lazily
+        self._pack = None    # packed snippet blobs (snippet_storage == "packed")
+        self.next_id = 0
+        # Persisted raw vectors, so rebuilds/fallbacks never need the encoder
+        self.embeddings: Optional[np.ndarray] = None      # n x d (EMBEDDING_STORE_DTYPE)
+        self.embedding_ids: Optional[np.ndarray] = None   # n chunk ids, aligned with rows
+        self._embedding_rows: Optional[Dict[int, int]] = None
+        self.index_info: Dict = {}
+        # LSM layout: immutable base index + delta segments + tombstoned ids
+        self.deltas: List[DeltaSegment] = []
+        self.tombstones: Set[int] = set()
+        self._segment_seq = 0
+        self._delta_matrix = None
+        self._base_dirty = False
+        self._lock = threading.RLock()          # writers + compaction swap
+        self._compact_lock = threading.Lock()   # one compaction at a time
+        self._writer = writer_lock(self.key)    # shared by every store object of this index (taken first)
+        # Published generation this store reads (pinned so it isn't garbage-collected)
+        self.generation: Optional[int] = None
+        self._unpin = None
+        # Tombstones as of that generation (the rest are this store's unpublished deletes)
+        self._saved_tombstones: Set[int] = set()
+        # Finished streaming build waiting for save(): its staging dir, and that it replaces the current generation
+        self._staged: Optional[Path] = None
+        self._replacing = False
+        # Base index codes are memory-mapped from its file (shared page cache, not private RAM)
+        self.index_mmapped = False
+        # Bitmaps for filtered search, built on the first filtered query
+        self._filter_index: Optional[FilterIndex] = None
+        # Throughput of the last encode / build (reported by /index_repo)
+        self.last_encode_stats: Dict = {}
+        self.last_build_stats: Dict = {}
+
+    @property
+    def chunks(self):
+        """Chunk metadata store, keyed by vector id."""
+        if self._chunks is None:
+            self._chunks = MemoryChunkStore() if self.in_memory else SqliteChunkStore(self.chunks_path)
+        return self._chunks
+
+    @property
+    def pack(self) -> Optional[PackedSnippetStore]:
+        """Packed snippet file, if this repo has (or is about to get) one."""
+        if self._pack is None and self.pack_path is not None:
+            if self.snippet_storage == SNIPPET_PACKED or self.pack_path.exists():
+                self._pack = PackedSnippetStore(self.pack_path)
+        return self._pack
+
+    @property
+    def model(self):
+        """
+        向量模型（中英都稳），用于把代码片段编码成向量.
+        Shared process-wide via the model registry, so creating a store is cheap.
+        """
+        return get_embedding_model(self.model_name, self.device)
+
+    def _encode(self, texts) -> np.ndarray:
+        """Encode texts into normalized float32 vectors (shape: n x d)."""
+        if not texts:
+            return np.zeros((0, self.dimension), dtype=np.float32)
+        embeds = self.model.encode(list(texts), normalize_embeddings=True)
+        return np.asarray(embeds, dtype=np.float32)
+
+    @property
+    def model_fingerprint(self) -> str:
+        """Identifies the vector space (model + dimension + normalization) for cached embeddings."""
+        key = f"{self.model_name or EMBEDDING_MODEL}|{self.dimension}|normalized"
+        if EMBEDDING_BACKEND == "onnx" and EMBEDDING_ONNX_QUANTIZE:
+            # int8 weights give slightly different vectors; fp32 ONNX shares the torch cache entries
+            key += "|int8"
+        return hashlib.sha1(key.encode("utf-8")).hexdigest()[:16]
+
+    def _encode_chunks(self, texts, encoder: Optional[EncodingPool] = None) -> np.ndarray:
+        """
+        Encode chunk snippets, reusing content-addressed cached vectors where possible.
+        Only snippets whose text was never embedded with this model go through the encoder
+        (`encoder`, or a one-off EncodingPool).
+        """
+        texts = list(texts)
+        store = get_chunk_embedding_store()
+        self.last_encode_stats = {"chunks": len(texts), "cached": 0, "encoded": len(texts), "seconds": 0.0, "workers": 0}
+        if store is None or not texts:
+            return self._encode_bulk(texts, encoder)
         
+        fingerprint, d = self.model_fingerprint, self.dimension
+        found = store.get_many(fingerprint, d, texts)
+        embeds = np.zeros((len(texts), d), dtype=np.float32)
+        
+        # Encode each missing unique text once
+        missing: Dict[str, List[int]] = {}
+        for i, (text, vec) in enumerate(zip(texts, found)):
+            if vec is None:
+                missing.setdefault(text, []).append(i)
+            else:
+                embeds[i] = vec
+        if missing:
+            unique_texts = list(missing.keys())
+            new_embeds = self._encode_bulk(unique_texts, encoder)
+            for text, vec in zip(unique_texts, new_embeds):
+                embeds[missing[text]] = vec
+            store.put_many(fingerprint, d, unique_texts, new_embeds)
+        
+        cached = len(texts) - sum(len(v) for v in missing.values())
+        self.last_encode_stats.update(cached=cached, encoded=len(missing))
+        print(f"[vector_store] Embeddings: {cached} cached, {len(missing)} encoded")
+        return embeds
 
-        self.index = None
-        self.metas = []
+    def _encode_bulk(self, texts, encoder: Optional[EncodingPool] = None) -> np.ndarray:
+        """Encode many snippets (indexing path): length-sorted batches, multi-process for large inputs."""
+        if not texts:
+            return self._encode(texts)
+        pool = encoder or EncodingPool(self.model)
+        embeds = pool.encode(texts)
+        self.last_encode_stats.update(seconds=pool.stats["seconds"], workers=pool.stats["workers"])
+        return embeds
+
+    @property
+    def dimension(self) -> int:
+        """Embedding dimension (from the loaded index if any, otherwise from the model)."""
+        if self.index is not None:
+            return self.index.d
+        return self.model.get_sentence_embedding_dimension()
+
+    def _new_index(self, d: int):
+        """Create an empty ID-mapped index (ids are stable per chunk, so deletes don't shift anything)."""
+        return faiss.IndexIDMap2(faiss.IndexFlatIP(d))  # 点积=余弦（归一化后）
+
+    @property
+    def index_type(self) -> str:
+        return self.index_info.get("type", INDEX_FLAT)
+
+    @property
+    def index_compression(self) -> str:
+        """Compression of the built index (may differ from self.compression until the next rebuild)."""
+        return self.index_info.get("compression", COMPRESSION_NONE)
+
+    @property
+    def keeps_vectors(self) -> bool:
+        """
+        Whether raw vectors are kept next to the base index.
+        Compressed in-memory stores drop them - keeping float32 copies in RAM would undo the compression.
+        """
+        return not (self.in_memory and self.index_compression != COMPRESSION_NONE)
+
+    @property
+    def tombstone_count(self) -> int:
+        """Deleted chunk ids whose vectors are still in the base index or a delta segment."""
+        return len(self.tombstones)
+
+    @property
+    def delta_count(self) -> int:
+        """Vectors held in delta segments (not yet compacted into the base index)."""
+        return sum(len(s) for s in self.deltas)
+
+    def _create_index(self, vectors: np.ndarray, ids: np.ndarray, kind: Optional[str] = None,
+                      block_size: int = 65536):
+        """
+        Create an index of the right type for this corpus and add the vectors blockwise.
+        Approximate/compressed indexes get their recall/latency measured.
+        Doesn't touch the store, so compaction can run it in the background.
+        
+        Returns:
+            Tuple of (index, index_info)
+        """
+        n, d = len(ids), vectors.shape[1]
+        kind = kind or choose_index_type(n)
+        if kind == INDEX_IVF and n < 39:
+            # Too few vectors to train centroids
+            kind = INDEX_FLAT
+        compression = effective_compression(self.compression, n)
+        
+        sample = None
+        sample_size = train_sample_size(kind, n, compression)
+        if sample_size:
+            rows = np.sort(np.random.default_rng(0).choice(n, sample_size, replace=False))
+            sample = np.asarray(vectors[rows], dtype=np.float32)
+        
+        index, params = create_index(kind, d, n, sample, compression=compression)
+        for start in range(0, n, block_size):
+            block = np.ascontiguousarray(vectors[start:start + block_size], dtype=np.float32)
+            index.add_with_ids(block, np.asarray(ids[start:start + block_size], dtype=np.int64))
+        
+        # "model" tells incremental re-indexing whether new vectors can be added to this index
+        info = {"type": kind, "compression": compression, "params": params, "built_at": time.time(),
+                "model": self.model_fingerprint}
+        if kind != INDEX_FLAT or compression != COMPRESSION_NONE:
+            rerank = compression != COMPRESSION_NONE and INDEX_RERANK_FACTOR > 0 and not self.in_memory
+            info.update(self._evaluate_index(index, vectors, ids, rerank=rerank))
+            print(f"[vector_store] {kind}/{compression} index for {self.repo_id}: "
+                  f"recall@10={info['recall_at_10']}, {info['avg_query_ms']}ms/query")
+        return index, info
+
+    def _build_index(self, vectors: np.ndarray, ids: np.ndarray, kind: Optional[str] = None):
+        """Create the base index from vectors (see _create_index) and install it."""
+        self.index, self.index_info = self._create_index(vectors, ids, kind=kind)
+        self.index_mmapped = False
+        self._base_dirty = True
+        if not self.keeps_vectors:
+            self.embeddings = None
+            self.embedding_ids = None
+            self._embedding_rows = None
+
+    def _evaluate_index(self, index, vectors: np.ndarray, ids: np.ndarray, rerank: bool = False,
+                        k: int = 10, n_queries: int = 100) -> Dict:
+        """Measure recall@k vs exact search and per-query latency, using stored vectors as probe queries."""
+        n = len(ids)
+        if n == 0:
+            return {"recall_at_10": None, "avg_query_ms": None, "eval_queries": 0}
+        rows = np.sort(np.random.default_rng(1).choice(n, min(n_queries, n), replace=False))
+        queries = np.asarray(vectors[rows], dtype=np.float32)
+        _, exact = exact_search(vectors, ids, queries, k)
+        id_rows = {int(chunk_id): row for row, chunk_id in enumerate(ids)} if rerank else None
+        
+        # Re-ranking is included, just like in queries
+        start = time.time()
+        approx = []
+        for q in queries:
+            _, I = index.search(q[None, :], k * INDEX_RERANK_FACTOR if rerank else k)
+            if rerank:
+                _, I = rerank_candidates(q[None, :], I, k, vectors, id_rows)
+            approx.append(I[0])
+        elapsed_ms = (time.time() - start) * 1000
+        
+        recall = np.mean([
+            len(set(a[a >= 0]) & set(e[e >= 0])) / max(1, len(e[e >= 0]))
+            for a, e in zip(approx, exact)
+        ])
+        return {
+            "recall_at_10": round(float(recall), 4),
+            "avg_query_ms": round(elapsed_ms / len(queries), 3),
+            "eval_queries": len(queries)
+        }
+
+    def _register_metas(self, chunks, ids):
+        """Attach ids to chunk metadata and insert it (snippet stored per snippet_storage) into the chunk store."""
+        for chunk, chunk_id in zip(chunks, ids):
+            chunk["id"] = int(chunk_id)
+        self.chunks.insert_many(strip_snippet(c, self.snippet_storage, self.pack) for c in chunks)
+        self._filter_index = None
+        if len(ids):
+            self.next_id = max(self.next_id, int(max(ids)) + 1)
+
+    def _next_segment_name(self) -> str:
+        self._segment_seq += 1
+        return f"seg-{self._segment_seq:06d}"
+
+    def get_embeddings(self, ids) -> np.ndarray:
+        """Get stored float32 vectors for chunk ids (base matrix or delta segments; no encoding)."""
+        rows = self._rows()
+        out = []
+        for chunk_id in ids:
+            chunk_id = int(chunk_id)
+            if chunk_id in rows:
+                out.append(np.asarray(self.embeddings[rows[chunk_id]], dtype=np.float32))
+                continue
+            for segment in self.deltas:
+                hit = np.flatnonzero(segment.ids == chunk_id)
+                if len(hit):
+                    out.append(np.asarray(segment.vectors[hit[0]], dtype=np.float32))
+                    break
+            else:
+                raise KeyError(chunk_id)
+        return np.stack(out) if out else np.zeros((0, self.dimension), dtype=np.float32)
+
+    def _rows(self) -> Dict[int, int]:
+        """Chunk id -> row in the base embedding matrix."""
+        if self._embedding_rows is None:
+            ids = self.embedding_ids if self.embedding_ids is not None else []
+            self._embedding_rows = {int(chunk_id): row for row, chunk_id in enumerate(ids)}
+        return self._embedding_rows
+
+    def rebuild_index(self, kind: Optional[str] = None):
+        """
+        Rebuild the base FAISS index from the persisted base embeddings (no re-encoding). Caller saves.
+        
+        Args:
+            kind: Index type to build ("flat", "hnsw", "ivf"); defaults to automatic selection
+        """
+        if self.embeddings is None:
+            raise ValueError(f"No stored embeddings for {self.repo_id}; re-index the repository")
+        self._build_index(self.embeddings, self.embedding_ids, kind=kind)
+        print(f"[vector_store] Rebuilt index for {self.repo_id} from {len(self.embeddings)} stored vectors")
+
+    def brute_force_search(self, embs: np.ndarray, k: int, block_size: int = 65536,
+                           bitmap: Optional[np.ndarray] = None):
+        """
+        Exact inner-product search over the stored base embeddings (fallback when no FAISS index is usable).
+        Returns (D, I) shaped like faiss search results.
+        """
+        vectors, ids = self.embeddings, self.embedding_ids
+        if bitmap is not None and ids is not None:
+            keep = bitmap_contains(bitmap, ids)
+            vectors, ids = vectors[keep], ids[keep]
+        return exact_search(vectors, ids, embs, k, block_size=block_size)
+
+    def filter_index(self) -> FilterIndex:
+        """Bitmaps over chunk ids for filtered search (rebuilt after the chunk set changes)."""
+        filter_index = self._filter_index
+        if filter_index is None:
+            filter_index = FilterIndex(self.chunks.filter_rows())
+            self._filter_index = filter_index
+        return filter_index
 
     def build(self, chunks):
-        embeds = self.model.encode([c["snippet"] for c in chunks], normalize_embeddings=True)
-        d = embeds.shape[1]
-        self.index = faiss.IndexFlatIP(d)  # 点积=余弦（归一化后）
-        self.index.add(embeds.astype(np.float32))
-        self.metas = chunks
-        
-        # Only write to disk if not in-memory mode
-        if not self.in_memory:
-            faiss.write_index(self.index, str(self.index_path))
-            with open(self.meta_path, "w", encoding="utf-8") as f:
-                json.dump(self.metas, f, ensure_ascii=False)
+        """Build a fresh index from a list (or any iterable) of chunks. See iter_build."""
+        return self.build_stream(chunks)
+
+    def build_stream(self, chunks: Iterable[Dict], batch_size: Optional[int] = None,
+                     progress: Optional[Callable[[Dict], None]] = None) -> Dict:
+        """
+        Build a fresh index from a chunk iterator with bounded memory (see iter_build).
+
+        Args:
+            chunks: Chunks, e.g. parser.iter_repo_chunks(repo_dir)
+            batch_size: Chunks per step (defaults to INDEX_BUILD_BATCH_SIZE)
+            progress: Called with every progress event (raising from it abandons the build)
+
+        Returns:
+            Build stats (also kept in self.last_build_stats)
+        """
+        build = self.iter_build(chunks, batch_size)
+        try:
+            for event in build:
+                if progress is not None:
+                    progress(event)
+        finally:
+            # A progress callback that raises (e.g. a cancelled job) discards the build right away
+            build.close()
+        return self.last_build_stats
+
+    def iter_build(self, chunks: Iterable[Dict], batch_size: Optional[int] = None) -> Iterator[Dict]:
+        """
+        Streaming build: read chunks -> embed in fixed-size batches -> append -> index -> publish.
+
+        Each batch is encoded, its metadata written to a staging chunk store (and pack) and its
+        vectors appended to an on-disk spool, so only one batch of snippets/vectors is held at a
+        time. The base index is then built from the memory-mapped matrix and swapped in; queries
+        keep using the previous generation until then.
+
+        Yields progress events: {"stage": "embedding", "files", "chunks", "cached", "encoded",
+        "elapsed", "chunks_per_second"} after every batch, {"stage": "indexing", "chunks"} and
+        finally {"stage": "done", **last_build_stats}. The index is published when the
+        generator is exhausted; closing it early discards the build.
+        """
+        start = time.time()
+        batch_size = max(1, batch_size or INDEX_BUILD_BATCH_SIZE)
+        with self._lock:
+            # Ids continue after the previous build's, so a stale vector id never maps onto a different chunk
+            if self._chunks is not None:
+                self.next_id = max(self.next_id, self.chunks.max_id() + 1)
+            next_id = self.next_id
+
+        staging = None
+        if self.in_memory:
+            chunk_store, pack = MemoryChunkStore(), None
+            spool = VectorSpool(self.dimension, EMBEDDING_STORE_DTYPE)
         else:
-            print(f"[vector_store] Index built in-memory for {self.repo_id} ({len(chunks)} chunks)")
-    
-    def add_chunks(self, chunks):
-        """Add new chunks to existing index (incremental update)."""
+            # Written outside the generation file names, so a concurrent save's GC never sees it half-built
+            staging = self.base / STAGING_DIR / f"build-{os.getpid()}-{threading.get_ident()}-{int(start * 1000)}"
+            staging.mkdir(parents=True, exist_ok=True)
+            chunk_store = SqliteChunkStore(staging / "chunks.db")
+            pack = PackedSnippetStore(staging / "snippets.pack") if self.snippet_storage == SNIPPET_PACKED else None
+            spool = VectorSpool(self.dimension, EMBEDDING_STORE_DTYPE, staging / "vectors.spool")
+
+        totals = {"chunks": 0, "cached": 0, "encoded": 0, "seconds": 0.0, "workers": 0}
+        files, last_file = 0, None
+        # File manifest (size/mtime/hash + chunk ids per file) for incremental re-indexing
+        file_records: Dict[str, Optional[Dict]] = {}
+        ids_parts: List[np.ndarray] = []
+        installed = False
+        try:
+            with EncodingPool(self.model, keep_alive=True) as encoder:
+                for batch in batched(chunks, batch_size):
+                    for chunk in batch:
+                        path = str(chunk.get("file"))
+                        if path not in file_records:
+                            # Taken right after the parser read the file (None for chunks without a real file)
+                            file_records[path] = file_record(path)
+                    embeds = self._encode_chunks([c["snippet"] for c in batch], encoder=encoder)
+                    for key in ("cached", "encoded", "seconds"):
+                        totals[key] += self.last_encode_stats.get(key, 0)
+                    totals["workers"] = max(totals["workers"], self.last_encode_stats.get("workers", 0))
+
+                    ids = np.arange(next_id, next_id + len(batch), dtype=np.int64)
+                    next_id += len(batch)
+                    for chunk, chunk_id in zip(batch, ids):
+                        chunk["id"] = int(chunk_id)
+                        if chunk.get("file") != last_file:
+                            files, last_file = files + 1, chunk.get("file")
+                        record = file_records[str(chunk.get("file"))]
+                        if record is not None:
+                            record["chunk_ids"].append(int(chunk_id))
+                    chunk_store.insert_many(strip_snippet(c, self.snippet_storage, pack) for c in batch)
+                    chunk_store.commit()
+                    if pack is not None:
+                        pack.flush()
+                    spool.append(embeds)
+                    ids_parts.append(ids)
+                    totals["chunks"] += len(batch)
+
+                    elapsed = time.time() - start
+                    yield {
+                        "stage": "embedding", "files": files, "chunks": totals["chunks"],
+                        "cached": totals["cached"], "encoded": totals["encoded"], "elapsed": round(elapsed, 3),
+                        "chunks_per_second": round(totals["chunks"] / elapsed, 1) if elapsed > 0 else None
+                    }
+
+            yield {"stage": "indexing", "files": files, "chunks": totals["chunks"]}
+            chunk_store.put_file_records(r for r in file_records.values() if r is not None)
+            chunk_store.mark_file_manifest()
+            chunk_store.commit()
+            file_records = {}
+            ids = np.concatenate(ids_parts) if ids_parts else np.zeros(0, dtype=np.int64)
+            ids_parts = []
+            vectors = spool.finish(staging / "vectors.npy" if staging is not None else None)
+            # Picks flat / HNSW / IVF by corpus size; built outside the lock, like compaction
+            index, info = self._create_index(vectors, ids)
+            if staging is not None:
+                # Re-opened from its final name (Windows can't rename a mapped file)
+                vectors = None
+
+            with self._writer, self._lock:
+                self._install_build(chunk_store, pack, staging, vectors, index, info, ids, next_id)
+                installed = True
+                self.save()
+        finally:
+            if not installed:
+                spool.discard()
+                chunk_store.close()
+            if staging is not None:
+                shutil.rmtree(staging, ignore_errors=True)
+                try:
+                    staging.parent.rmdir()
+                except OSError:
+                    pass  # another build is still staging
+
+        elapsed = time.time() - start
+        self.last_build_stats = dict(
+            totals,
+            seconds=round(totals["seconds"], 3),
+            files=files,
+            build_seconds=round(elapsed, 3),
+            chunks_per_second=round(totals["chunks"] / elapsed, 1) if elapsed > 0 else None
+        )
+        if self.in_memory:
+            print(f"[vector_store] Index built in-memory for {self.repo_id} ({totals['chunks']} chunks)")
+        yield dict(self.last_build_stats, stage="done")
+
+    def _install_build(self, chunk_store, pack, staging: Optional[Path], vectors: Optional[np.ndarray],
+                       index, info: Dict, ids: np.ndarray, next_id: int):
+        """Swap a finished streaming build in (caller holds the lock and saves)."""
+        if staging is not None:
+            # save() moves the staged files to the names of the generation it publishes
+            chunk_store.close()
+            if pack is not None:
+                self.pack_path = pack.path
+                self._pack = None
+            if self._chunks is not None:
+                self._chunks.close()
+            self.chunks_path = staging / "chunks.db"
+            self._chunks = None
+            self.embeddings = None
+            self.embeddings_path = staging / "vectors.npy"
+            self._staged = staging
+        else:
+            self._chunks = chunk_store
+            self.embeddings = vectors
+        self.embedding_ids = ids
+        self._embedding_rows = None
+        self.next_id = max(self.next_id, next_id)
+        self.deltas = []
+        self._delta_matrix = None
+        self.tombstones = set()
+        self._filter_index = None
+        self.index, self.index_info = index, info
+        self.index_mmapped = False
+        self._base_dirty = True
+        self._replacing = True
+        if not self.keeps_vectors:
+            self.embeddings = None
+            self.embedding_ids = None
+            self._embedding_rows = None
+
+    def _adopt_staged(self, tag: str):
+        """Move a streaming build's staged files to the names of generation `tag` (caller holds publish_lock)."""
+        staging, self._staged = self._staged, None
+        if self._chunks is not None:
+            self._chunks.close()
+            self._chunks = None
+        os.replace(staging / "chunks.db", self.base / f"chunks-{tag}.db")
+        self.chunks_path = self.base / f"chunks-{tag}.db"
+        if self.pack_path is not None and self.pack_path.parent == staging:
+            self._pack = None
+            os.replace(self.pack_path, self.base / f"snippets-{tag}.pack")
+            self.pack_path = self.base / f"snippets-{tag}.pack"
+        self.embeddings_path = None
+        if self.keeps_vectors:
+            vectors_path = self.base / f"base-{tag}.vectors.npy"
+            os.replace(staging / "vectors.npy", vectors_path)
+            self.embeddings = np.load(vectors_path, mmap_mode="r")
+            # Already on disk - save() only writes the index and the ids
+            self.embeddings_path = vectors_path
+
+    def add_chunks(self, chunks, save: bool = True):
+        """
+        Add new chunks (incremental update).
+        Their vectors go into a new delta segment; the base index isn't touched.
+        """
         if not chunks:
             return
         
-        if self.index is None:
+        if self.index is None and self.embeddings is None:
             # No existing index, build from scratch
             self.build(chunks)
             return
         
-        # Encode new chunks
-        new_embeds = self.model.encode([c["snippet"] for c in chunks], normalize_embeddings=True)
-        
-        # Add to index
-        self.index.add(new_embeds.astype(np.float32))
+        # Encode only the new chunks
+        new_embeds = self._encode_chunks([c["snippet"] for c in chunks])
+        with self._writer, self._lock:
+            self._add_encoded(chunks, new_embeds)
+            
+            if save:
+                self.save()
+
+    def _add_encoded(self, chunks, vectors: np.ndarray):
+        """Register already-encoded chunks as one new delta segment (caller holds the lock)."""
+        # Allocated by the chunk store, not from self.next_id: another store object on the same
+        # chunks.db may have handed out ids since this one was loaded
+        first = self.chunks.allocate_ids(len(chunks))
+        ids = np.arange(first, first + len(chunks), dtype=np.int64)
+        self._register_metas(chunks, ids)
+        segment = DeltaSegment(self._next_segment_name(), np.asarray(vectors, dtype=EMBEDDING_STORE_DTYPE), ids)
+        # Copy-on-write, so concurrent queries see either the old or the new list
+        self.deltas = self.deltas + [segment]
+        self._delta_matrix = None
+    
+    def remove_chunks_by_file(self, file_path: str, save: bool = True) -> int:
+        """
+        Remove all chunks from a specific file (for file updates/deletes).
+        Their ids are tombstoned - no vectors are rewritten or re-encoded.
         
-        # Add to metas
-        self.metas.extend(chunks)
+        Returns:
+            Number of chunks removed
+        """
+        if self.index is None and self.embeddings is None:
+            return 0
         
-        # Only write to disk if not in-memory mode
-        if not self.in_memory:
-            faiss.write_index(self.index, str(self.index_path))
-            with open(self.meta_path, "w", encoding="utf-8") as f:
-                json.dump(self.metas, f, ensure_ascii=False)
+        with self._writer, self._lock:
+            self.chunks.delete_file_records([file_path])
+            ids = self.chunks.ids_for_file(file_path)
+            if not ids:
+                return 0
+            self.tombstones = self.tombstones | set(ids)
+            self.chunks.delete_ids(ids)
+            self._filter_index = None
+            
+            if save:
+                self.save()
+        return len(ids)
     
-    def remove_chunks_by_file(self, file_path: str):
-        """Remove all chunks from a specific file (for file updates/deletes)."""
-        if self.index is None:
+    def update_file_chunks(self, file_path: str, new_chunks):
+        """Update chunks for a specific file (remove old, add new) and save once."""
+        if self.index is None and self.embeddings is None:
+            self.build(new_chunks or [])
             return
+        # Encode before taking the lock (and the chunk store's write transaction)
+        new_embeds = self._encode_chunks([c["snippet"] for c in new_chunks]) if new_chunks else None
+        with self._writer, self._lock:
+            # Remove old chunks
+            self.remove_chunks_by_file(file_path, save=False)
+            # Add new chunks
+            if new_chunks:
+                self._add_encoded(new_chunks, new_embeds)
+            if self.chunks.has_file_manifest():
+                record = file_record(file_path, [c["id"] for c in new_chunks or []])
+                if record is not None:
+                    self.chunks.put_file_records([record])
+            self.save()
+
+    def replace_files(self, chunks: List[Dict], vectors: np.ndarray, files: Dict[str, Dict],
+                      deleted: Iterable[str] = (), touched: Iterable[Dict] = ()) -> Dict:
+        """
+        Apply an incremental re-index as one generation: drop the chunks of re-chunked and
+        deleted files, add the new chunks as a delta segment and update the file manifest.
+
+        Args:
+            chunks: New chunks of the files in `files`
+            vectors: Their embeddings, row-aligned with chunks
+            files: path -> manifest record (taken before chunking) of every re-chunked file
+            deleted: Files that are gone from the tree
+            touched: Records of files with a new size/mtime but unchanged content
+
+        Returns:
+            {"removed": chunks removed, "added": chunks added}
+        """
+        deleted, touched = list(deleted), list(touched)
+        with self._writer, self._lock:
+            removed = sum(self.remove_chunks_by_file(path, save=False) for path in list(files) + deleted)
+            if chunks:
+                self._add_encoded(chunks, vectors)
+            file_ids: Dict[str, List[int]] = {}
+            for chunk in chunks:
+                file_ids.setdefault(str(chunk["file"]), []).append(chunk["id"])
+            self.chunks.put_file_records(dict(r, chunk_ids=file_ids.get(path, [])) for path, r in files.items())
+            self.chunks.put_file_records(touched)
+            if removed or chunks:
+                self.save()
+            else:
+                # Manifest-only change (e.g. files touched without edits): no new generation needed
+                self.chunks.commit()
+        return {"removed": removed, "added": len(chunks)}
+
+    def save(self):
+        """
+        Persist changes (no-op for in-memory stores) and bump the generation.
+        Writes only new files - the base index/matrix after a build or compaction, otherwise just
+        the new delta segment and tombstones - then publishes them as a new generation by
+        atomically swapping CURRENT. Numbering, writing and publishing happen under publish_lock,
+        and only on top of the generation this store read: if another store or process published
+        since, incremental changes are rebased onto that generation first (see _rebase); a build
+        replaces it. Chunk rows are committed once the generation is published.
+
+        Isolation is weaker for metadata than for vectors: readers of older generations keep their
+        index files, but incremental generations share one chunks database. A reader pinned to an
+        older generation stops finding the rows of chunks a newer generation removed (its results
+        can come back short of k) until it loads the new generation.
+        """
+        with self._lock:
+            # Only write to disk if not in-memory mode
+            if not self.in_memory:
+                with publish_lock(self.key, self.base):
+                    self._publish_changes()
+            bump_index_generation(self.key)
+        self._maybe_compact()
+
+    def _publish_changes(self):
+        """Write this store's new files and publish them (caller holds the lock and publish_lock)."""
+        if self._pack is not None:
+            self._pack.flush()
+        # Row changes since the last save are still in the chunk store's open transaction. They
+        # are committed only after the generation they belong to is published; if anything
+        # before that fails they are rolled back and the store goes back to the published generation
+        try:
+            generation, info = self._write_generation()
+        except BaseException:
+            self.chunks.rollback()
+            if not self._replacing:
+                try:
+                    self.load()
+                except Exception as e:
+                    print(f"[vector_store] Could not reload {self.repo_id} after a failed save: {e}")
+            raise
+        self.chunks.commit()
+        self._replacing = False
+        self._saved_tombstones = set(self.tombstones)
+        self._hold_generation(generation)
+        save_json_atomic(self.info_path, dict(info, generation=generation))
+        collect_garbage(self.key, self.base, keep=INDEX_KEEP_GENERATIONS)
+
+    def _write_generation(self):
+        """Write the files of the next generation and publish it; returns (generation, info)."""
+        current = current_generation(self.base)
+        if not self._replacing and self.generation is not None and current != self.generation:
+            self._rebase()
+        tag = f"{next_generation(self.base):06d}"
+        if self._staged is not None:
+            self._adopt_staged(tag)
         
-        # Find chunks to remove
-        indices_to_remove = []
-        for i, meta in enumerate(self.metas):
-            if meta.get("file") == file_path or str(meta.get("file")) == str(file_path):
-                indices_to_remove.append(i)
+        if self._base_dirty:
+            index_path = self.base / f"base-{tag}.index"
+            tmp_path = index_path.with_name(index_path.name + ".tmp")
+            faiss.write_index(self.index, str(tmp_path))
+            fsync_file(tmp_path)
+            os.replace(tmp_path, index_path)
+            self.index_path = index_path
+            if self.embeddings is not None:
+                vectors_path = self.base / f"base-{tag}.vectors.npy"
+                if self.embeddings_path != vectors_path:
+                    # (A streaming build already wrote its matrix under this name)
+                    save_npy_atomic(vectors_path, self.embeddings)
+                    self.embeddings_path = vectors_path
+                self.embedding_ids_path = self.base / f"base-{tag}.ids.npy"
+                save_npy_atomic(self.embedding_ids_path, self.embedding_ids)
+            else:
+                self.embeddings_path = self.embedding_ids_path = None
+            self._base_dirty = False
         
-        if not indices_to_remove:
-            return
+        unsaved = [s for s in self.deltas if not s.saved]
+        if unsaved:
+            # Named after the generation that publishes it, so no file name is ever reused
+            segment = DeltaSegment.merge(f"seg-{tag}", unsaved)
+            segment.save(self.segment_dir)
+            self.deltas = [s for s in self.deltas if s.saved] + [segment]
+            self._delta_matrix = None
         
-        # Rebuild index without removed chunks
-        remaining_metas = [m for i, m in enumerate(self.metas) if i not in indices_to_remove]
+        self.tombstones_path = None
+        if self.tombstones:
+            self.tombstones_path = self.base / f"tombstones-{tag}.npy"
+            save_npy_atomic(self.tombstones_path, np.array(sorted(self.tombstones), dtype=np.int64))
         
-        if remaining_metas:
-            # Rebuild index
-            embeds = self.model.encode([c["snippet"] for c in remaining_metas], normalize_embeddings=True)
-            d = embeds.shape[1]
-            self.index = faiss.IndexFlatIP(d)
-            self.index.add(embeds.astype(np.float32))
-            self.metas = remaining_metas
+        info = dict(self.index_info, chunks=self.chunks.count(),
+                    ntotal=self.index.ntotal if self.index is not None else 0,
+                    snippet_storage=self.snippet_storage,
+                    delta_segments=len(self.deltas), delta_vectors=self.delta_count,
+                    tombstones=len(self.tombstones))
+        generation = publish(self.key, self.base, {
+            "chunks": self.chunks_path.name,
+            "index": self.index_path.name,
+            "embeddings": self.embeddings_path.name if self.embeddings_path else None,
+            "embedding_ids": self.embedding_ids_path.name if self.embedding_ids_path else None,
+            "segments": [s.name for s in self.deltas],
+            "tombstones": self.tombstones_path.name if self.tombstones_path else None,
+            "pack": self.pack_path.name if self.pack is not None else None,
+            "info": info
+        }, expected_gen=current, generation=int(tag))
+        return generation, info
+
+    def _rebase(self):
+        """
+        Move this store's unpublished changes onto the current generation, which another store
+        object or process published after this one read its own (caller holds publish_lock).
+        Only incremental changes can move: new delta segments and tombstones over the same chunk
+        database, whose rows this store wrote under ids no other writer can hand out.
+
+        Raises:
+            GenerationConflict: If this store rebuilt its base index, or the current generation
+                                uses another chunk database (a full build replaced the index)
+        """
+        manifest = read_current(self.base)
+        pack_name = self.pack_path.name if self.pack is not None else None
+        if (manifest is None or self._base_dirty or manifest.get("chunks") != self.chunks_path.name
+                or manifest.get("pack") != pack_name):
+            raise GenerationConflict(
+                f"Index of {self.repo_id} was replaced since generation {self.generation}; reload and retry"
+            )
+        pending = [s for s in self.deltas if not s.saved]
+        removed = self.tombstones - self._saved_tombstones
+        print(f"[vector_store] Rebasing {self.repo_id} from generation {self.generation} "
+              f"onto {manifest['generation']}")
+        self._use_generation_files(manifest)
+        self.index_info = dict(manifest.get("info", {}))
+        self._load_generation(manifest)
+        self.deltas = self.deltas + pending
+        self.tombstones = self.tombstones | removed
+
+    def _hold_generation(self, generation: int):
+        """Pin the generation this store now reads (released when the store is dropped or moves on)."""
+        if self._unpin is not None:
+            self._unpin()
+        pin(self.key, generation)
+        self._unpin = weakref.finalize(self, unpin, self.key, generation)
+        self.generation = generation
+
+    def needs_compaction(self) -> bool:
+        """Whether delta segments/tombstones have grown enough to fold into a new base index."""
+        if not self.deltas and not self.tombstones:
+            return False
+        base_n = max(1, len(self.embedding_ids) if self.embedding_ids is not None
+                     else (self.index.ntotal if self.index is not None else 0))
+        if len(self.deltas) > INDEX_SEGMENT_MAX_DELTAS:
+            return True
+        if self.delta_count > INDEX_SEGMENT_MAX_DELTA_RATIO * base_n:
+            return True
+        rebuildable = self.embeddings is not None
+        if len(self.tombstones) > INDEX_TOMBSTONE_REBUILD_RATIO * base_n and (
+                rebuildable or supports_remove(self.index_type)):
+            return True
+        if not rebuildable:
+            # Without raw vectors the index can only be folded into, not re-typed
+            return False
+        # Corpus outgrew its index type, or PQ deferred to SQ8 can now be trained
+        n = self.chunks.count()
+        outgrown = INDEX_TYPES.index(choose_index_type(n)) > INDEX_TYPES.index(self.index_type)
+        recompress = effective_compression(self.compression, n) != self.index_compression
+        return outgrown or recompress
+
+    def _maybe_compact(self):
+        """Start a compaction if thresholds are reached (in a background thread unless disabled)."""
+        if not self.needs_compaction():
+            return
+        if INDEX_BACKGROUND_COMPACTION:
+            thread = threading.Thread(target=self.compact, daemon=True, name=f"compact-{self.repo_id}")
+            thread.start()
         else:
-            # All chunks removed, create empty index
-            if self.metas:
-                sample_embed = self.model.encode(["dummy"], normalize_embeddings=True)
-                d = sample_embed.shape[1]
-                self.index = faiss.IndexFlatIP(d)
-            self.metas = []
-        
-        # Only write to disk if not in-memory mode
-        if not self.in_memory:
-            faiss.write_index(self.index, str(self.index_path))
-            with open(self.meta_path, "w", encoding="utf-8") as f:
-                json.dump(self.metas, f, ensure_ascii=False)
-    
-    def update_file_chunks(self, file_path: str, new_chunks):
-        """Update chunks for a specific file (remove old, add new)."""
-        # Remove old chunks
-        self.remove_chunks_by_file(file_path)
-        # Add new chunks
-        if new_chunks:
-            self.add_chunks(new_chunks)
+            self.compact()
+
+    def compact(self) -> bool:
+        """
+        Fold delta segments and tombstones into a new base index.
+        The new index is built from a snapshot without holding the write lock, so
+        watcher updates keep landing in new segments meanwhile; those stay as deltas.
+        If another store object published a generation in the meantime, the snapshot is
+        stale and the compaction is dropped rather than published over that generation.
+        
+        Returns:
+            True if a compaction ran (False if one was already running, nothing to do or it was dropped)
+        """
+        if not self._compact_lock.acquire(blocking=False):
+            return False
+        try:
+            with self._lock:
+                if not self.deltas and not self.tombstones:
+                    return False
+                segments = list(self.deltas)
+                tombstones = set(self.tombstones)
+                base_vectors, base_ids = self.embeddings, self.embedding_ids
+                base_index = self.index
+            
+            start = time.time()
+            if base_vectors is not None or base_index is None:
+                # Live rows of the base matrix + every segment, minus tombstones
+                parts, part_ids = [], []
+                for vectors, ids in [(base_vectors, base_ids)] + [(s.vectors, s.ids) for s in segments]:
+                    if vectors is None or len(ids) == 0:
+                        continue
+                    keep = ~np.isin(ids, np.fromiter(tombstones, dtype=np.int64, count=len(tombstones)))
+                    parts.append(np.asarray(vectors)[keep])
+                    part_ids.append(ids[keep])
+                vectors = (np.concatenate(parts).astype(EMBEDDING_STORE_DTYPE) if parts
+                           else np.zeros((0, self.dimension), dtype=EMBEDDING_STORE_DTYPE))
+                ids = np.concatenate(part_ids) if part_ids else np.zeros(0, dtype=np.int64)
+                ids, first = np.unique(ids, return_index=True)
+                vectors = vectors[first]
+                index, info = self._create_index(vectors, ids)
+                remaining_tombstones = set()
+            else:
+                # Compressed in-memory store without raw vectors: fold segments into a copy of the index
+                vectors, ids = None, None
+                index = faiss.clone_index(base_index)
+                for s in segments:
+                    index.add_with_ids(np.ascontiguousarray(s.vectors, dtype=np.float32), s.ids)
+                info = dict(self.index_info)
+                remaining_tombstones = tombstones
+                if supports_remove(self.index_type) and tombstones:
+                    index.remove_ids(np.array(sorted(tombstones), dtype=np.int64))
+                    remaining_tombstones = set()
+            
+            with self._writer, self._lock, (nullcontext() if self.in_memory else publish_lock(self.key, self.base)):
+                if not self.in_memory and current_generation(self.base) != (self.generation or 0):
+                    print(f"[vector_store] Dropped compaction of {self.repo_id}: generation {self.generation} "
+                          f"is no longer current")
+                    return False
+                self.index, self.index_info = index, info
+                self.index_mmapped = False
+                self.embeddings, self.embedding_ids = vectors, ids
+                self._embedding_rows = None
+                self.deltas = [s for s in self.deltas if s not in segments]
+                self._delta_matrix = None
+                self.tombstones = (self.tombstones - tombstones) | remaining_tombstones
+                self._base_dirty = True
+                if not self.keeps_vectors:
+                    self.embeddings = None
+                    self.embedding_ids = None
+                print(f"[vector_store] Compacted {len(segments)} segments and {len(tombstones)} tombstones "
+                      f"for {self.repo_id} in {time.time() - start:.2f}s")
+                self.save()
+            return True
+        finally:
+            self._compact_lock.release()
+
+    @staticmethod
+    def index_exists(repo_id: str, base_dir: str = "data/index") -> bool:
+        """Check if a disk index exists for a repo without creating any directories."""
+        base = Path(base_dir) / repo_id
+        return (base / CURRENT_FILE).exists() or (base / "faiss.index").exists()
+
+    def exists(self) -> bool:
+        """Check if this store has an index (in RAM for in-memory stores, on disk otherwise)."""
+        if self.in_memory:
+            return self.index is not None
+        return (self.base / CURRENT_FILE).exists() or (self.base / "faiss.index").exists()
+
+    def file_signature(self):
+        """
+        Cheap on-disk signature used for cache revalidation: the CURRENT generation pointer
+        (or mtime/size of the legacy index file).
+        """
+        if self.in_memory:
+            return None
+        pointer = current_pointer(self.base)
+        if pointer is not None:
+            return pointer
+        try:
+            st = (self.base / "faiss.index").stat()
+        except FileNotFoundError:
+            return None
+        return (st.st_mtime_ns, st.st_size)
+
+    def memory_bytes(self) -> int:
+        """Approximate resident size of the loaded index + metadata."""
+        total = 0
+        if self.index is not None:
+            # Per-vector code (4*d for float32, less when compressed) + 8-byte id.
+            # Mapped codes live in the shared page cache: a cold repo costs only what was read into RAM
+            code_size = self.index_info.get("params", {}).get("code_size", self.index.d * 4)
+            if not self.index_mmapped:
+                total += self.index.ntotal * (code_size + 8)
+            elif self.index_type != INDEX_IVF:
+                total += self.index.ntotal * 8  # id map
+            if self.index_type == INDEX_HNSW:
+                # Graph links: ~2*M neighbors per vector on the base layer
+                total += self.index.ntotal * self.index_info.get("params", {}).get("M", 32) * 2 * 4
+        if self.embeddings is not None and not isinstance(self.embeddings, np.memmap):
+            total += self.embeddings.nbytes
+        for segment in self.deltas:
+            if not isinstance(segment.vectors, np.memmap):
+                total += segment.vectors.nbytes
+        total += self.chunks.memory_bytes()
+        return total
 
     def load(self):
         """Load index from disk (only works if not in-memory)."""
         if self.in_memory:
             raise ValueError("Cannot load in-memory index from disk. In-memory stores are ephemeral.")
         
-        if not self.index_path.exists():
-            raise FileNotFoundError(f"Index not found: {self.index_path}")
+        # Pin down the generation first; everything below reads only files it lists
+        manifest = read_current(self.base)
+        if manifest is not None:
+            self._use_generation_files(manifest)
+            self.index_info = dict(manifest.get("info", {}))
+        else:
+            # Pre-generation layout
+            if not self.index_path.exists():
+                raise FileNotFoundError(f"Index not found: {self.index_path}")
+            self.index_info = {"type": INDEX_FLAT, "params": {}}
+            if self.info_path.exists():
+                with open(self.info_path, "r", encoding="utf-8") as f:
+                    self.index_info = json.load(f)
+            if self.manifest_path.exists():
+                with open(self.manifest_path, "r", encoding="utf-8") as f:
+                    manifest = json.load(f)
+            manifest = dict(manifest or {}, generation=0)
+        self._load_generation(manifest)
+
+    def _load_generation(self, manifest: Dict):
+        """Read the files of a generation (paths and index_info already point at it) and pin it."""
+        self._hold_generation(manifest["generation"])
+        
+        if self.meta_path.exists():
+            self._import_legacy_meta()
+        
+        # Raw vectors are memory-mapped: pages are only read when a rebuild/fallback touches them
+        if (self.embeddings_path is not None and self.embeddings_path.exists()
+                and self.embedding_ids_path.exists()):
+            self.embeddings = np.load(self.embeddings_path, mmap_mode="r")
+            self.embedding_ids = np.load(self.embedding_ids_path)
+        else:
+            self.embeddings = None
+            self.embedding_ids = None
+        self._embedding_rows = None
+        
+        try:
+            index = self._read_index()
+        except Exception as e:
+            if self.embeddings is None:
+                raise
+            print(f"[vector_store] Could not read index for {self.repo_id} ({e}), rebuilding from stored embeddings")
+            self.rebuild_index()
+            index = self.index
+        
+        if isinstance(index, faiss.IndexFlat):
+            # Legacy positional index (IndexFlatIP): re-wrap the stored vectors under ids 0..n-1.
+            # Vectors are copied out of the old index, so nothing is re-encoded.
+            vectors = index.reconstruct_n(0, index.ntotal) if index.ntotal else np.zeros((0, index.d), dtype=np.float32)
+            index = self._new_index(index.d)
+            index.add_with_ids(vectors, np.arange(len(vectors), dtype=np.int64))
+            self.index_mmapped = False
+            self._base_dirty = True
+            print(f"[vector_store] Migrated legacy index for {self.repo_id} to ID-mapped layout")
+        
+        if (self.embeddings is None and index.ntotal and self.index_type == INDEX_FLAT
+                and self.index_compression == COMPRESSION_NONE):
+            # Index predates persisted embeddings: recover them from the flat index (persisted on next save)
+            self.embedding_ids = faiss.vector_to_array(index.id_map).astype(np.int64)
+            self.embeddings = np.asarray(index.index.reconstruct_n(0, index.ntotal), dtype=EMBEDDING_STORE_DTYPE)
+            self._base_dirty = True
+        
+        # Delta segments + tombstones written since the base index
+        self.deltas = [DeltaSegment.load(self.segment_dir, name) for name in manifest.get("segments", [])]
+        self._delta_matrix = None
+        self.tombstones = set()
+        if self.tombstones_path is not None and self.tombstones_path.exists():
+            self.tombstones = set(int(i) for i in np.load(self.tombstones_path))
         
-        self.index = faiss.read_index(str(self.index_path))
-        self.metas = json.load(open(self.meta_path, "r", encoding="utf-8"))
+        self._saved_tombstones = set(self.tombstones)
+        self._filter_index = None
+        
+        self.index = index
+        # Metadata stays in chunks.db and is fetched per query
+        self.next_id = self.chunks.max_id() + 1
 
-    def query(self, text: str, k: int = 40):
-        emb = self.model.encode([text], normalize_embeddings=True).astype(np.float32)
-        D, I = self.index.search(emb, k)
-        out = []
-        for idx, score in zip(I[0], D[0]):
-            m = self.metas[int(idx)]
-            m2 = dict(m); m2["score_vec"] = float(score)
-            out.append(m2)
-        return out
+    def _read_index(self):
+        """
+        Read the base index, memory-mapped when INDEX_MMAP is on and the type allows it.
+        The base index is never modified after load (updates go to delta segments, compaction
+        builds a new one), so a read-only mapping is safe.
+        """
+        self.index_mmapped = False
+        flags = mmap_io_flags(self.index_type) if INDEX_MMAP else 0
+        if flags:
+            try:
+                index = faiss.read_index(str(self.index_path), flags)
+                self.index_mmapped = True
+                return index
+            except Exception as e:
+                print(f"[vector_store] Could not memory-map index for {self.repo_id} ({e}), reading it instead")
+        return faiss.read_index(str(self.index_path))
+
+    def _use_generation_files(self, manifest: Dict):
+        """Point the file paths at those of a published generation."""
+        def path(name):
+            return self.base / manifest[name] if manifest.get(name) else None
+        self.index_path = path("index")
+        if manifest.get("chunks") and path("chunks") != self.chunks_path:
+            if self._chunks is not None:
+                self._chunks.close()
+            self.chunks_path = path("chunks")
+            self._chunks = None
+            self._filter_index = None
+        self.embeddings_path = path("embeddings")
+        self.embedding_ids_path = path("embedding_ids")
+        self.tombstones_path = path("tombstones")
+        if manifest.get("pack") and path("pack") != self.pack_path:
+            self.pack_path = path("pack")
+            self._pack = None
+
+    def _import_legacy_meta(self):
+        """Move a legacy meta.json into chunks.db (positional metas get ids 0..n-1)."""
+        if self.chunks.count() == 0:
+            with open(self.meta_path, "r", encoding="utf-8") as f:
+                metas = json.load(f)
+            for i, m in enumerate(metas):
+                m.setdefault("id", i)
+            self.chunks.insert_many(metas)
+            self.chunks.commit()
+            print(f"[vector_store] Imported {len(metas)} chunks from meta.json for {self.repo_id}")
+        self.meta_path.unlink()
+
+    def _search(self, embs: np.ndarray, k: int, nprobe: Optional[int] = None, ef_search: Optional[int] = None,
+                bitmap: Optional[np.ndarray] = None):
+        """
+        Search the base index (or stored vectors if no index is loaded) and every delta segment,
+        then merge the top-k. Tombstoned ids are dropped; the base search over-fetches to make up for them.
+        With a filter bitmap, only ids set in it are searched (tombstoned ids never are).
+        """
+        # Snapshot: compaction/writers swap these attributes, never mutate them in place
+        index, deltas, tombstones = self.index, self.deltas, self.tombstones
+        k_fetch = k if bitmap is not None else k + len(tombstones)
+        
+        if index is None:
+            results = [self.brute_force_search(embs, k_fetch, bitmap=bitmap)]
+        else:
+            rerank = (self.index_compression != COMPRESSION_NONE and INDEX_RERANK_FACTOR > 0
+                      and self.keeps_vectors and self.embeddings is not None)
+            k_search = k * INDEX_RERANK_FACTOR + (k_fetch - k) if rerank else k_fetch
+            # The selector reads `bitmap`, which stays referenced until the search returns
+            selector = id_selector(bitmap) if bitmap is not None else None
+            params = search_params(self.index_type, nprobe=nprobe, ef_search=ef_search, selector=selector)
+            if params is not None:
+                D, I = index.search(embs, k_search, params=params)
+            else:
+                D, I = index.search(embs, k_search)
+            if rerank:
+                D, I = rerank_candidates(embs, I, k_fetch, self.embeddings, self._rows())
+            results = [(D, I)]
+        
+        if deltas:
+            vectors, ids = self._delta_vectors(deltas)
+            if bitmap is not None:
+                keep = bitmap_contains(bitmap, ids)
+                vectors, ids = vectors[keep], ids[keep]
+            results.append(exact_search(vectors, ids, embs, k_fetch))
+        
+        if len(results) == 1 and not tombstones:
+            D, I = results[0]
+            return D[:, :k], I[:, :k]
+        return merge_topk(results, k, exclude=tombstones)
+
+    def _delta_vectors(self, deltas):
+        """All delta segment vectors stacked (cached until the segment list changes)."""
+        cached = self._delta_matrix
+        if cached is not None and cached[0] is deltas:
+            return cached[1], cached[2]
+        vectors = np.concatenate([np.asarray(s.vectors, dtype=np.float32) for s in deltas])
+        ids = np.concatenate([s.ids for s in deltas])
+        self._delta_matrix = (deltas, vectors, ids)
+        return vectors, ids
+
+    def encode_queries(self, texts: List[str]) -> np.ndarray:
+        """
+        Encode query strings (n x d). Repeated queries come from the query embedding LRU;
+        the rest are encoded in one model forward pass.
+        """
+        texts = list(texts)
+        cache = get_query_embedding_cache()
+        if cache is None or not texts:
+            return self._encode(texts)
+        # Whitespace-normalized text is what gets encoded, so a cached vector equals a fresh one
+        texts = [cache.normalize(t) for t in texts]
+        fingerprint = self.model_fingerprint
+        found = cache.get_many(fingerprint, texts)
+        missing = list(dict.fromkeys(t for t, v in zip(texts, found) if v is None))
+        if missing:
+            encoded = self._encode(missing)
+            cache.put_many(fingerprint, missing, encoded)
+            by_text = dict(zip(missing, encoded))
+            found = [v if v is not None else by_text[t] for t, v in zip(texts, found)]
+        return np.stack(found).astype(np.float32)
+
+    def search_embeddings(self, embs: np.ndarray, k: int = 40, nprobe: Optional[int] = None,
+                          ef_search: Optional[int] = None,
+                          filters: Optional[SearchFilter] = None) -> List[List[Dict]]:
+        """
+        Search with already-encoded queries (one FAISS call for the whole matrix).
+        Lets callers encode once and search several stores.
+        
+        Args:
+            filters: Restrict results (path prefix/glob, language, chunk type, excluded files).
+                     Applied inside the search, so up to k matching results come back.
+        
+        Returns:
+            One result list per query row
+        """
+        if len(embs) == 0:
+            return []
+        bitmap = None
+        if filters is not None and not filters.is_empty():
+            bitmap = self.filter_index().bitmap(filters)
+            if not bitmap.any():
+                return [[] for _ in range(len(embs))]
+        D, I = self._search(np.ascontiguousarray(embs, dtype=np.float32), k, nprobe=nprobe, ef_search=ef_search,
+                            bitmap=bitmap)
+        # One metadata lookup for all queries
+        metas = self.chunks.get_many({int(idx) for idx in I.ravel() if idx >= 0})
+        results = []
+        for ids, scores in zip(I, D):
+            out = []
+            for idx, score in zip(ids, scores):
+                m = metas.get(int(idx))
+                if m is None:
+                    # -1 (fewer than k vectors), a tombstone, or an id removed concurrently
+                    continue
+                m2 = dict(m); m2["score_vec"] = float(score)
+                out.append(m2)
+                if len(out) >= k:
+                    break
+            results.append(out)
+        # Only the returned results get their text read back (each file read once across queries)
+        hydrate_snippets([m for out in results for m in out], self.pack)
+        return results
+
+    def query_batch(self, texts: List[str], k: int = 40, nprobe: Optional[int] = None,
+                    ef_search: Optional[int] = None, filters: Optional[SearchFilter] = None) -> List[List[Dict]]:
+        """
+        Semantic search for several queries: one encode pass + one index search.
+        
+        Returns:
+            One result list per query, in input order
+        """
+        if not texts:
+            return []
+        return self.search_embeddings(self.encode_queries(texts), k, nprobe=nprobe, ef_search=ef_search,
+                                      filters=filters)
+
+    def query(self, text: str, k: int = 40, nprobe: Optional[int] = None, ef_search: Optional[int] = None,
+              filters: Optional[SearchFilter] = None):
+        """
+        Semantic search.
+        
+        Args:
+            text: Query text
+            k: Number of results
+            nprobe: IVF override (more lists = higher recall, slower)
+            ef_search: HNSW override (larger = higher recall, slower)
+            filters: SearchFilter restricting which chunks can be returned
+        """
+        return self.query_batch([text], k, nprobe=nprobe, ef_search=ef_search, filters=filters)[0]
@@ -0,0 +1,50 @@
+"""Benchmark semantic chunking: tree-sitter chunker vs regex patterns
+
+Usage: python benchmark_chunking.py [repo_dir] [rounds]
+"""
+import sys
+import time
+from collections import Counter
+from pathlib import Path
+
+from backend.modules.file_view import FileView
+from backend.modules.parser import iter_text_files, semantic_chunks
+from backend.modules.ts_chunker import GRAMMARS, get_parser
+
+repo_dir = Path(sys.argv[1] if len(sys.argv) > 1 else ".")
+rounds = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+
+print("=" * 60)
+print("CHUNKING BENCHMARK")
+print("=" * 60)
+
+# Read every file once up front, so both chunkers are timed on parsing alone
+views = []
+for path in iter_text_files(repo_dir):
+    try:
+        views.append(FileView.read(path))
+    except OSError:
+        pass
+code_views = [v for v in views if v.path.suffix.lower() in GRAMMARS]
+print(f"\nRepository: {repo_dir.resolve()}")
+print(f"Files: {len(views)} ({len(code_views)} with a tree-sitter grammar mapping)")
+missing = sorted({ext for ext in GRAMMARS if get_parser(ext) is None})
+if missing:
+    print(f"Grammars not installed (regex/line fallback): {', '.join(missing)}")
+
+for chunker in ("regex", "auto"):
+    best = None
+    for _ in range(rounds):
+        start = time.perf_counter()
+        chunks = [c for view in views for c in semantic_chunks(view, chunker=chunker)]
+        seconds = time.perf_counter() - start
+        best = seconds if best is None else min(best, seconds)
+    sizes = [c["end"] - c["start"] + 1 for c in chunks]
+    types = Counter(c.get("type", "unknown") for c in chunks)
+    print(f"\n[{chunker}]")
+    print(f"  Chunks: {len(chunks)}")
+    print(f"  Best of {rounds}: {best:.3f}s -> {len(chunks) / best:.0f} chunks/sec, {len(views) / best:.0f} files/sec")
+    print(f"  Lines per chunk: avg {sum(sizes) / max(len(sizes), 1):.1f}, max {max(sizes, default=0)}")
+    print(f"  Types: {dict(types)}")
+
+print("\n" + "=" * 60)
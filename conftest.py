@@ -0,0 +1,70 @@
+"""
+Shared pytest fixtures for the in-process tests (the test_*.py scripts that talk to a
+running server don't use them).
+"""
+import hashlib
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+# Add project root to path
+project_root = Path(__file__).parent
+sys.path.insert(0, str(project_root))
+
+# Set before backend.config is imported: no shared embedding cache, no model warmup,
+# and a throwaway user database instead of data/users.db
+os.environ.setdefault("CHUNK_EMBEDDING_CACHE", "false")
+os.environ.setdefault("EMBEDDING_WARMUP", "false")
+os.environ.setdefault("DATABASE_PATH", str(Path(tempfile.mkdtemp()) / "users.db"))
+
+
+class FakeEmbeddingModel:
+    """Deterministic stand-in for the SentenceTransformer: one random unit vector per distinct text."""
+
+    def __init__(self, dim: int = 32):
+        self.dim = dim
+        self.encoded = 0
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return self.dim
+
+    def encode(self, texts, normalize_embeddings=True, batch_size=32, **kwargs):
+        self.encoded += len(texts)
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "little")
+            vector = np.random.default_rng(seed).standard_normal(self.dim)
+            vectors[row] = vector / np.linalg.norm(vector)
+        return vectors
+
+
+@pytest.fixture
+def fake_model():
+    """Register FakeEmbeddingModel as the default embedding model for the duration of a test."""
+    from backend.modules.model_registry import get_model_registry
+    registry = get_model_registry()
+    key = registry._make_key(None, None)
+    previous = registry._models.get(key)
+    model = registry._models[key] = FakeEmbeddingModel()
+    yield model
+    if previous is None:
+        registry._models.pop(key, None)
+    else:
+        registry._models[key] = previous
+
+
+@pytest.fixture
+def index_dir(tmp_path, fake_model, monkeypatch):
+    """Index root for FaissStore tests; compaction runs inline so tests can await it."""
+    from backend.modules import vector_store
+    monkeypatch.setattr(vector_store, "INDEX_BACKGROUND_COMPACTION", False)
+    return str(tmp_path / "index")
+
+
+def make_chunks(file: str, n: int, prefix: str = "code"):
+    """n one-line chunks of a file with distinct snippets."""
+    return [{"file": file, "start": i + 1, "end": i + 1, "snippet": f"{file} {prefix} {i}"} for i in range(n)]
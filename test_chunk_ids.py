@@ -0,0 +1,90 @@
+"""
+Tests for chunk id allocation (backend/modules/chunk_store.py): two store objects on the
+same chunks.db must never hand out the same vector id or overwrite each other's rows.
+Run with: python -m pytest -q test_chunk_ids.py
+"""
+import sqlite3
+import sys
+import threading
+import time
+
+import pytest
+
+from conftest import make_chunks
+from backend.modules.chunk_store import SqliteChunkStore, MemoryChunkStore
+from backend.modules.vector_store import FaissStore
+
+
+def _insert(store, file: str, n: int):
+    first = store.allocate_ids(n)
+    store.insert_many(dict(c, id=first + i) for i, c in enumerate(make_chunks(file, n)))
+    return first
+
+
+def test_two_connections_allocate_disjoint_ids(tmp_path):
+    a = SqliteChunkStore(tmp_path / "chunks.db")
+    b = SqliteChunkStore(tmp_path / "chunks.db")
+    _insert(a, "seed.py", 1)
+    a.commit()
+
+    first_a = _insert(a, "a.py", 10)
+    allocated = {}
+
+    def writer_b():
+        allocated["b"] = _insert(b, "b.py", 10)
+        b.commit()
+
+    thread = threading.Thread(target=writer_b)
+    thread.start()
+    time.sleep(0.2)
+    # B waits for A's write transaction instead of reusing A's ids
+    assert "b" not in allocated
+    a.commit()
+    thread.join(timeout=10)
+
+    assert first_a == 1 and allocated["b"] == 11
+    assert a.count() == 21 and b.count() == 21
+    assert a.max_id() == 20
+
+
+def test_duplicate_id_fails_loudly(tmp_path):
+    store = SqliteChunkStore(tmp_path / "chunks.db")
+    _insert(store, "a.py", 2)
+    with pytest.raises(sqlite3.IntegrityError):
+        store.insert_many([dict(make_chunks("b.py", 1)[0], id=0)])
+
+    memory = MemoryChunkStore()
+    _insert(memory, "a.py", 2)
+    with pytest.raises(ValueError):
+        memory.insert_many([dict(make_chunks("b.py", 1)[0], id=1)])
+    assert memory.allocate_ids(1) == 2
+
+
+def test_ids_survive_clear(tmp_path):
+    store = SqliteChunkStore(tmp_path / "chunks.db")
+    _insert(store, "a.py", 5)
+    store.clear()
+    store.commit()
+    assert store.allocate_ids(1) == 5
+
+
+def test_two_faiss_stores_on_one_repo_keep_every_chunk(index_dir):
+    FaissStore("repo", index_dir).build(make_chunks("seed.py", 1))
+    a = FaissStore("repo", index_dir)
+    a.load()
+    b = FaissStore("repo", index_dir)
+    b.load()
+
+    a.update_file_chunks("a.py", make_chunks("a.py", 10))
+    b.update_file_chunks("b.py", make_chunks("b.py", 10))
+
+    reader = FaissStore("repo", index_dir)
+    reader.load()
+    assert reader.chunks.count() == 21
+    ids = reader.chunks.ids_for_file("a.py") + reader.chunks.ids_for_file("b.py")
+    assert len(set(ids)) == 20
+    assert all(reader.chunks.get(i)["file"] == "a.py" for i in reader.chunks.ids_for_file("a.py"))
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q"]))
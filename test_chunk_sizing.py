@@ -0,0 +1,70 @@
+"""
+Tests for fitting chunks to the embedding model's token window (fit_chunks in backend/modules/parser.py).
+Run with: python -m pytest -q test_chunk_sizing.py
+"""
+import sys
+
+import pytest
+
+from backend.modules.file_view import FileView
+from backend.modules.parser import extract_semantic_units, fallback_line_chunks, fit_chunks
+
+SOURCE = """class A:
+    def a(self):
+        return 1
+
+class B:
+    def b(self):
+        return 2
+"""
+
+
+def _chunk(view, start, end, kind, **extra):
+    return dict(file=str(view.path), start=start, end=end, snippet="\n".join(view.lines[start - 1:end]),
+                type=kind, **extra)
+
+
+def _spans(chunks):
+    return [(c["start"], c["end"]) for c in chunks]
+
+
+def test_regex_chunks_of_different_classes_are_not_merged():
+    view = FileView("a.py", SOURCE)
+    chunks = extract_semantic_units(view.path, view.text, view.lines, ".py")
+    assert all("parent" not in c for c in chunks)
+
+    fitted = fit_chunks(chunks, view, window=1000, min_tokens=1000)
+    assert _spans(fitted) == _spans(chunks)
+    assert not any(c.get("merged") for c in fitted)
+
+
+def test_module_level_definitions_share_a_scope():
+    view = FileView("a.py", "def f():\n    return 1\n\ndef g():\n    return 2\n")
+    chunks = [_chunk(view, 1, 2, "function", name="f", parent=None),
+              _chunk(view, 4, 5, "function", name="g", parent=None)]
+
+    fitted = fit_chunks(chunks, view, window=1000, min_tokens=1000)
+    assert _spans(fitted) == [(1, 5)]
+    assert fitted[0]["name"] == "f, g" and fitted[0]["merged"] == 2
+
+
+def test_methods_of_different_classes_are_not_merged():
+    view = FileView("a.py", SOURCE)
+    chunks = [_chunk(view, 2, 3, "method", name="a", parent="A"),
+              _chunk(view, 5, 5, "class", name="B", parent=None),
+              _chunk(view, 6, 7, "method", name="b", parent="B")]
+
+    fitted = fit_chunks(chunks, view, window=1000, min_tokens=1000)
+    assert _spans(fitted) == [(2, 3), (5, 5), (6, 7)]
+
+
+def test_line_windows_are_merged():
+    view = FileView("notes.txt", "\n".join(f"line {i}" for i in range(1, 8)))
+    chunks = fallback_line_chunks(view, lines_per=3)
+
+    fitted = fit_chunks(chunks, view, window=1000, min_tokens=1000)
+    assert _spans(fitted) == [(1, 7)]
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q"]))
@@ -0,0 +1,64 @@
+"""
+Tests for the content-addressed chunk embedding store (backend/modules/cache.py).
+Run with: python -m pytest -q test_embedding_store.py
+"""
+import sys
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+# Add project root to path
+project_root = Path(__file__).parent
+sys.path.insert(0, str(project_root))
+
+from backend.modules.cache import ChunkEmbeddingStore
+
+
+def _vectors(n: int, value: float = 1.0) -> np.ndarray:
+    return np.full((n, 4), value, dtype=np.float32)
+
+
+def test_round_trip_and_reopen(tmp_path):
+    store = ChunkEmbeddingStore(str(tmp_path))
+    assert store.put_many("model", 4, ["a", "b"], _vectors(2)) == 2
+    assert store.put_many("model", 4, ["a"], _vectors(1)) == 0  # already stored
+
+    reopened = ChunkEmbeddingStore(str(tmp_path))
+    found = reopened.get_many("model", 4, ["a", "b", "c"])
+    assert found[2] is None
+    np.testing.assert_array_equal(found[0], _vectors(1)[0])
+
+
+def test_put_after_clear_writes_header(tmp_path):
+    """A writer still holding a shard while the store is cleared must not leave a headerless file."""
+    store = ChunkEmbeddingStore(str(tmp_path))
+    store.put_many("model", 4, ["a"], _vectors(1))
+    shard = store._shards["model"]
+    store.clear()
+    assert not (tmp_path / "model.bin").exists()
+
+    shard.put_many([ChunkEmbeddingStore.content_digest("b")], _vectors(1, 2.0))
+    assert shard._header_ok()
+    assert shard.count == 1
+
+    reopened = ChunkEmbeddingStore(str(tmp_path))
+    assert reopened.get_many("model", 4, ["a"]) == [None]
+    np.testing.assert_array_equal(reopened.get_many("model", 4, ["b"])[0], _vectors(1, 2.0)[0])
+
+
+def test_put_into_truncated_file(tmp_path):
+    store = ChunkEmbeddingStore(str(tmp_path))
+    store.put_many("model", 4, ["a"], _vectors(1))
+    shard = store._shards["model"]
+    (tmp_path / "model.bin").write_bytes(b"")
+
+    shard.put_many([ChunkEmbeddingStore.content_digest("b")], _vectors(1, 3.0))
+    assert shard._header_ok()
+    assert shard.get_many([ChunkEmbeddingStore.content_digest("a")]) == [None]
+    reopened = ChunkEmbeddingStore(str(tmp_path))
+    np.testing.assert_array_equal(reopened.get_many("model", 4, ["b"])[0], _vectors(1, 3.0)[0])
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q"]))
@@ -90,16 +90,18 @@ def check_index_exists():
     print("Checking if repository is indexed...")
     import os
     from pathlib import Path
-    index_path = Path("data/index/my-portfolio/faiss.index")
+    index_path = Path("data/index/my-portfolio/CURRENT")
+    if not index_path.exists():
+        index_path = Path("data/index/my-portfolio/faiss.index")  # pre-generation layout
     if index_path.exists():
         print(f"[OK] Index exists: {index_path}")
         
-        meta_path = Path("data/index/my-portfolio/meta.json")
-        if meta_path.exists():
+        info_path = Path("data/index/my-portfolio/index_info.json")
+        if info_path.exists():
             import json
-            with open(meta_path, encoding='utf-8') as f:
-                meta = json.load(f)
-            print(f"[OK] Indexed chunks: {len(meta)}")
+            with open(info_path, encoding='utf-8') as f:
+                info = json.load(f)
+            print(f"[OK] Indexed chunks: {info.get('chunks')}")
         return True
     else:
         print(f"[ERROR] Index not found. Run /index_repo first.")
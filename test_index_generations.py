@@ -0,0 +1,162 @@
+"""
+Tests for publishing and garbage-collecting index generations (backend/modules/index_generations.py)
+and for FaissStore saves that race other writers.
+Run with: python -m pytest -q test_index_generations.py
+"""
+import sys
+import threading
+import time
+
+import pytest
+
+from conftest import make_chunks
+from backend.modules import vector_store
+from backend.modules.index_generations import (
+    GenerationConflict, collect_garbage, current_generation, manifest_files, publish, read_current
+)
+from backend.modules.index_manifest import file_record
+from backend.modules.vector_store import FaissStore
+
+
+def _load(repo_id, index_dir):
+    store = FaissStore(repo_id, index_dir)
+    store.load()
+    return store
+
+
+def test_publish_compare_and_swap(tmp_path):
+    assert publish("k", tmp_path, {"segments": []}) == 1
+    assert publish("k", tmp_path, {"segments": []}, expected_gen=1) == 2
+    with pytest.raises(GenerationConflict):
+        publish("k", tmp_path, {"segments": []}, expected_gen=1)
+    with pytest.raises(GenerationConflict):
+        publish("k", tmp_path, {"segments": []}, generation=2)
+    assert current_generation(tmp_path) == 2
+
+
+def test_gc_keeps_files_of_unpublished_generations(tmp_path):
+    publish("k", tmp_path, {"segments": []})
+    (tmp_path / "segments").mkdir()
+    unpublished = [tmp_path / "base-000002.index", tmp_path / "segments" / "seg-000002.ids.npy"]
+    orphan = tmp_path / "base-000001.index"
+    for path in unpublished + [orphan]:
+        path.write_bytes(b"x")
+
+    collect_garbage("k", tmp_path, keep=1)
+    assert all(path.exists() for path in unpublished)
+    assert not orphan.exists()
+
+
+def test_gc_during_unpublished_save(index_dir, monkeypatch):
+    monkeypatch.setattr(FaissStore, "_maybe_compact", lambda self: None)
+    FaissStore("repo", index_dir).build(make_chunks("base.py", 20))
+    store = _load("repo", index_dir)
+    real_publish = vector_store.publish
+    collectors = []
+
+    def publish_after_gc(key, base, manifest, **kwargs):
+        # Another writer's GC starts after this save wrote its files but before it published them
+        gc = threading.Thread(target=collect_garbage, args=(key, base), kwargs={"keep": 1})
+        gc.start()
+        collectors.append(gc)
+        time.sleep(0.2)
+        return real_publish(key, base, manifest, **kwargs)
+    monkeypatch.setattr(vector_store, "publish", publish_after_gc)
+
+    store.update_file_chunks("a.py", make_chunks("a.py", 5))
+    for gc in collectors:
+        gc.join(timeout=10)
+    manifest = read_current(store.base)
+    assert all((store.base / name).exists() for name in manifest_files(manifest) if not name.endswith(("-wal", "-shm")))
+    reader = _load("repo", index_dir)
+    assert len(reader.chunks.ids_for_file("a.py")) == 5
+    reader.get_embeddings(reader.chunks.ids_for_file("a.py"))
+
+
+def test_failed_publish_leaves_the_published_metadata_alone(index_dir, fake_model, monkeypatch, tmp_path):
+    monkeypatch.setattr(FaissStore, "_maybe_compact", lambda self: None)
+    source = tmp_path / "a.py"
+    source.write_text("def a():\n    return 1\n", encoding="utf-8")
+    FaissStore("repo", index_dir).build(make_chunks(str(source), 5))
+    store = _load("repo", index_dir)
+    generation, ids, records = store.generation, store.chunks.ids_for_file(str(source)), store.chunks.file_records()
+
+    real_publish = vector_store.publish
+    def failing_publish(key, base, manifest, **kwargs):
+        raise GenerationConflict("lost the race")
+    monkeypatch.setattr(vector_store, "publish", failing_publish)
+    source.write_text("def a():\n    return 2\n", encoding="utf-8")
+    chunks = make_chunks(str(source), 3, prefix="changed")
+    vectors = fake_model.encode([c["snippet"] for c in chunks])
+    with pytest.raises(GenerationConflict):
+        store.replace_files(chunks, vectors, {str(source): file_record(source)}, deleted=["gone.py"])
+
+    for reader in (_load("repo", index_dir), store):
+        assert reader.generation == generation == current_generation(reader.base)
+        assert reader.chunks.ids_for_file(str(source)) == ids
+        assert reader.chunks.file_records() == records
+        assert reader.chunks.max_id() == max(ids)
+        assert not reader.tombstones and not reader.deltas
+
+    monkeypatch.setattr(vector_store, "publish", real_publish)
+    store.replace_files(chunks, vectors, {str(source): file_record(source)})
+    reader = _load("repo", index_dir)
+    new_ids = reader.chunks.ids_for_file(str(source))
+    assert len(new_ids) == 3 and min(new_ids) > max(ids)
+    assert reader.chunks.file_records()[str(source)]["chunk_ids"] == new_ids
+
+
+def test_stale_writer_rebases_onto_current_generation(index_dir, monkeypatch):
+    monkeypatch.setattr(FaissStore, "_maybe_compact", lambda self: None)
+    FaissStore("repo", index_dir).build(make_chunks("base.py", 20))
+    first = _load("repo", index_dir)
+    second = _load("repo", index_dir)
+
+    second.update_file_chunks("b.py", make_chunks("b.py", 5))
+    second.remove_chunks_by_file("base.py")
+    # `first` still holds the build's generation; its save must not drop second's segment and tombstones
+    first.update_file_chunks("a.py", make_chunks("a.py", 5))
+    assert first.generation == current_generation(first.base)
+
+    reader = _load("repo", index_dir)
+    for name in ("a.py", "b.py"):
+        ids = reader.chunks.ids_for_file(name)
+        assert len(ids) == 5
+        reader.get_embeddings(ids)
+        assert not set(ids) & reader.tombstones
+    assert reader.chunks.ids_for_file("base.py") == []
+    assert len(reader.tombstones) == 20
+    segment_names = [s.name for s in reader.deltas]
+    assert len(segment_names) == len(set(segment_names)) == 2
+
+
+def test_stale_writer_fails_after_a_full_build(index_dir):
+    FaissStore("repo", index_dir).build(make_chunks("base.py", 20))
+    stale = _load("repo", index_dir)
+    FaissStore("repo", index_dir).build(make_chunks("rebuilt.py", 10))
+
+    with pytest.raises(GenerationConflict):
+        stale.update_file_chunks("a.py", make_chunks("a.py", 5))
+    reader = _load("repo", index_dir)
+    assert reader.chunks.count() == 10
+
+
+def test_concurrent_saves_get_distinct_generations(index_dir, monkeypatch):
+    monkeypatch.setattr(FaissStore, "_maybe_compact", lambda self: None)
+    FaissStore("repo", index_dir).build(make_chunks("base.py", 20))
+    stores = [_load("repo", index_dir) for _ in range(4)]
+    threads = [threading.Thread(target=store.update_file_chunks, args=(f"f{i}.py", make_chunks(f"f{i}.py", 3)))
+               for i, store in enumerate(stores)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(timeout=30)
+
+    assert sorted(store.generation for store in stores) == [2, 3, 4, 5]
+    reader = _load("repo", index_dir)
+    for i in range(4):
+        reader.get_embeddings(reader.chunks.ids_for_file(f"f{i}.py"))
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q"]))
@@ -0,0 +1,67 @@
+"""
+Tests for background indexing jobs (backend/modules/index_jobs.py): jobs with the same key
+are shared by one owner and queued, not shared, between owners.
+Run with: python -m pytest -q test_index_jobs.py
+"""
+import sys
+import threading
+
+import pytest
+
+from backend.modules.index_jobs import CANCELLED, SUCCEEDED, IndexJobManager
+
+
+def _blocking_work(release: threading.Event, log: list, name: str):
+    def work(job):
+        log.append(f"{name} start")
+        release.wait(timeout=10)
+        log.append(f"{name} end")
+        return {"by": name}
+    return work
+
+
+def test_same_owner_gets_the_running_job():
+    manager = IndexJobManager(max_workers=2)
+    release, log = threading.Event(), []
+    first = manager.submit("index_repo", _blocking_work(release, log, "a"), owner=1, key="index:repo")
+    again = manager.submit("index_repo", _blocking_work(release, log, "a2"), owner=1, key="index:repo")
+    release.set()
+    assert again is first
+    assert first.wait_finished(timeout=10) and first.status == SUCCEEDED
+    assert log == ["a start", "a end"]
+
+
+def test_two_owners_get_their_own_jobs_run_one_after_the_other():
+    manager = IndexJobManager(max_workers=2)
+    release, log = threading.Event(), []
+    job_a = manager.submit("index_repo", _blocking_work(release, log, "a"), owner=1, key="index:repo")
+    job_b = manager.submit("index_repo", _blocking_work(release, log, "b"), owner=2, key="index:repo")
+
+    assert job_b is not job_a
+    assert job_b.owner == 2 and job_a.owner == 1
+    assert [job.id for job in manager.list_jobs(owner=2)] == [job_b.id]
+    # b has a free worker but waits for a's job on the same key
+    assert not job_b.wait_finished(timeout=0.3)
+    assert log == ["a start"]
+
+    release.set()
+    assert job_a.wait_finished(timeout=10) and job_b.wait_finished(timeout=10)
+    assert log == ["a start", "a end", "b start", "b end"]
+    assert job_a.result == {"by": "a"} and job_b.result == {"by": "b"}
+
+
+def test_queued_job_can_be_cancelled_while_waiting():
+    manager = IndexJobManager(max_workers=2)
+    release, log = threading.Event(), []
+    job_a = manager.submit("index_repo", _blocking_work(release, log, "a"), owner=1, key="index:repo")
+    job_b = manager.submit("index_repo", _blocking_work(release, log, "b"), owner=2, key="index:repo")
+
+    assert manager.cancel(job_b.id)
+    assert job_b.wait_finished(timeout=10) and job_b.status == CANCELLED
+    release.set()
+    assert job_a.wait_finished(timeout=10) and job_a.status == SUCCEEDED
+    assert log == ["a start", "a end"]
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q"]))
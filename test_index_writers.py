@@ -0,0 +1,109 @@
+"""
+Tests for concurrent writers of one repo's index (backend/modules/vector_store.py):
+watcher events handled in parallel and a compaction racing an update must not lose vectors.
+Run with: python -m pytest -q test_index_writers.py
+"""
+import sys
+import threading
+import time
+
+import pytest
+
+from conftest import make_chunks
+from backend.modules.index_sync import IndexSyncManager
+from backend.modules.parser import iter_repo_chunks
+from backend.modules.vector_store import FaissStore
+
+
+def _load(repo_id, index_dir):
+    store = FaissStore(repo_id, index_dir)
+    store.load()
+    return store
+
+
+def _has_vectors(store, file_path) -> bool:
+    ids = store.chunks.ids_for_file(file_path)
+    if not ids:
+        return False
+    try:
+        store.get_embeddings(ids)
+    except KeyError:
+        return False
+    return not set(ids) & store.tombstones
+
+
+def test_parallel_watcher_events_keep_every_update(tmp_path, index_dir, monkeypatch):
+    repo = tmp_path / "repo"
+    repo.mkdir()
+    for name in ("a.py", "b.py", "c.py"):
+        (repo / name).write_text(f"def {name[0]}():\n    return 1\n", encoding="utf-8")
+    FaissStore("repo", index_dir).build(iter_repo_chunks(str(repo)))
+
+    # Slow encoding widens the window between a writer's load() and its save()
+    encode = FaissStore._encode_chunks
+    def slow_encode(self, *args, **kwargs):
+        time.sleep(0.2)
+        return encode(self, *args, **kwargs)
+    monkeypatch.setattr(FaissStore, "_encode_chunks", slow_encode)
+
+    for name in ("a.py", "b.py", "c.py"):
+        (repo / name).write_text(f"def {name[0]}_changed():\n    return 2\n", encoding="utf-8")
+    manager = IndexSyncManager()
+    threads = [
+        threading.Thread(target=manager._handle_file_change,
+                         args=(str(repo), "repo", str(repo / name), "modified", index_dir))
+        for name in ("a.py", "b.py", "c.py")
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(timeout=30)
+
+    reader = _load("repo", index_dir)
+    for name in ("a.py", "b.py", "c.py"):
+        path = str((repo / name).resolve())
+        assert _has_vectors(reader, path), name
+        assert "changed" in reader.chunks.get(reader.chunks.ids_for_file(path)[0])["snippet"]
+
+
+def test_compaction_racing_an_update_is_dropped(index_dir, monkeypatch):
+    # Compact only when the test says so
+    monkeypatch.setattr(FaissStore, "_maybe_compact", lambda self: None)
+    FaissStore("repo", index_dir).build(make_chunks("base.py", 20))
+    compactor = _load("repo", index_dir)
+    compactor.update_file_chunks("a.py", make_chunks("a.py", 5))
+    assert compactor.deltas
+
+    other = _load("repo", index_dir)
+    create_index = FaissStore._create_index
+    def racing_create_index(self, *args, **kwargs):
+        # Another store object publishes while the compactor builds its new base outside the lock
+        if self is compactor:
+            other.update_file_chunks("b.py", make_chunks("b.py", 5))
+        return create_index(self, *args, **kwargs)
+    monkeypatch.setattr(FaissStore, "_create_index", racing_create_index)
+
+    assert compactor.compact() is False
+
+    reader = _load("repo", index_dir)
+    assert _has_vectors(reader, "a.py")
+    assert _has_vectors(reader, "b.py")
+    assert _has_vectors(reader, "base.py")
+
+
+def test_compaction_without_competition_publishes(index_dir, monkeypatch):
+    monkeypatch.setattr(FaissStore, "_maybe_compact", lambda self: None)
+    FaissStore("repo", index_dir).build(make_chunks("base.py", 20))
+    store = _load("repo", index_dir)
+    store.update_file_chunks("a.py", make_chunks("a.py", 5))
+    store.remove_chunks_by_file("base.py")
+
+    assert store.compact() is True
+    reader = _load("repo", index_dir)
+    assert not reader.deltas and not reader.tombstones
+    assert _has_vectors(reader, "a.py")
+    assert reader.chunks.ids_for_file("base.py") == []
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q"]))
@@ -0,0 +1,70 @@
+"""
+Tests for validation of the /search recall knobs (k, nprobe, ef_search).
+Runs the Flask app in-process against a throwaway user database.
+Run with: python -m pytest -q test_search_params.py
+"""
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+import pytest
+
+# Add project root to path
+project_root = Path(__file__).parent
+sys.path.insert(0, str(project_root))
+
+# Keep the real data/users.db untouched and skip the model warmup
+os.environ.setdefault("DATABASE_PATH", str(Path(tempfile.mkdtemp()) / "users.db"))
+os.environ.setdefault("EMBEDDING_WARMUP", "false")
+
+from backend.modules.index_factory import INDEX_HNSW, INDEX_IVF, positive_int, search_params
+
+
+@pytest.mark.parametrize("value, expected", [(None, None), (8, 8), ("16", 16), (4.0, 4)])
+def test_positive_int_accepts(value, expected):
+    assert positive_int(value, "nprobe") == expected
+
+
+@pytest.mark.parametrize("value", ["abc", "", "2.5", 2.5, 0, -1, "-3", True, [4], {"n": 1}])
+def test_positive_int_rejects(value):
+    with pytest.raises(ValueError, match="nprobe must be a positive integer"):
+        positive_int(value, "nprobe")
+
+
+def test_search_params_validates_knobs():
+    assert search_params(INDEX_IVF, nprobe="12").nprobe == 12
+    assert search_params(INDEX_HNSW, ef_search=64).efSearch == 64
+    with pytest.raises(ValueError):
+        search_params(INDEX_IVF, nprobe="many")
+    with pytest.raises(ValueError):
+        search_params(INDEX_HNSW, ef_search=-5)
+
+
+@pytest.fixture(scope="module")
+def client():
+    from backend.app import app
+    client = app.test_client()
+    credentials = {"username": "search_params", "email": "search_params@example.com", "password": "secret123"}
+    client.post("/auth/register", json=credentials)
+    token = client.post("/auth/login", json={"username": credentials["username"],
+                                             "password": credentials["password"]}).get_json()["token"]
+    client.environ_base["HTTP_AUTHORIZATION"] = f"Bearer {token}"
+    return client
+
+
+@pytest.mark.parametrize("field, value", [
+    ("nprobe", "abc"), ("nprobe", -1), ("nprobe", 0),
+    ("ef_search", "wide"), ("ef_search", -16), ("ef_search", 1.5),
+    ("k", "ten"), ("k", 0)
+])
+def test_search_rejects_bad_knobs(client, field, value):
+    response = client.post("/search", json={"repo_dir": str(project_root), "query": "parse", field: value})
+    assert response.status_code == 400
+    body = response.get_json()
+    assert body["ok"] is False
+    assert field in body["error"]
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q"]))
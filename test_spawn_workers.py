@@ -0,0 +1,55 @@
+"""
+Tests that spawned pool workers (slice_pool, encoding_pool) don't repeat the server's start-up.
+Spawning re-imports the main module as __mp_main__; under `python -m backend.app` that is app.py.
+Run with: python -m pytest -q test_spawn_workers.py
+"""
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+project_root = Path(__file__).parent
+
+# What multiprocessing's spawn does in a worker before running the task (see multiprocessing.spawn._fixup_main_from_name)
+WORKER_IMPORT = """
+import atexit, json, runpy, threading
+registered = []
+atexit.register = lambda fn, *args, **kwargs: registered.append(fn.__name__)
+module = runpy.run_module("backend.app", run_name=%r, alter_sys=True)
+print(json.dumps({
+    "spawned_worker": module["SPAWNED_WORKER"],
+    "atexit": registered,
+    "threads": [t.name for t in threading.enumerate()]
+}))
+"""
+
+
+def _import_app(run_name: str, tmp_path: Path) -> dict:
+    env = dict(os.environ, DATABASE_PATH=str(tmp_path / "db" / "users.db"), EMBEDDING_WARMUP="true",
+               EMBEDDING_MODEL=str(tmp_path / "no-such-model"), PYTHONPATH=str(project_root))
+    result = subprocess.run([sys.executable, "-c", WORKER_IMPORT % run_name], cwd=str(project_root), env=env,
+                            capture_output=True, text=True, timeout=300)
+    assert result.returncode == 0, result.stderr
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def test_worker_import_skips_server_startup(tmp_path):
+    state = _import_app("__mp_main__", tmp_path)
+    assert state["spawned_worker"] is True
+    assert "cleanup" not in state["atexit"] and "cleanup_privacy_mode" not in state["atexit"]
+    assert "embedding-warmup" not in state["threads"]
+    assert not (tmp_path / "db" / "users.db").exists()
+
+
+def test_server_import_still_starts_up(tmp_path):
+    state = _import_app("backend_app_server", tmp_path)
+    assert state["spawned_worker"] is False
+    assert "cleanup" in state["atexit"] and "cleanup_privacy_mode" in state["atexit"]
+    assert (tmp_path / "db").is_dir()
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q"]))